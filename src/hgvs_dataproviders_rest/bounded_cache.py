@@ -0,0 +1,251 @@
+"""Thread-safe, size-bounded key/value cache with LRU or LFU eviction, optional TTL and hit/miss counters
+
+Size can be bounded by number of entries and/or (approximate) bytes. get_or_load() de-duplicates concurrent
+loads, so threads asking for the same missing key wait for one load rather than all doing it.
+
+>>> cache = BoundedCache(maxsize=2)
+>>> cache.put("a", 1)
+>>> cache.put("b", 2)
+>>> cache.get("a")
+1
+>>> cache.put("c", 3)  # evicts "b", the least recently used
+>>> cache.get("b", "missing")
+'missing'
+>>> cache.cache_info()
+CacheInfo(hits=1, misses=1, evictions=1, expirations=0, currsize=2, maxsize=2, currbytes=0, maxbytes=None)
+
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Callable, NamedTuple, Optional
+
+# Returned by get() when a key isn't present (as None may be a cached value)
+MISSING = object()
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    currsize: int
+    maxsize: Optional[int]
+    currbytes: int = 0
+    maxbytes: Optional[int] = None
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class _LRUPolicy:
+    def __init__(self):
+        self._order = OrderedDict()
+
+    def add(self, key):
+        self._order[key] = None
+
+    def touch(self, key):
+        self._order.move_to_end(key)
+
+    def remove(self, key):
+        del self._order[key]
+
+    def victim(self):
+        return next(iter(self._order))
+
+
+class _LFUPolicy:
+    """ O(1) least frequently used - keys are bucketed by use count, ties broken by least recently used """
+
+    def __init__(self):
+        self._counts = {}
+        self._buckets = defaultdict(OrderedDict)
+        self._min_count = 0
+
+    def _unlink(self, key):
+        count = self._counts.pop(key)
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+        return count
+
+    def add(self, key):
+        self._counts[key] = 1
+        self._buckets[1][key] = None
+        self._min_count = 1
+
+    def touch(self, key):
+        count = self._unlink(key) + 1
+        self._counts[key] = count
+        self._buckets[count][key] = None
+        if self._min_count not in self._buckets:
+            self._min_count = count
+
+    def remove(self, key):
+        self._unlink(key)
+
+    def victim(self):
+        if self._min_count not in self._buckets:
+            self._min_count = min(self._buckets)
+        return next(iter(self._buckets[self._min_count]))
+
+
+def deep_sizeof(obj) -> int:
+    """ Approximate memory used by obj and the dicts/lists/strings/__slots__ objects etc it contains
+        (shared objects counted once) """
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif slots := getattr(type(obj), "__slots__", None):
+            if isinstance(slots, str):
+                slots = (slots,)
+            stack.extend(getattr(obj, slot, None) for slot in slots)
+    return size
+
+
+class _Loading:
+    """ A load in progress, which other threads wanting the same key wait for """
+    __slots__ = ("event", "value", "exception")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.exception = None
+
+
+_POLICIES = {
+    "lru": _LRUPolicy,
+    "lfu": _LFUPolicy,
+}
+
+
+class BoundedCache:
+    def __init__(self, maxsize: Optional[int] = 128, ttl: Optional[float] = None, policy: str = "lru",
+                 max_bytes: Optional[int] = None, sizeof: Optional[Callable] = None):
+        """ maxsize: maximum number of entries (None for unbounded)
+            ttl: seconds before entries expire (None for never)
+            policy: "lru" or "lfu" - which entry to evict when full
+            max_bytes: maximum total size of values (None for unbounded), as measured by sizeof
+            sizeof: function returning size of a value in bytes, defaults to deep_sizeof if max_bytes is set """
+        if policy not in _POLICIES:
+            raise ValueError(f"Unknown cache policy '{policy}', must be one of: {', '.join(_POLICIES)}")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.policy = policy
+        self._policy = _POLICIES[policy]()
+        self.max_bytes = max_bytes
+        if sizeof is None and max_bytes is not None:
+            sizeof = deep_sizeof
+        self.sizeof = sizeof
+        self._data = {}  # key -> (value, expiry time or None, size)
+        self._bytes = 0
+        self._loading = {}  # key -> _Loading
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires, _ = entry
+                if expires is None or expires > time.monotonic():
+                    self._hits += 1
+                    self._policy.touch(key)
+                    return value
+                self._expirations += 1
+                self._remove(key)
+            self._misses += 1
+            return default
+
+    def put(self, key, value, ttl: Optional[float] = None):
+        """ ttl overrides the cache default for this entry """
+        if ttl is None:
+            ttl = self.ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        size = self.sizeof(value) if self.sizeof is not None else 0
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._data[key][2]
+                self._policy.touch(key)
+            else:
+                self._policy.add(key)
+            self._data[key] = (value, expires, size)
+            self._bytes += size
+            # A value larger than max_bytes on its own is evicted too
+            while self._data and self._over_limit():
+                self._remove(self._policy.victim())
+                self._evictions += 1
+
+    def get_or_load(self, key, loader: Callable, ttl: Optional[float] = None):
+        """ Returns cached value, or stores and returns loader(). If another thread is already loading key, waits
+            for it and returns its result (or raises its exception) - so loader is only called once """
+        with self._lock:
+            value = self.get(key)
+            if value is not MISSING:
+                return value
+            loading = self._loading.get(key)
+            is_loader = loading is None
+            if is_loader:
+                loading = self._loading[key] = _Loading()
+
+        if not is_loader:
+            loading.event.wait()
+            if loading.exception is not None:
+                raise loading.exception
+            return loading.value
+
+        try:
+            loading.value = loader()
+            self.put(key, loading.value, ttl=ttl)
+            return loading.value
+        except BaseException as e:
+            loading.exception = e
+            raise
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.event.set()
+
+    def _over_limit(self) -> bool:
+        if self.maxsize is not None and len(self._data) > self.maxsize:
+            return True
+        return self.max_bytes is not None and self._bytes > self.max_bytes
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+        self._policy.remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self._policy = _POLICIES[self.policy]()
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._evictions, self._expirations, len(self._data),
+                             self.maxsize, self._bytes, self.max_bytes)
@@ -1,7 +1,7 @@
-from typing import Optional
+from typing import Iterable, List, Optional
 
 from src.hgvs_dataproviders_rest.dataprovider.dataprovider_interface import Interface
-from src.hgvs_dataproviders_rest.seqfetcher.seqfetcher_interface import SeqFetcherInterface
+from src.hgvs_dataproviders_rest.seqfetcher.seqfetcher_interface import SeqFetcherInterface, SeqRequest, fetch_seqs
 from src.hgvs_dataproviders_rest.txdata.txdata_interface import TxDataInterface
 
 
@@ -39,22 +39,35 @@ class DataProviderDelegator(Interface):
     def get_tx_exons(self, tx_ac, alt_ac, alt_aln_method):
         return self._tx_data.get_tx_exons(tx_ac, alt_ac, alt_aln_method)
 
+    def get_tx_exons_many(self, tx_exons_args):
+        return self._tx_data.get_tx_exons_many(tx_exons_args)
+
     def get_tx_for_gene(self, gene):
         return self._tx_data.get_tx_for_gene(gene)
 
     def get_tx_for_region(self, alt_ac, alt_aln_method, start_i, end_i):
         return self._tx_data.get_tx_for_region(alt_ac, alt_aln_method, start_i, end_i)
 
+    def get_tx_for_regions(self, alt_ac, alt_aln_method, starts, ends):
+        return self._tx_data.get_tx_for_regions(alt_ac, alt_aln_method, starts, ends)
+
     def get_tx_identity_info(self, tx_ac):
         return self._tx_data.get_tx_identity_info(tx_ac)
 
+    def get_tx_identity_info_many(self, tx_acs):
+        return self._tx_data.get_tx_identity_info_many(tx_acs)
+
     def get_tx_info(self, tx_ac, alt_ac, alt_aln_method):
         return self._tx_data.get_tx_info(tx_ac, alt_ac, alt_aln_method)
 
+    def get_tx_info_many(self, tx_info_args):
+        return self._tx_data.get_tx_info_many(tx_info_args)
+
     def get_tx_mapping_options(self, tx_ac):
         return self._tx_data.get_tx_mapping_options(tx_ac)
 
     def fetch_seq(self, ac: str, start_i: Optional[int] = None, end_i: Optional[int] = None) -> str:
         return self._seqfetcher.fetch_seq(ac, start_i, end_i)
 
-
+    def fetch_seqs(self, requests: Iterable[SeqRequest]) -> List[Optional[str]]:
+        return fetch_seqs(self._seqfetcher, requests)
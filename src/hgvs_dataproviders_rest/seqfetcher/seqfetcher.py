@@ -5,11 +5,11 @@
 
 import logging
 import os
-from typing import Optional
+from typing import Iterable, List, Optional
 
 import bioutils.seqfetcher
 
-from .seqfetcher_interface import SeqFetcherInterface
+from .seqfetcher_interface import SeqFetcherInterface, SeqRequest, fetch_seqs_coalesced
 from .. import HGVSDataNotAvailableError
 
 _logger = logging.getLogger(__name__)
@@ -27,6 +27,7 @@ class SeqFetcher(SeqFetcherInterface):
     'MESRETLSSS'
 
     """
+    max_workers = 4  # Concurrent requests in fetch_seqs() for SeqRepo REST/network fetching
 
     def __init__(self):
         # If HGVS_SEQREPO_DIR is defined, we use seqrepo for *all* sequences.
@@ -45,6 +46,7 @@ class SeqFetcher(SeqFetcherInterface):
 
             self.fetcher = _fetch_seq_seqrepo
             self.source = "SeqRepo ({})".format(seqrepo_dir)
+            self.local = True
         elif seqrepo_url:
             from biocommons.seqrepo.dataproxy import SeqRepoRESTDataProxy
 
@@ -53,10 +55,12 @@ class SeqFetcher(SeqFetcherInterface):
                 ac, start_i, end_i
             )
             self.source = f"SeqRepo REST ({seqrepo_url})"
+            self.local = False
         else:
             self.sr = None
             self.fetcher = bioutils.seqfetcher.fetch_seq
             self.source = "bioutils.seqfetcher (network fetching)"
+            self.local = False
         _logger.info("Fetching sequences with " + self.source)
 
     def fetch_seq(self, ac: str, start_i: Optional[int] = None, end_i: Optional[int] = None) -> str:
@@ -66,3 +70,11 @@ class SeqFetcher(SeqFetcherInterface):
             raise HGVSDataNotAvailableError(
                 "Failed to fetch {ac} from {self.source} ({ex})".format(ac=ac, ex=ex, self=self)
             )
+
+    def fetch_seqs(self, requests: Iterable[SeqRequest]) -> List[Optional[str]]:
+        """ returns sequences in the same order as requests, None for those not available
+
+            Overlapping ranges are fetched once. Local SeqRepo reads are sequential through the one open SeqRepo,
+            remote lookups run concurrently (up to max_workers at once) """
+        max_workers = None if self.local else self.max_workers
+        return fetch_seqs_coalesced(self.fetch_seq, requests, max_workers=max_workers)
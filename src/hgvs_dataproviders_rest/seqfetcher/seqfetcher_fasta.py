@@ -1,27 +1,57 @@
 import re
+import threading
+from typing import List, Optional
 
 from pysam.libcfaidx import FastaFile
-from bioutils.sequences import reverse_complement
 
 from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+from src.hgvs_dataproviders_rest.bounded_cache import MISSING, BoundedCache
 from src.hgvs_dataproviders_rest.seqfetcher.seqfetcher_utils import AbstractTranscriptSeqFetcher, PrefixSeqFetcher
 
+_COMPLEMENT = bytes.maketrans(b"ACGTRYKMBVDHSWN", b"TGCAYRMKVBHDSWN")  # Upper case IUPAC
+
+
+class ContigFastaFiles:
+    """ Contig -> Fasta file lookup. pysam FastaFile handles aren't thread safe, so each thread lazily opens
+        its own handle per file, and threads can read in parallel without a lock """
+    def __init__(self, fasta_filenames):
+        self.contig_filenames = {}
+        self._local = threading.local()
+        for fasta_filename in fasta_filenames:
+            fasta_file = self.get_fasta_file(fasta_filename)
+            for contig in fasta_file.references:
+                self.contig_filenames[contig] = fasta_filename
+
+    def __contains__(self, contig):
+        return contig in self.contig_filenames
+
+    def __len__(self):
+        return len(self.contig_filenames)
+
+    def get_fasta_file(self, fasta_filename) -> FastaFile:
+        """ FastaFile for the calling thread """
+        fasta_files = getattr(self._local, "fasta_files", None)
+        if fasta_files is None:
+            fasta_files = self._local.fasta_files = {}
+        if (fasta_file := fasta_files.get(fasta_filename)) is None:
+            fasta_file = fasta_files[fasta_filename] = FastaFile(fasta_filename)
+        return fasta_file
+
+    def fetch(self, contig, start_i=None, end_i=None) -> str:
+        return self.get_fasta_file(self.contig_filenames[contig]).fetch(contig, start_i, end_i)
+
 
 class GenomeFastaSeqFetcher:
     def __init__(self, *args):
         self.source = "Local Fasta file reference"
-        self.contig_fastas = {}
-        for fasta_filename in args:
-            fasta_file = FastaFile(fasta_filename)
-            for contig in fasta_file.references:
-                self.contig_fastas[contig] = fasta_file
+        self.contig_fastas = ContigFastaFiles(args)
 
         if not self.contig_fastas:
             raise ValueError("Need to provide at least one of fasta file as argument")
 
     def fetch_seq(self, ac, start_i=None, end_i=None):
-        if fasta_file := self.contig_fastas.get(ac):  # Contig
-            return fasta_file.fetch(ac, start_i, end_i).upper()
+        if ac in self.contig_fastas:  # Contig
+            return self.contig_fastas.fetch(ac, start_i, end_i).upper()
 
         raise HGVSDataNotAvailableError(f"Accession '{ac}' not in fasta contigs")
 
@@ -29,17 +59,16 @@ class GenomeFastaSeqFetcher:
 class ExonsFromGenomeFastaSeqFetcher(AbstractTranscriptSeqFetcher):
     """ This produces artificial transcript sequences by pasting together exons from the genome
         It is possible that this does not exactly match the transcript sequences - USE AT OWN RISK! """
+    CIGAR_CACHE_SIZE = 10000  # Parsed CIGARs kept (most recently used)
+
     def __init__(self, *args, cache=True):
         self.cache = cache
         self.transcript_cache = {}
         self.hdp = None  # Set when passed to data provider (via set_data_provider)
         self.source = "Transcript Exons using Genome Fasta file reference"
-        self.contig_fastas = {}
         self.cigar_pattern = re.compile(r"(\d+)([=DIX])")
-        for fasta_filename in args:
-            fasta_file = FastaFile(fasta_filename)
-            for contig in fasta_file.references:
-                self.contig_fastas[contig] = fasta_file
+        self._cigar_ops = BoundedCache(maxsize=self.CIGAR_CACHE_SIZE)
+        self.contig_fastas = ContigFastaFiles(args)
 
         if not self.contig_fastas:
             raise ValueError("Need to provide at least one of fasta file as argument")
@@ -48,13 +77,14 @@ class ExonsFromGenomeFastaSeqFetcher(AbstractTranscriptSeqFetcher):
     def get_mapping_options(self, ac):
         return self.hdp.get_tx_mapping_options(ac)
 
-    def _get_transcript_seq(self, ac):
+    def _get_alignment(self, ac):
+        """ (alt_ac, alt_aln_method) of the first mapping to a contig in the fasta files """
         possible_contigs = set()
         for tx_mo in self.get_mapping_options(ac):
             alt_ac = tx_mo["alt_ac"]
             possible_contigs.add(alt_ac)
             if alt_ac in self.contig_fastas:
-                return self._fetch_seq_from_fasta(ac, alt_ac, tx_mo["alt_aln_method"])
+                return alt_ac, tx_mo["alt_aln_method"]
 
         msg = f"Failed to fetch {ac} from {self.source}. "
         if possible_contigs:
@@ -62,45 +92,95 @@ class ExonsFromGenomeFastaSeqFetcher(AbstractTranscriptSeqFetcher):
             raise HGVSDataNotAvailableError(f"{msg} No Fasta provided with contigs: {possible_contigs}")
         raise HGVSDataNotAvailableError(f"{msg} Transcript '{ac}' not found.")
 
-    def _fetch_seq_from_fasta(self, ac, alt_ac, alt_aln_method):
-        fasta_file = self.contig_fastas[alt_ac]
+    def _get_transcript_seq(self, ac):
+        return self._fetch_seq_from_fasta(ac, *self._get_alignment(ac))
+
+    def _check_data_provider(self, method_name):
+        if self.hdp is None:
+            raise HGVSDataNotAvailableError(
+                f"{self}: You need to set set_data_provider() before calling {method_name}()")
+
+    def get_transcript_seqs(self, acs) -> List[Optional[str]]:
+        """ Assembles many transcripts, retrieving exons with one get_tx_exons_many call.
+            Returns sequences in the same order as acs, None for those not available """
+        self._check_data_provider("get_transcript_seqs")
+        acs = list(acs)
+        transcript_seqs = {}
+        tx_exons_args = []
+        for ac in dict.fromkeys(acs):
+            if transcript_seq := self.transcript_cache.get(ac):
+                transcript_seqs[ac] = transcript_seq
+                continue
+            try:
+                tx_exons_args.append((ac, *self._get_alignment(ac)))
+            except HGVSDataNotAvailableError:
+                pass
+
+        if tx_exons_args:
+            for (ac, alt_ac, _), exons in zip(tx_exons_args, self.hdp.get_tx_exons_many(tx_exons_args)):
+                if exons:
+                    transcript_seq = transcript_seqs[ac] = self._assemble_transcript_seq(ac, alt_ac, exons)
+                    if self.cache:
+                        self.transcript_cache[ac] = transcript_seq
+        return [transcript_seqs.get(ac) for ac in acs]
+
+    def fetch_seqs(self, requests):
+        """ returns sequences in the same order as requests, None for those not available """
+        self._check_data_provider("fetch_seqs")
+        requests = list(requests)
+        acs = list(dict.fromkeys(ac for ac, _, _ in requests))
+        transcript_seqs = dict(zip(acs, self.get_transcript_seqs(acs)))
+        results = []
+        for ac, start_i, end_i in requests:
+            transcript_seq = transcript_seqs[ac]
+            results.append(None if transcript_seq is None else transcript_seq[start_i:end_i])
+        return results
+
+    def _get_cigar_ops(self, cigar):
+        """ ((op, length), ...) - recently used CIGARs are only parsed once """
+        if (cigar_ops := self._cigar_ops.get(cigar)) is MISSING:
+            cigar_ops = tuple((op, int(length)) for length, op in self.cigar_pattern.findall(cigar))
+            self._cigar_ops.put(cigar, cigar_ops)
+        return cigar_ops
 
+    def _fetch_seq_from_fasta(self, ac, alt_ac, alt_aln_method):
         exons = self.hdp.get_tx_exons(ac, alt_ac, alt_aln_method)
-        exon_sequences = []
-        expected_transcript_length = 0
-        sorted_exons = list(sorted(exons, key=lambda ex: ex["ord"]))
-        first_exon = sorted_exons[0]
-        transcript_start_offset = first_exon["tx_start_i"]  # HGVS/UTA starts w/0
-        if transcript_start_offset:
-            exon_sequences.append("N" * transcript_start_offset)
-            expected_transcript_length += transcript_start_offset
-
+        return self._assemble_transcript_seq(ac, alt_ac, exons)
+
+    def _assemble_transcript_seq(self, ac, alt_ac, exons):
+        """ Fetches the genomic span of the exons once, and applies CIGARs as offsets into it """
+        sorted_exons = sorted(exons, key=lambda ex: ex["ord"])
+        transcript_start_offset = sorted_exons[0]["tx_start_i"]  # HGVS/UTA starts w/0
+        expected_transcript_length = transcript_start_offset + sum(ex["tx_end_i"] - ex["tx_start_i"]
+                                                                   for ex in sorted_exons)
+        span_start = min(ex["alt_start_i"] for ex in sorted_exons)
+        span_end = max(ex["alt_end_i"] for ex in sorted_exons)
+        genomic = memoryview(self.contig_fastas.fetch(alt_ac, span_start, span_end).upper().encode())
+
+        reverse = sorted_exons[0]["alt_strand"] == -1
+        if reverse:
+            # Joining reverse strand exons backwards then reverse complementing once is the same as
+            # reverse complementing each exon
+            sorted_exons.reverse()
+
+        transcript = bytearray()
         for exon in sorted_exons:
-            exon_seq = fasta_file.fetch(alt_ac, exon["alt_start_i"], exon["alt_end_i"])
-            exon_seq = exon_seq.upper()
-
-            exon_seq_list = []
-            start = 0
+            start = exon["alt_start_i"] - span_start
             # We are using HGVS cigar
-            for (length_str, op) in self.cigar_pattern.findall(exon["cigar"]):
-                length = int(length_str)
+            for op, length in self._get_cigar_ops(exon["cigar"]):
                 if op == 'D':    # Deletion in reference vs transcript
-                    exon_seq_list.append("N" * length)
+                    transcript += b"N" * length
                     # Don't increment start (as we didn't move along genomic exon)
                 elif op == 'I':  # Insertion in reference vs transcript
-                    # Leave out of exon_seq
+                    # Leave out of transcript
                     start += length  # We do increment through genomic sequence though
                 else:  # match/mismatch
-                    exon_seq_list.append(exon_seq[start:start+length])
+                    transcript += genomic[start:start + length]
                     start += length
 
-            exon_seq = "".join(exon_seq_list)
-            if exon["alt_strand"] == -1:
-                exon_seq = reverse_complement(exon_seq)
-            exon_sequences.append(exon_seq)
-            expected_transcript_length += exon["tx_end_i"] - exon["tx_start_i"]
-
-        transcript_sequence = "".join(exon_sequences)
+        if reverse:
+            transcript = transcript.translate(_COMPLEMENT)[::-1]
+        transcript_sequence = "N" * transcript_start_offset + transcript.decode("ascii")
         if len(transcript_sequence) != expected_transcript_length:
             raise ValueError(f"Error creating {ac} sequence from genome fasta ({alt_ac}): "
                              f"{expected_transcript_length=} != {len(transcript_sequence)=}")
@@ -1,8 +1,86 @@
 import abc
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+
+SeqRequest = Tuple[str, Optional[int], Optional[int]]  # (ac, start_i, end_i) as passed to fetch_seq
 
 
 class SeqFetcherInterface(abc.ABC):
     @abc.abstractmethod
     def fetch_seq(self, ac: str, start_i: Optional[int] = None, end_i: Optional[int] = None) -> str:
         pass
+
+    def fetch_seqs(self, requests: Iterable[SeqRequest]) -> List[Optional[str]]:
+        """ returns sequences in the same order as requests, None for those not available """
+        return fetch_seqs_coalesced(self.fetch_seq, requests)
+
+
+def coalesce_seq_requests(requests: Iterable[SeqRequest]):
+    """ Merges overlapping/adjacent ranges on the same accession, so each is only fetched once
+
+        Returns (fetches, slices) - fetches are (ac, start_i, end_i) and slices are (fetch index, start, end) of
+        each request within its fetched sequence
+
+        >>> fetches, slices = coalesce_seq_requests([("NM_1", 10, 20), ("NC_1", 0, 5), ("NM_1", 15, 30),
+        ...                                          ("NM_1", 40, 50), ("NC_1", 3, None)])
+        >>> fetches
+        [('NM_1', 10, 30), ('NM_1', 40, 50), ('NC_1', 0, None)]
+        >>> slices
+        [(0, 0, 10), (2, 0, 5), (0, 5, 20), (1, 0, 10), (2, 3, None)]
+    """
+    ranges_by_ac = {}
+    for request_i, (ac, start_i, end_i) in enumerate(requests):
+        ranges_by_ac.setdefault(ac, []).append((start_i or 0, end_i, request_i))
+
+    fetches = []
+    slices = {}
+    for ac, ranges in ranges_by_ac.items():
+        # end_i=None is to the end of the sequence
+        ranges.sort(key=lambda r: (r[0], float("inf") if r[1] is None else r[1]))
+        merged = []  # [start_i, end_i, request indexes]
+        for start_i, end_i, request_i in ranges:
+            if merged and (merged[-1][1] is None or start_i <= merged[-1][1]):
+                current = merged[-1]
+                if current[1] is not None and (end_i is None or end_i > current[1]):
+                    current[1] = end_i
+                current[2].append((start_i, end_i, request_i))
+            else:
+                merged.append([start_i, end_i, [(start_i, end_i, request_i)]])
+
+        for fetch_start_i, fetch_end_i, members in merged:
+            fetch_i = len(fetches)
+            fetches.append((ac, fetch_start_i, fetch_end_i))
+            for start_i, end_i, request_i in members:
+                end = None if end_i is None else end_i - fetch_start_i
+                slices[request_i] = (fetch_i, start_i - fetch_start_i, end)
+
+    return fetches, [slices[i] for i in range(len(slices))]
+
+
+def fetch_seqs_coalesced(fetch_seq: Callable, requests: Iterable[SeqRequest],
+                         max_workers: Optional[int] = None) -> List[Optional[str]]:
+    """ Coalesces requests then calls fetch_seq for each range, in a thread pool if max_workers > 1 """
+    fetches, slices = coalesce_seq_requests(requests)
+
+    def _fetch(fetch):
+        try:
+            return fetch_seq(*fetch)
+        except HGVSDataNotAvailableError:
+            return None
+
+    if max_workers and max_workers > 1 and len(fetches) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(fetches))) as executor:
+            seqs = list(executor.map(_fetch, fetches))
+    else:
+        seqs = [_fetch(fetch) for fetch in fetches]
+
+    return [None if seqs[fetch_i] is None else seqs[fetch_i][start:end] for fetch_i, start, end in slices]
+
+
+def fetch_seqs(seqfetcher, requests: Iterable[SeqRequest]) -> List[Optional[str]]:
+    """ Uses the seqfetcher's batch fetch_seqs if it has one (not all implement SeqFetcherInterface) """
+    if batch_fetch_seqs := getattr(seqfetcher, "fetch_seqs", None):
+        return batch_fetch_seqs(requests)
+    return fetch_seqs_coalesced(seqfetcher.fetch_seq, requests)
@@ -0,0 +1,202 @@
+"""Genome sequence served straight from memory mapped (uncompressed) FASTA or 2bit files
+
+An alternative to GenomeFastaSeqFetcher (pysam) for many small reference lookups:
+
+    seqfetcher = MmapGenomeSeqFetcher("GCF_000001405.39_GRCh38.p13_genomic.fna", "hg19.2bit")
+
+FASTA offsets are calculated from the fai index (line lengths), or by scanning the record headers if there is no
+.fai file. Pages are read-only, so are shared between all processes that open the same file.
+"""
+
+import bisect
+import mmap
+import struct
+import sys
+from array import array
+from typing import Dict, NamedTuple
+
+import numpy as np
+
+from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+
+_UPPER = bytes.maketrans(b"acgtnrykmswbdhv", b"ACGTNRYKMSWBDHV")
+_NEWLINES = b"\r\n"
+
+
+def _open_mmap(filename):
+    with open(filename, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class FaiRecord(NamedTuple):
+    length: int
+    offset: int
+    line_bases: int
+    line_width: int
+
+
+class MmapFastaFile:
+    """ Uncompressed FASTA, lines of each contig must be the same length (as required by samtools faidx)
+
+        Slices are located arithmetically from line lengths, then newlines removed and upper cased (with one
+        translate) only if the slice spans lines or has lower case bases """
+    def __init__(self, filename):
+        if filename.endswith((".gz", ".bgz")):
+            raise ValueError(f"'{filename}': MmapFastaFile requires an uncompressed FASTA file")
+        self._mmap = _open_mmap(filename)
+        try:
+            self.index = self._read_fai(filename + ".fai")
+        except FileNotFoundError:
+            self.index = self._index_fasta(self._mmap)
+
+    @staticmethod
+    def _read_fai(fai_filename) -> Dict[str, FaiRecord]:
+        index = {}
+        with open(fai_filename) as f:
+            for line in f:
+                name, length, offset, line_bases, line_width = line.split("\t")[:5]
+                index[name] = FaiRecord(int(length), int(offset), int(line_bases), int(line_width))
+        return index
+
+    @staticmethod
+    def _index_fasta(mm) -> Dict[str, FaiRecord]:
+        """ Only reads the header lines and first sequence line of each record, lengths are calculated """
+        index = {}
+        header_start = mm.find(b">")
+        while header_start != -1:
+            header_end = mm.find(b"\n", header_start)
+            name = mm[header_start + 1:header_end].split()[0].decode()
+            offset = header_end + 1
+            next_header = mm.find(b"\n>", header_start)
+            end = len(mm) if next_header == -1 else next_header + 1
+            while end > offset and mm[end - 1] in _NEWLINES:
+                end -= 1
+            first_line_end = mm.find(b"\n", offset)
+            if first_line_end == -1 or first_line_end > end:
+                first_line_end = end
+            line_width = first_line_end - offset + 1
+            line_bases = line_width - 1 - (mm[first_line_end - 1:first_line_end] == b"\r")
+            full_lines, last_line = divmod(end - offset, line_width)
+            index[name] = FaiRecord(full_lines * line_bases + last_line, offset, line_bases, line_width)
+            header_start = -1 if next_header == -1 else next_header + 1
+        return index
+
+    @property
+    def lengths(self) -> Dict[str, int]:
+        return {name: record.length for name, record in self.index.items()}
+
+    def __contains__(self, contig):
+        return contig in self.index
+
+    def fetch(self, contig, start_i=None, end_i=None) -> str:
+        length, offset, line_bases, line_width = self.index[contig]
+        start_i = 0 if start_i is None else max(start_i, 0)
+        end_i = length if end_i is None else min(end_i, length)
+        if start_i >= end_i:
+            return ""
+        start_line, start_col = divmod(start_i, line_bases)
+        end_line, end_col = divmod(end_i, line_bases)
+        raw = self._mmap[offset + start_line * line_width + start_col:offset + end_line * line_width + end_col]
+        if start_line != end_line or not raw.isupper():
+            raw = raw.translate(_UPPER, _NEWLINES)
+        return raw.decode("ascii")
+
+
+# 2bit bases are packed 4 per byte, most significant bits first
+_TWOBIT_BASES = b"TCAG"
+_TWOBIT_TABLE = np.array([[_TWOBIT_BASES[(i >> shift) & 3] for shift in (6, 4, 2, 0)] for i in range(256)],
+                         dtype=np.uint8)
+_NATIVE_BYTE_ORDER = "<" if sys.byteorder == "little" else ">"
+_TWOBIT_SIGNATURE = 0x1A412743
+
+
+class TwoBitFile:
+    """ UCSC 2bit file. Soft masking is ignored, so sequence is upper case (same as GenomeFastaSeqFetcher) """
+    def __init__(self, filename):
+        self._mmap = _open_mmap(filename)
+        for byte_order in "<>":
+            signature, version, sequence_count = struct.unpack_from(byte_order + "3I", self._mmap)
+            if signature == _TWOBIT_SIGNATURE:
+                break
+        else:
+            raise ValueError(f"'{filename}' is not a 2bit file")
+        self._byte_order = byte_order
+        offset_format = byte_order + ("Q" if version == 1 else "I")  # Version 1 has 64 bit offsets
+
+        self._record_offsets = {}
+        pos = 16
+        for _ in range(sequence_count):
+            name_length = self._mmap[pos]
+            name = self._mmap[pos + 1:pos + 1 + name_length].decode()
+            pos += 1 + name_length
+            (self._record_offsets[name],) = struct.unpack_from(offset_format, self._mmap, pos)
+            pos += struct.calcsize(offset_format)
+        self._records = {}
+
+    def _get_record(self, contig):
+        """ (length, N block starts, N block ends, packed DNA offset) - read on first use """
+        if (record := self._records.get(contig)) is None:
+            uint32 = self._byte_order + "I"
+            pos = self._record_offsets[contig]
+            length, n_block_count = struct.unpack_from(self._byte_order + "2I", self._mmap, pos)
+            pos += 8
+            n_starts = array("I", self._mmap[pos:pos + 4 * n_block_count])
+            n_sizes = array("I", self._mmap[pos + 4 * n_block_count:pos + 8 * n_block_count])
+            assert n_starts.itemsize == 4, "2bit N blocks are uint32"
+            if self._byte_order != _NATIVE_BYTE_ORDER:
+                n_starts.byteswap()
+                n_sizes.byteswap()
+            pos += 8 * n_block_count
+            (mask_block_count,) = struct.unpack_from(uint32, self._mmap, pos)
+            pos += 4 + 8 * mask_block_count + 4  # Skip mask blocks and reserved
+            n_ends = [start + size for start, size in zip(n_starts, n_sizes)]
+            record = self._records[contig] = (length, n_starts, n_ends, pos)
+        return record
+
+    @property
+    def lengths(self) -> Dict[str, int]:
+        return {contig: self._get_record(contig)[0] for contig in self._record_offsets}
+
+    def __contains__(self, contig):
+        return contig in self._record_offsets
+
+    def fetch(self, contig, start_i=None, end_i=None) -> str:
+        length, n_starts, n_ends, dna_offset = self._get_record(contig)
+        start_i = 0 if start_i is None else max(start_i, 0)
+        end_i = length if end_i is None else min(end_i, length)
+        if start_i >= end_i:
+            return ""
+        packed = self._mmap[dna_offset + start_i // 4:dna_offset + (end_i + 3) // 4]
+        first = start_i % 4
+        seq = _TWOBIT_TABLE[np.frombuffer(packed, dtype=np.uint8)].tobytes()[first:first + end_i - start_i]
+
+        # N blocks are sorted, only those before end_i and ending after start_i overlap
+        block_i = bisect.bisect_right(n_ends, start_i)
+        if block_i < len(n_starts) and n_starts[block_i] < end_i:
+            seq = bytearray(seq)
+            while block_i < len(n_starts) and n_starts[block_i] < end_i:
+                n_start = max(n_starts[block_i], start_i) - start_i
+                n_end = min(n_ends[block_i], end_i) - start_i
+                seq[n_start:n_end] = b"N" * (n_end - n_start)
+                block_i += 1
+        return seq.decode("ascii")
+
+
+class MmapGenomeSeqFetcher:
+    """ Contig sequences from memory mapped FASTA (uncompressed) or 2bit (.2bit) files """
+    def __init__(self, *args):
+        self.source = "Memory mapped genome reference"
+        self.contig_files = {}
+        for filename in args:
+            genome_file = TwoBitFile(filename) if filename.endswith(".2bit") else MmapFastaFile(filename)
+            for contig in genome_file.lengths:
+                self.contig_files[contig] = genome_file
+
+        if not self.contig_files:
+            raise ValueError("Need to provide at least one of fasta/2bit file as argument")
+
+    def fetch_seq(self, ac, start_i=None, end_i=None):
+        if genome_file := self.contig_files.get(ac):
+            return genome_file.fetch(ac, start_i, end_i)
+
+        raise HGVSDataNotAvailableError(f"Accession '{ac}' not in genome contigs")
@@ -1,7 +1,10 @@
 import abc
+import sys
 from itertools import tee
 
 from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+from src.hgvs_dataproviders_rest.bounded_cache import BoundedCache
+from src.hgvs_dataproviders_rest.seqfetcher.seqfetcher_interface import fetch_seqs
 from src.hgvs_dataproviders_rest.txdata.txdata_interface import TxDataInterface
 
 
@@ -39,17 +42,35 @@ class PrefixSeqFetcher:
             except AttributeError:
                 pass
 
-    def fetch_seq(self, ac, start_i=None, end_i=None):
+    def _get_seqfetcher(self, ac):
         for prefix, sf in self.prefix_seqfetchers.items():
             if ac.startswith(prefix):
-                return sf.fetch_seq(ac, start_i=start_i, end_i=end_i)
-        if self.default_seqfetcher:
-            return self.default_seqfetcher.fetch_seq(ac, start_i=start_i, end_i=end_i)
+                return sf
+        return self.default_seqfetcher
+
+    def fetch_seq(self, ac, start_i=None, end_i=None):
+        if sf := self._get_seqfetcher(ac):
+            return sf.fetch_seq(ac, start_i=start_i, end_i=end_i)
 
         known_prefixes = ','.join(self.prefix_seqfetchers.keys())
         msg = f"Couldn't handle '{ac}', must match known prefixes: '{known_prefixes}'. No default set"
         raise HGVSDataNotAvailableError(msg)
 
+    def fetch_seqs(self, requests):
+        """ Sends each backend one batch of its requests. None for those not available """
+        requests = list(requests)
+        request_indexes_by_sf = {}
+        for i, (ac, _, _) in enumerate(requests):
+            if sf := self._get_seqfetcher(ac):
+                request_indexes_by_sf.setdefault(sf, []).append(i)
+
+        results = [None] * len(requests)
+        for sf, request_indexes in request_indexes_by_sf.items():
+            seqs = fetch_seqs(sf, [requests[i] for i in request_indexes])
+            for i, seq in zip(request_indexes, seqs):
+                results[i] = seq
+        return results
+
 
 class MultiSeqFetcher(abc.ABC):
     """ This tries a number of SeqFetchers, and returns the first one that works """
@@ -92,6 +113,20 @@ class ChainedSeqFetcher(MultiSeqFetcher):
 
         raise HGVSDataNotAvailableError(exceptions)
 
+    def fetch_seqs(self, requests):
+        """ Batches everything to the first SeqFetcher, then those not available to the next etc """
+        requests = list(requests)
+        results = [None] * len(requests)
+        remaining = list(range(len(requests)))
+        for sf in self.seqfetchers:
+            if not remaining:
+                break
+            seqs = fetch_seqs(sf, [requests[i] for i in remaining])
+            for i, seq in zip(remaining, seqs):
+                results[i] = seq
+            remaining = [i for i in remaining if results[i] is None]
+        return results
+
 
 class VerifyMultipleSeqFetcher(MultiSeqFetcher):
     """ This takes multiple SeqFetcher instances, queries them both and checks the BOTH SUCCEED AND ARE IDENTICAL
@@ -126,6 +161,60 @@ class AlwaysFailSeqFetcher:
         raise HGVSDataNotAvailableError(self.message)
 
 
+class CachingSeqFetcher:
+    """ Caches sequences from another SeqFetcher in memory, so many small windows cost one fetch
+
+        Transcript/protein sequences are retrieved whole, then sliced. Contigs (chunked_prefixes) are retrieved and
+        cached in chunk_size aligned chunks. Least recently used sequences/chunks are evicted to stay under max_bytes
+
+        seqfetcher = CachingSeqFetcher(SeqFetcher())
+        seqfetcher.cache_info()  # hits, misses, evictions, currbytes etc
+    """
+    def __init__(self, seqfetcher, max_bytes: int = 256 * 1024 * 1024, chunk_size: int = 64 * 1024,
+                 chunked_prefixes=("NC_", "NG_", "NT_", "NW_", "AC_")):
+        self.seqfetcher = seqfetcher
+        self.chunk_size = chunk_size
+        self.chunked_prefixes = tuple(chunked_prefixes)
+        # keys are accession (whole sequence) or (accession, chunk number)
+        self.cache = BoundedCache(maxsize=None, max_bytes=max_bytes, sizeof=sys.getsizeof)
+
+    @property
+    def source(self):
+        return self.seqfetcher.source
+
+    def set_data_provider(self, tx_data: TxDataInterface):
+        try:
+            self.seqfetcher.set_data_provider(tx_data)
+        except AttributeError:
+            pass
+
+    def cache_info(self):
+        return self.cache.cache_info()
+
+    def fetch_seq(self, ac, start_i=None, end_i=None):
+        if ac.startswith(self.chunked_prefixes):
+            if end_i is None:  # Whole contig - too big to cache
+                return self.seqfetcher.fetch_seq(ac, start_i=start_i, end_i=end_i)
+            return self._fetch_chunked_seq(ac, start_i or 0, end_i)
+
+        seq = self.cache.get_or_load(ac, lambda: self.seqfetcher.fetch_seq(ac))
+        return seq[start_i:end_i]
+
+    def _fetch_chunked_seq(self, ac, start_i, end_i):
+        chunk_size = self.chunk_size
+        first_chunk = start_i // chunk_size
+        chunks = []
+        for chunk in range(first_chunk, max(end_i - 1, start_i) // chunk_size + 1):
+            chunk_start = chunk * chunk_size
+            chunk_seq = self.cache.get_or_load(
+                (ac, chunk),
+                lambda: self.seqfetcher.fetch_seq(ac, start_i=chunk_start, end_i=chunk_start + chunk_size))
+            chunks.append(chunk_seq)
+            if len(chunk_seq) < chunk_size:  # End of the contig
+                break
+        offset = first_chunk * chunk_size
+        return "".join(chunks)[start_i - offset:end_i - offset]
+
 
 class AbstractTranscriptSeqFetcher:
     def __init__(self, *args, cache=True):
@@ -0,0 +1,231 @@
+"""Cache shared between processes (eg web server workers), which also survives restarts
+
+TxDataCache(hdp, shared_cache=SQLiteSharedCache("/var/cache/hgvs/txdata.sqlite")) checks its in-memory cache,
+then the shared cache, and only then the wrapped data provider - so a newly started worker serves transcripts
+that any other worker has already retrieved.
+
+Values are stored as compact JSON, with tags for the types JSON lacks (records, dates, cached errors), and
+zlib compressed when large:
+
+>>> from src.hgvs_dataproviders_rest.txdata.records import record_type
+>>> Row = record_type(["tx_ac", "lengths"])
+>>> value = (Row(["NM_000001.1", (100, 200)]), Row(["NM_000002.1", (50,)]))
+>>> decode_value(encode_value(value)) == value
+True
+
+"""
+
+import abc
+import datetime
+import json
+import logging
+import operator
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Iterable, Optional
+
+from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+from src.hgvs_dataproviders_rest.bounded_cache import MISSING, CacheInfo
+from src.hgvs_dataproviders_rest.txdata.records import freeze, record_type
+
+_logger = logging.getLogger(__name__)
+
+# Key of tagged (non JSON) values - result dicts never have this key
+_TAG = "\x00"
+_COMPRESS_MIN_SIZE = 1024
+
+
+class NotAvailable:
+    """ Cached HGVSDataNotAvailableError (negative caching) - a new exception is raised on each hit """
+    __slots__ = ("exception_type", "args")
+
+    def __init__(self, exception: HGVSDataNotAvailableError):
+        self.exception_type = type(exception)
+        self.args = exception.args
+
+    def exception(self):
+        return self.exception_type(*self.args)
+
+
+def _scalar_to_json(value):
+    """ numpy (and other) integer/float scalars, eg positions taken from arrays """
+    if hasattr(value, "__index__"):
+        return operator.index(value)
+    if hasattr(value, "__float__") and hasattr(value, "dtype"):
+        return float(value)
+    raise TypeError(f"Can't store {type(value).__name__} in shared cache")
+
+
+def _to_json(value, columns):
+    """ columns: list of Record column tuples, shared by all the records in a value """
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if hasattr(value, "keys") and isinstance(value, (tuple, list)):  # Record / DictRow
+        keys = tuple(value.keys())
+        try:
+            column_index = columns.index(keys)
+        except ValueError:
+            column_index = len(columns)
+            columns.append(keys)
+        return {_TAG: "r", "c": column_index, "v": [_to_json(v, columns) for v in value]}
+    if isinstance(value, (tuple, list)):
+        return [_to_json(v, columns) for v in value]
+    if hasattr(value, "items"):
+        return {k: _to_json(v, columns) for k, v in value.items()}
+    if isinstance(value, datetime.datetime):
+        return {_TAG: "dt", "v": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {_TAG: "d", "v": value.isoformat()}
+    if isinstance(value, NotAvailable):
+        return {_TAG: "na", "v": _to_json(value.args, columns)}
+    return _scalar_to_json(value)
+
+
+def _from_json(data, columns):
+    if isinstance(data, list):
+        return [_from_json(v, columns) for v in data]
+    if isinstance(data, dict):
+        tag = data.get(_TAG)
+        if tag is None:
+            return {k: _from_json(v, columns) for k, v in data.items()}
+        if tag == "r":
+            return record_type(columns[data["c"]])(_from_json(v, columns) for v in data["v"])
+        if tag == "dt":
+            return datetime.datetime.fromisoformat(data["v"])
+        if tag == "d":
+            return datetime.date.fromisoformat(data["v"])
+        if tag == "na":
+            return NotAvailable(HGVSDataNotAvailableError(*data["v"]))
+        raise ValueError(f"Unknown shared cache tag '{tag}'")
+    return data
+
+
+def encode_value(value) -> bytes:
+    """ Compact JSON, zlib compressed (and prefixed with 'z') if large """
+    columns = []
+    data = _to_json(value, columns)
+    encoded = json.dumps([columns, data], separators=(",", ":")).encode()
+    if len(encoded) >= _COMPRESS_MIN_SIZE:
+        encoded = b"z" + zlib.compress(encoded)
+    return encoded
+
+
+def decode_value(encoded: bytes, immutable=True):
+    if encoded[:1] == b"z":
+        encoded = zlib.decompress(encoded[1:])
+    columns, data = json.loads(encoded)
+    value = _from_json(data, columns)
+    if immutable:
+        value = freeze(value)
+    return value
+
+
+class SharedCache(abc.ABC):
+    """ Backend for TxDataCache's second level cache. Keys are tuples of str/int """
+
+    @abc.abstractmethod
+    def get_many(self, keys: Iterable[tuple], immutable=True) -> dict:
+        """ Returns dict of key: value for the (unexpired) keys that are present """
+
+    @abc.abstractmethod
+    def put_many(self, items: Iterable[tuple], ttl: Optional[float] = None):
+        """ items: (key, value) pairs """
+
+    def get(self, key, default=MISSING, immutable=True):
+        return self.get_many([key], immutable=immutable).get(key, default)
+
+    def put(self, key, value, ttl: Optional[float] = None):
+        self.put_many([(key, value)], ttl=ttl)
+
+
+class SQLiteSharedCache(SharedCache):
+    """ SQLite file in WAL mode, so many processes can read while one writes """
+
+    _CREATE_TABLE = """
+        CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            value BLOB NOT NULL,
+            expires REAL
+        ) WITHOUT ROWID
+    """
+    # SQLite's default SQLITE_MAX_VARIABLE_NUMBER is 999 in older versions
+    max_query_keys = 500
+
+    def __init__(self, filename, timeout: float = 30.0):
+        """ timeout: seconds to wait for another process' write lock """
+        self.filename = filename
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expirations = 0
+        with self._connection() as conn:
+            conn.execute(self._CREATE_TABLE)
+
+    def _connection(self):
+        """ Connection per thread and process (connections mustn't be used across fork) """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.filename, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _encode_key(key) -> str:
+        return json.dumps(key, separators=(",", ":"), default=_scalar_to_json)
+
+    def get_many(self, keys, immutable=True):
+        keys = list(keys)
+        encoded_keys = {self._encode_key(key): key for key in keys}
+        encoded_key_list = list(encoded_keys)
+        conn = self._connection()
+        now = time.time()
+        found = {}
+        expired = 0
+        for i in range(0, len(encoded_key_list), self.max_query_keys):
+            chunk = encoded_key_list[i:i + self.max_query_keys]
+            sql = f"SELECT key, value, expires FROM cache WHERE key IN ({','.join('?' * len(chunk))})"
+            for encoded_key, value, expires in conn.execute(sql, chunk):
+                if expires is not None and expires <= now:
+                    expired += 1
+                    continue
+                found[encoded_keys[encoded_key]] = decode_value(value, immutable=immutable)
+
+        with self._lock:
+            self._hits += len(found)
+            self._misses += len(encoded_keys) - len(found)
+            self._expirations += expired
+        return found
+
+    def put_many(self, items, ttl=None):
+        expires = time.time() + ttl if ttl is not None else None
+        rows = []
+        for key, value in items:
+            try:
+                rows.append((self._encode_key(key), encode_value(value), expires))
+            except TypeError as e:
+                _logger.warning("Not caching %s: %s", key, e)
+        if rows:
+            with self._connection() as conn:
+                conn.executemany("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)", rows)
+
+    def purge_expired(self):
+        """ Expired entries are ignored on read - this deletes them to reclaim space """
+        with self._connection() as conn:
+            conn.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM cache")
+
+    def cache_info(self) -> CacheInfo:
+        (currsize,) = self._connection().execute("SELECT COUNT(*) FROM cache").fetchone()
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, 0, self._expirations, currsize, None)
@@ -1,18 +1,28 @@
 import abc
+import contextlib
 import gzip
-import json
-import requests
+import logging
+import os
+import threading
+import time
+import warnings
 
 from collections import defaultdict
 from lazy import lazy
-from intervaltree import IntervalTree
-from typing import List
+from typing import List, Optional
 
 from bioutils.assemblies import make_ac_name_map, make_name_ac_map
 
 from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+from src.hgvs_dataproviders_rest.txdata.http_transport import HTTPTransport, get_default_transport
+from src.hgvs_dataproviders_rest.txdata.interval_index import IntervalIndex
+from src.hgvs_dataproviders_rest.txdata.json_stream import JSONStreamReader
+from src.hgvs_dataproviders_rest.txdata.records import record_type
+from src.hgvs_dataproviders_rest.txdata.transcript_model import Transcript, TranscriptBuild, convert_gap_to_cigar
 from src.hgvs_dataproviders_rest.txdata.txdata_interface import TxDataInterface
 
+_logger = logging.getLogger(__name__)
+
 
 def get_ac_name_map(assembly_name):
     if assembly_name == "GRCh37":
@@ -25,6 +35,37 @@ def get_name_ac_map(assembly_name):
     return make_name_ac_map(assembly_name)
 
 
+# Large sections of the cdot JSON that are read one record at a time
+CDOT_STREAMED_SECTIONS = {"transcripts", "genes"}
+
+
+@contextlib.contextmanager
+def open_cdot_file(file_or_filename):
+    """ Opens (and closes) cdot JSON filenames (.json or .json.gz), file objects are passed through """
+    if isinstance(file_or_filename, str):
+        if file_or_filename.endswith(".gz"):
+            f = gzip.open(file_or_filename)
+        else:
+            f = open(file_or_filename, "rb")
+        with f:
+            yield f
+    else:
+        yield file_or_filename
+
+
+def iter_cdot_data(f):
+    """ Yields (section, key, value) from a cdot JSON file without loading it all into memory.
+        'transcripts' and 'genes' are streamed one record at a time (section is the name, key is the
+        transcript accession/gene ID). Other top level values are yielded as (None, key, value) """
+    reader = JSONStreamReader(f)
+    for section in reader.iter_object_keys():
+        if section in CDOT_STREAMED_SECTIONS:
+            for key, value in reader.iter_object_items():
+                yield section, key, value
+        else:
+            yield None, section, reader.read_value()
+
+
 
 class AbstractJSONDataProvider(TxDataInterface):
     # All cdot data is 'splign', it's the method used in NCBI/Ensembl GTFs, and we also only pull out 'splign' from UTA
@@ -35,7 +76,7 @@ class AbstractJSONDataProvider(TxDataInterface):
     # data will have schema version in it, so we can test what version this client expects (same major version)
     cdot_client_data_schema_version = "0.2.31"  # From copying cdot code into this project 2025-11-05
 
-    def __init__(self, assemblies: List[str] = None, mode=None, cache=None):
+    def __init__(self, assemblies: List[str] = None, mode=None, cache=None, seqfetcher=None):
         """ assemblies: defaults to ["GRCh37", "GRCh38"]
             seqfetcher defaults to biocommons SeqFetcher()
         """
@@ -43,6 +84,7 @@ class AbstractJSONDataProvider(TxDataInterface):
             assemblies = ["GRCh37", "GRCh38"]
 
         super().__init__()
+        self.seqfetcher = seqfetcher
         self.assembly_maps = {}
         for assembly_name in assemblies:
             self.assembly_maps[assembly_name] = get_ac_name_map(assembly_name)
@@ -52,28 +94,28 @@ class AbstractJSONDataProvider(TxDataInterface):
 
 
     @abc.abstractmethod
-    def _get_transcript(self, tx_ac):
+    def _get_transcript(self, tx_ac) -> Optional[Transcript]:
         pass
 
     @abc.abstractmethod
     def _get_gene(self, gene):
         pass
 
-    def _get_transcript_coordinates_for_contig(self, transcript, alt_ac):
+    def _prefetch_transcripts(self, tx_acs):
+        """ Called before bulk (_many) lookups - override to retrieve many transcripts at once """
+        pass
+
+    def _get_transcript_coordinates_for_contig(self, transcript: Transcript, alt_ac) -> Optional[TranscriptBuild]:
         assembly = self.assembly_by_contig.get(alt_ac)
         if assembly is None:
             supported_assemblies = ", ".join(self.assembly_maps.keys())
             raise ValueError(f"Contig '{alt_ac}' not supported. Supported assemblies: {supported_assemblies}")
 
-        return transcript["genome_builds"].get(assembly)
+        return transcript.builds.get(assembly)
 
     @staticmethod
-    def _get_contig_start_end_strand(build_data):
-        contig = build_data["contig"]
-        strand = 1 if build_data["strand"] == "+" else -1
-        start = build_data["exons"][0][0]
-        end = build_data["exons"][-1][1]
-        return contig, start, end, strand
+    def _get_contig_start_end_strand(build: TranscriptBuild):
+        return build.contig, build.start, build.end, build.strand
 
     def data_version(self):
         return self.required_version
@@ -93,28 +135,7 @@ class AbstractJSONDataProvider(TxDataInterface):
     def sequence_source(self):
         return self.seqfetcher.source
 
-    @staticmethod
-    def _convert_gap_to_cigar(gap):
-        """
-                gap = 'M196 I1 M61 I1 M181'
-                CIGAR = '194=1D60=1D184='
-        """
-
-        # This has to/from sequences inverted, so insertion is a deletion
-        OP_CONVERSION = {
-            "M": "=",
-            "I": "D",
-            "D": "I",
-        }
-
-        cigar_ops = []
-        for gap_op in gap.split():
-            gap_code = gap_op[0]
-            length = int(gap_op[1:])
-
-            cigar_ops.append(str(length) + OP_CONVERSION[gap_code])
-
-        return "".join(cigar_ops)
+    _convert_gap_to_cigar = staticmethod(convert_gap_to_cigar)
 
     def get_tx_exons(self, tx_ac, alt_ac, alt_aln_method):
         self._check_alt_aln_method(alt_aln_method)
@@ -122,81 +143,37 @@ class AbstractJSONDataProvider(TxDataInterface):
         if not transcript:
             return None
 
-        assembly_coordinates = self._get_transcript_coordinates_for_contig(transcript, alt_ac)
+        if build := self._get_transcript_coordinates_for_contig(transcript, alt_ac):
+            return build.tx_exons(tx_ac, alt_ac, alt_aln_method)  # Genomic order
+        return None
 
-        tx_exons = []  # Genomic order
-        exons = assembly_coordinates["exons"]
-        alt_strand = 1 if assembly_coordinates["strand"] == "+" else -1
+    def get_tx_exons_many(self, tx_exons_args):
+        tx_exons_args = list(tx_exons_args)
+        self._prefetch_transcripts([args[0] for args in tx_exons_args])
+        return super().get_tx_exons_many(tx_exons_args)
 
-        for (alt_start_i, alt_end_i, exon_id, cds_start_i, cds_end_i, gap) in exons:
-            # cdot tx_start_i/tx_end_i is 1 based while UTA is 0 based
-            tx_start_i = cds_start_i - 1
-            tx_end_i = cds_end_i
-            if gap is not None:
-                cigar = self._convert_gap_to_cigar(gap)
-            else:
-                length = alt_end_i - alt_start_i  # Will be same for both transcript/genomic
-                cigar = str(length) + "="
-
-            exon_data = {
-                'tx_ac': tx_ac,
-                'alt_ac': alt_ac,
-                'alt_strand': alt_strand,
-                'alt_aln_method': alt_aln_method,
-                'ord': exon_id,
-                'tx_start_i': tx_start_i,
-                'tx_end_i': tx_end_i,
-                'alt_start_i': alt_start_i,
-                'alt_end_i': alt_end_i,
-                'cigar': cigar,
-            }
-            tx_exons.append(exon_data)
+    def get_tx_identity_info_many(self, tx_acs):
+        tx_acs = list(tx_acs)
+        self._prefetch_transcripts(tx_acs)
+        return super().get_tx_identity_info_many(tx_acs)
 
-        return tx_exons
+    def get_tx_info_many(self, tx_info_args):
+        tx_info_args = list(tx_info_args)
+        self._prefetch_transcripts([args[0] for args in tx_info_args])
+        return super().get_tx_info_many(tx_info_args)
 
     def get_tx_identity_info(self, tx_ac):
-        # Get any transcript as it's assembly independent
-        transcript = self._get_transcript(tx_ac)
-        if not transcript:
-            return None
-
-        tx_info = self._get_transcript_info(transcript)
-
-        # Only using lengths (same in each build) not coordinates so grab anything
-        exons = []
-        for build_coordinates in transcript["genome_builds"].values():
-            exons = build_coordinates["exons"]
-            break
-
-        stranded_order_exons = sorted(exons, key=lambda e: e[2])  # sort by exon_id
-        tx_info["lengths"] = [ex[4] + 1 - ex[3] for ex in stranded_order_exons]
-        tx_info["tx_ac"] = tx_ac
-        tx_info["alt_ac"] = tx_ac  # Same again
-        tx_info["alt_aln_method"] = "transcript"
-        return tx_info
-
-    @staticmethod
-    def _get_transcript_info(transcript):
-        gene_name = transcript["gene_name"]
-        cds_start_i = transcript.get("start_codon")
-        cds_end_i = transcript.get("stop_codon")
-        return {
-            "hgnc": gene_name,
-            "cds_start_i": cds_start_i,
-            "cds_end_i": cds_end_i,
-        }
+        # Lengths are assembly independent, so any build is used
+        if transcript := self._get_transcript(tx_ac):
+            return transcript.tx_identity_info(tx_ac)
+        return None
 
     def get_tx_info(self, tx_ac, alt_ac, alt_aln_method):
         self._check_alt_aln_method(alt_aln_method)
 
         if transcript := self._get_transcript(tx_ac):
-            for build_data in transcript["genome_builds"].values():
-                if alt_ac == build_data["contig"]:
-                    tx_info = self._get_transcript_info(transcript)
-                    tx_info["tx_ac"] = tx_ac
-                    tx_info["alt_ac"] = alt_ac
-                    tx_info["alt_aln_method"] = self.NCBI_ALN_METHOD
-                    return tx_info
+            if transcript.get_build_for_contig(alt_ac):
+                return transcript.tx_info(tx_ac, alt_ac, self.NCBI_ALN_METHOD)
 
         raise HGVSDataNotAvailableError(
             f"No tx_info for (tx_ac={tx_ac},alt_ac={alt_ac},alt_aln_method={alt_aln_method})"
@@ -205,10 +182,10 @@ class AbstractJSONDataProvider(TxDataInterface):
     def get_tx_mapping_options(self, tx_ac):
         mapping_options = []
         if transcript := self._get_transcript(tx_ac):
-            for build_coordinates in transcript["genome_builds"].values():
+            for build in transcript.builds.values():
                 mo = {
                     "tx_ac": tx_ac,
-                    "alt_ac": build_coordinates["contig"],
+                    "alt_ac": build.contig,
                     "alt_aln_method": self.NCBI_ALN_METHOD,
                 }
                 mapping_options.append(mo)
@@ -239,7 +216,7 @@ class AbstractJSONDataProvider(TxDataInterface):
     def get_pro_ac_for_tx_ac(self, tx_ac):
         pro_ac = None
         if transcript := self._get_transcript(tx_ac):
-            pro_ac = transcript.get("protein")
+            pro_ac = transcript.protein
         return pro_ac
 
     def get_similar_transcripts(self, tx_ac):
@@ -272,12 +249,39 @@ class AbstractJSONDataProvider(TxDataInterface):
         major, minor, patch = version.split(".")
         return 1000 * int(major) + int(minor)
 
-    def _validate_schema_compatability(self, json_schema_version: str):
+    @classmethod
+    def _validate_schema_compatability(cls, json_schema_version: str):
         """ Raise an error if versions out of sync """
-        cdot_client_data_schema_int = self.get_data_schema_int(self.cdot_client_data_schema_version)
-        cdot_data_schema_version = self.get_data_schema_int(json_schema_version)
+        cdot_client_data_schema_int = cls.get_data_schema_int(cls.cdot_client_data_schema_version)
+        cdot_data_schema_version = cls.get_data_schema_int(json_schema_version)
         if cdot_client_data_schema_int < cdot_data_schema_version:
-            raise ValueError(f"This cdot client ({self.cdot_client_data_schema_version}) cannot read {json_schema_version=} - please upgrade.")
+            raise ValueError(f"This cdot client ({cls.cdot_client_data_schema_version}) cannot read "
+                             f"{json_schema_version=} - please upgrade.")
+
+
+class _IntervalTreeIndex:
+    """ IntervalIndex queries of an intervaltree.IntervalTree (from deprecated _get_contig_interval_tree) """
+    def __init__(self, interval_tree):
+        self.interval_tree = interval_tree
+
+    def __len__(self):
+        return len(self.interval_tree)
+
+    def overlapping(self, start_i, end_i):
+        return [interval.data for interval in self.interval_tree[start_i:end_i + 1]]
+
+    def overlapping_many(self, starts, ends):
+        return [self.overlapping(start_i, end_i) for start_i, end_i in zip(starts, ends)]
+
+
+def _get_contig_interval_tree_index(self, alt_ac):
+    if interval_tree := self._get_contig_interval_tree(alt_ac):
+        return _IntervalTreeIndex(interval_tree)
+    return None
+
+
+_TxForGeneRecord = record_type(["hgnc", "cds_start_i", "cds_end_i", "tx_ac", "alt_ac", "alt_aln_method"])
+
 
 class LocalDataProvider(AbstractJSONDataProvider):
     """ For JSON and Redis providers (implemented in cdot_rest)
@@ -287,32 +291,92 @@ class LocalDataProvider(AbstractJSONDataProvider):
     def _get_transcript_ids_for_gene(self, gene):
         pass
 
+    # Set by providers that know which cdot version their data was generated with
+    cdot_data_version = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Subclasses written for the previous API return an intervaltree.IntervalTree per contig
+        if "_get_contig_interval_tree" in vars(cls) and "_get_contig_interval_index" not in vars(cls):
+            warnings.warn(f"{cls.__name__}._get_contig_interval_tree() is deprecated, implement "
+                          f"_get_contig_interval_index() returning an IntervalIndex instead",
+                          DeprecationWarning, stacklevel=2)
+            cls._get_contig_interval_index = _get_contig_interval_tree_index
+
     @abc.abstractmethod
-    def _get_contig_interval_tree(self, alt_ac):
+    def _get_contig_interval_index(self, alt_ac):
+        """ Return IntervalIndex of transcript IDs (or None if no transcripts on contig) """
         pass
 
+    def _get_transcript_ids_for_region(self, alt_ac, start_i, end_i):
+        if contig_interval_index := self._get_contig_interval_index(alt_ac):
+            return contig_interval_index.overlapping(start_i, end_i)
+        return []
+
+    def _get_transcript_ids_for_regions(self, alt_ac, starts, ends):
+        if contig_interval_index := self._get_contig_interval_index(alt_ac):
+            return contig_interval_index.overlapping_many(starts, ends)
+        return [[] for _ in starts]
+
     def get_tx_for_gene(self, gene):
-        """ return transcript info records for supplied gene, in order of decreasing length """
+        """ return a list of transcript info records for supplied gene, in order of decreasing length
+            Built on first request for a gene, then the same records are returned in a new list. Records are
+            read-only mappings (use dict(record) for a modifiable copy) """
+        tx_list = self._tx_for_gene.get(gene)
+        if tx_list is None:
+            tx_list = self._get_sorted_tx_for_gene(gene)
+            if tx_list:  # Don't grow the index for unknown genes
+                tx_list = self._tx_for_gene.setdefault(gene, tx_list)
+        return list(tx_list)
 
+    @lazy
+    def _tx_for_gene(self):
+        """ gene: tuple of Records from get_tx_for_gene """
+        return {}
+
+    def _get_sorted_tx_for_gene(self, gene):
         tx_list = []  # Store in tuples with length, so we can sort before returning
-        for transcript_id in self._get_transcript_ids_for_gene(gene):
-            transcript_data = self._get_transcript(transcript_id)
-            cds_start_i = transcript_data.get("start_codon")
-            cds_end_i = transcript_data.get("stop_codon")
-            for build_data in transcript_data["genome_builds"].values():
-                contig, tx_start, tx_end, _ = self._get_contig_start_end_strand(build_data)
+        for transcript_id in sorted(self._get_transcript_ids_for_gene(gene)):  # Ties in accession order
+            transcript = self._get_transcript(transcript_id)
+            for build in transcript.builds.values():
+                contig, tx_start, tx_end, _ = self._get_contig_start_end_strand(build)
                 length = tx_end - tx_start
-                tx_data = {
-                    "hgnc": gene,
-                    "cds_start_i": cds_start_i,
-                    "cds_end_i": cds_end_i,
-                    "tx_ac": transcript_id,
-                    "alt_ac": contig,
-                    "alt_aln_method": self.NCBI_ALN_METHOD,
-                }
+                tx_data = _TxForGeneRecord((gene, transcript.cds_start_i, transcript.cds_end_i, transcript_id,
+                                            contig, self.NCBI_ALN_METHOD))
                 tx_list.append((length, tx_data))
 
-        return [x[1] for x in sorted(tx_list, key=lambda x: x[0], reverse=True)]
+        return tuple(x[1] for x in sorted(tx_list, key=lambda x: x[0], reverse=True))
+
+    def _check_cdot_data_version(self, min_version, description):
+        if self.cdot_data_version is not None and self.cdot_data_version < min_version:
+            cdot_version = '.'.join(str(v) for v in self.cdot_data_version)
+            required_version = '.'.join(str(v) for v in min_version)
+            msg = f"{description} not in your JSON data version '{cdot_version}'. " \
+                  f"Please use data generated from cdot >= {required_version}"
+            raise NotImplementedError(msg)
+
+    def get_pro_ac_for_tx_ac(self, tx_ac):
+        self._check_cdot_data_version((0, 2, 8), "ProteinID")
+        return super().get_pro_ac_for_tx_ac(tx_ac)
+
+    def get_gene_info(self, gene):
+        self._check_cdot_data_version((0, 2, 10), "Gene Info")
+        return super().get_gene_info(gene)
+
+    def _get_tx_for_region_record(self, transcript_id, alt_ac):
+        transcript = self._get_transcript(transcript_id)
+        build = self._get_transcript_coordinates_for_contig(transcript, alt_ac)
+        contig, tx_start, tx_end, strand = self._get_contig_start_end_strand(build)
+        if contig != alt_ac:
+            return None
+        return {
+            "alt_ac": alt_ac,
+            "alt_aln_method": self.NCBI_ALN_METHOD,
+            "alt_strand": strand,
+            "start_i": tx_start,
+            "end_i": tx_end,
+            "tx_ac": transcript_id,
+        }
 
     def get_tx_for_region(self, alt_ac, alt_aln_method, start_i, end_i):
         """ return transcripts that overlap given region """
@@ -320,68 +384,200 @@ class LocalDataProvider(AbstractJSONDataProvider):
         self._check_alt_aln_method(alt_aln_method)
 
         tx_list = []
-        contig_iv_tree = self._get_contig_interval_tree(alt_ac)
-        for interval in contig_iv_tree[start_i:end_i+1]:
-            transcript_id = interval.data
-            transcript_data = self._get_transcript(transcript_id)
-            build_data = self._get_transcript_coordinates_for_contig(transcript_data, alt_ac)
-            contig, tx_start, tx_end, strand = self._get_contig_start_end_strand(build_data)
-            if contig == alt_ac:
-                tx_list.append({
-                    "alt_ac": alt_ac,
-                    "alt_aln_method": self.NCBI_ALN_METHOD,
-                    "alt_strand": strand,
-                    "start_i": tx_start,
-                    "end_i": tx_end,
-                    "tx_ac": transcript_id,
-                })
+        for transcript_id in self._get_transcript_ids_for_region(alt_ac, start_i, end_i):
+            if tx_record := self._get_tx_for_region_record(transcript_id, alt_ac):
+                tx_list.append(tx_record)
         return tx_list
 
+    def get_tx_for_regions(self, alt_ac, alt_aln_method, starts, ends):
+        """ return transcripts that overlap each region - uses one sorted sweep through the contig index """
+
+        self._check_alt_aln_method(alt_aln_method)
+
+        tx_records = {}  # Neighbouring regions mostly hit the same transcripts, so only build them once
+        tx_lists = []
+        for transcript_ids in self._get_transcript_ids_for_regions(alt_ac, starts, ends):
+            tx_list = []
+            for transcript_id in transcript_ids:
+                if transcript_id not in tx_records:
+                    tx_records[transcript_id] = self._get_tx_for_region_record(transcript_id, alt_ac)
+                if tx_record := tx_records[transcript_id]:
+                    tx_list.append(dict(tx_record))
+            tx_lists.append(tx_list)
+        return tx_lists
+
     @staticmethod
     def _get_tx_by_gene_and_intervals(transcript_iter_items):
-        # The region query works on exons, but storing all of these makes the interval tree huge
+        # The region query works on exons, but storing all of these makes the interval index huge
         # So we just store the start/end of each transcript ID, then look up the exons at retrieval time
 
         tx_by_gene = defaultdict(set)
-        tx_intervals = defaultdict(IntervalTree)
-        for transcript_id, transcript_data in transcript_iter_items:
-            if gene_name := transcript_data['gene_name']:
+        contig_intervals = defaultdict(lambda: ([], [], []))  # starts, ends, transcript IDs
+        for transcript_id, transcript in transcript_iter_items:
+            if gene_name := transcript.gene_name:
                 tx_by_gene[gene_name].add(transcript_id)
 
-            for build_data in transcript_data["genome_builds"].values():
-                contig = build_data["contig"]
-                tx_start = build_data["exons"][0][0]
-                tx_end = build_data["exons"][-1][1]
-                tx_intervals[contig][tx_start:tx_end] = transcript_id
+            for build in transcript.builds.values():
+                starts, ends, transcript_ids = contig_intervals[build.contig]
+                starts.append(build.start)
+                ends.append(build.end)
+                transcript_ids.append(transcript_id)
+
+        tx_intervals = {contig: IntervalIndex.from_intervals(*intervals)
+                        for contig, intervals in contig_intervals.items()}
         return tx_by_gene, tx_intervals
 
 
 class JSONDataProvider(LocalDataProvider):
-    """ Local JSON file """
-    def __init__(self, file_or_filename_list, mode=None, cache=None, seqfetcher=None):
+    """ Local JSON file
+
+        Files are streamed, one transcript at a time, into compact Transcript records (see transcript_model)
+        so peak memory stays close to the size of the loaded data rather than the parsed JSON
+
+        Region indexes are built per contig, on the first query of that contig, unless prebuild_indexes=True.
+        Seconds taken to build each contig's index are in index_build_times
+
+        Transcripts in more than one file (eg RefSeq GRCh37 and GRCh38) are merged as they are read, so memory
+        grows with the number of unique transcripts. Where files overlap, precedence picks the winner:
+
+            * "last" - later files in the list (default)
+            * "first" - earlier files in the list
+            * "newest" - files with a newer cdot_version, then later files
+
+        Provenance is kept in transcript_sources (see get_transcript_sources) """
+    PRECEDENCES = ("last", "first", "newest")
+
+    def __init__(self, file_or_filename_list, mode=None, cache=None, seqfetcher=None,
+                 prebuild_indexes: bool = False, precedence: str = "last", merge_genome_builds: bool = True):
+        """ prebuild_indexes: build every contig's region index at startup (slower start, faster first queries)
+            precedence: which file wins for transcripts/genes in multiple files (see class docs)
+            merge_genome_builds: combine a transcript's genome builds from all files, rather than only using
+                                 the winning file's transcript """
+        if precedence not in self.PRECEDENCES:
+            raise ValueError(f"{precedence=} must be one of: {', '.join(self.PRECEDENCES)}")
+        self.precedence = precedence
+        self.merge_genome_builds = merge_genome_builds
+        self._contig_interval_indexes = {}
+        self._contig_index_locks = {}  # Per contig, so only threads needing that contig wait for its build
+        self.index_build_times = {}
         assemblies = set()
         self.transcripts = {}
         self.genes = {}
-        for file_or_filename in file_or_filename_list:
-            if isinstance(file_or_filename, str):
-                if file_or_filename.endswith(".gz"):
-                    f = gzip.open(file_or_filename)
-                else:
-                    f = open(file_or_filename)
-            else:
-                f = file_or_filename
-            data = json.load(f)
-            assemblies.update(data["genome_builds"])
-            self.transcripts.update(data["transcripts"])
-            if genes := data.get("genes"):
-                for g in genes.values():
-                    if gene_symbol := g.get("gene_symbol"):
-                        self.genes[gene_symbol] = g
-            cdot_data_version_str = data["cdot_version"]
+        self.sources = []  # {"filename": ..., "cdot_version": ...} per file
+        # tx_ac: source indexes of the transcript fields, then of each build (in transcript.builds order)
+        self.transcript_sources = {}
+        self._gene_sources = {}
+        self._source_tuples = {}  # Source index tuples are shared between transcripts
+        cdot_data_versions = []
+        for source_index, file_or_filename in enumerate(file_or_filename_list):
+            header = {}
+            source = {"filename": getattr(file_or_filename, "name", str(file_or_filename)), "cdot_version": None}
+            self.sources.append(source)
+            # "newest" needs the file's cdot_version to compare records. It comes before transcripts in cdot files,
+            # but if not, records are held until the whole file has been read
+            pending = []
+            with open_cdot_file(file_or_filename) as f:
+                for section, key, value in iter_cdot_data(f):
+                    if section is None:
+                        header[key] = value
+                        if key == "cdot_version":
+                            source["cdot_version"] = self._parse_cdot_version(value)
+                        continue
+                    if section == "transcripts":
+                        value = Transcript.from_cdot(value)
+                    if self.precedence == "newest" and source["cdot_version"] is None:
+                        pending.append((section, key, value))
+                    else:
+                        self._add_cdot_record(section, key, value, source_index)
+            for section, key, value in pending:
+                self._add_cdot_record(section, key, value, source_index)
+            assemblies.update(header["genome_builds"])
+            cdot_data_version_str = header["cdot_version"]
             self._validate_schema_compatability(cdot_data_version_str)
-            self.cdot_data_version = tuple(int(v) for v in cdot_data_version_str.split("."))
+            cdot_data_versions.append(self._parse_cdot_version(cdot_data_version_str))
+        self._source_tuples.clear()
+        # Features are only available if every file has them
+        self.cdot_data_version = min(cdot_data_versions) if cdot_data_versions else None
 
         super().__init__(assemblies=assemblies, mode=mode, cache=cache, seqfetcher=seqfetcher)
+        if prebuild_indexes:
+            self.build_contig_indexes()
+
+    @staticmethod
+    def _parse_cdot_version(cdot_version_str):
+        return tuple(int(v) for v in cdot_version_str.split("."))
+
+    def _takes_precedence(self, source_index, existing_source_index) -> bool:
+        """ Whether data from source_index replaces the same data from existing_source_index """
+        if self.precedence == "first":
+            return source_index <= existing_source_index
+        if self.precedence == "newest":
+            version = self.sources[source_index]["cdot_version"] or ()
+            existing_version = self.sources[existing_source_index]["cdot_version"] or ()
+            if version != existing_version:
+                return version > existing_version
+        return source_index >= existing_source_index
+
+    def _add_cdot_record(self, section, key, value, source_index):
+        if section == "transcripts":
+            self._add_transcript(key, value, source_index)
+        elif section == "genes":
+            if gene_symbol := value.get("gene_symbol"):
+                gene_source = self._gene_sources.get(gene_symbol)
+                if gene_source is None or self._takes_precedence(source_index, gene_source):
+                    self.genes[gene_symbol] = value
+                    self._gene_sources[gene_symbol] = source_index
+
+    def _add_transcript(self, tx_ac, transcript, source_index):
+        existing = self.transcripts.get(tx_ac)
+        if existing is None:
+            sources = (source_index,) * (1 + len(transcript.builds))
+        else:
+            fields_source, *build_sources = self.transcript_sources[tx_ac]
+            takes_precedence = self._takes_precedence(source_index, fields_source)
+            if not self.merge_genome_builds:
+                if not takes_precedence:
+                    return
+                sources = (source_index,) * (1 + len(transcript.builds))
+            else:
+                builds = dict(existing.builds)
+                build_source = dict(zip(existing.builds, build_sources))
+                for genome_build, build in transcript.builds.items():
+                    existing_build_source = build_source.get(genome_build)
+                    if existing_build_source is None or self._takes_precedence(source_index, existing_build_source):
+                        builds[genome_build] = build
+                        build_source[genome_build] = source_index
+
+                if takes_precedence:
+                    fields_source = source_index
+                else:
+                    transcript = existing
+                transcript = Transcript(transcript.gene_name, transcript.cds_start_i, transcript.cds_end_i,
+                                        transcript.protein, builds)
+                sources = (fields_source, *(build_source[genome_build] for genome_build in builds))
+
+        self.transcripts[tx_ac] = transcript
+        self.transcript_sources[tx_ac] = self._source_tuples.setdefault(sources, sources)
+
+    def data_source(self):
+        return ";".join(f"{os.path.abspath(source['filename'])}:{self._format_cdot_version(source['cdot_version'])}"
+                        for source in self.sources)
+
+    @staticmethod
+    def _format_cdot_version(cdot_version) -> str:
+        return ".".join(map(str, cdot_version or ()))
+
+    def get_transcript_sources(self, tx_ac) -> Optional[dict]:
+        """ Filenames the transcript came from: {"transcript": filename, "genome_builds": {build: filename}} """
+        transcript = self.transcripts.get(tx_ac)
+        if transcript is None:
+            return None
+        fields_source, *build_sources = self.transcript_sources[tx_ac]
+        return {
+            "transcript": self.sources[fields_source]["filename"],
+            "genome_builds": {genome_build: self.sources[source_index]["filename"]
+                              for genome_build, source_index in zip(transcript.builds, build_sources)},
+        }
 
     def _get_transcript(self, tx_ac):
         return self.transcripts.get(tx_ac)
@@ -390,37 +586,73 @@ class JSONDataProvider(LocalDataProvider):
         return self.genes.get(gene)
 
     def _get_transcript_ids_for_gene(self, gene):
-        tx_by_gene, _ = self._tx_by_gene_and_intervals
-        return tx_by_gene[gene]
+        tx_by_gene, _ = self._tx_by_gene_and_contig
+        return tx_by_gene.get(gene, ())
 
-    def _get_contig_interval_tree(self, alt_ac):
-        _, tx_intervals = self._tx_by_gene_and_intervals
-        return tx_intervals[alt_ac]
+    @lazy
+    def _tx_by_gene_and_contig(self):
+        """ Transcript IDs by gene and by contig - a quick pass, leaving coordinates to the contig index builds """
+        tx_by_gene = defaultdict(set)
+        tx_by_contig = defaultdict(dict)  # dict as an ordered set
+        for transcript_id, transcript in self.transcripts.items():
+            if gene_name := transcript.gene_name:
+                tx_by_gene[gene_name].add(transcript_id)
+            for build in transcript.builds.values():
+                tx_by_contig[build.contig][transcript_id] = None
+        return tx_by_gene, tx_by_contig
+
+    def _get_contig_intervals(self, alt_ac):
+        """ starts, ends, transcript IDs """
+        _, tx_by_contig = self._tx_by_gene_and_contig
+        starts, ends, transcript_ids = [], [], []
+        for transcript_id in tx_by_contig.get(alt_ac, ()):
+            for build in self.transcripts[transcript_id].builds.values():
+                if build.contig == alt_ac:
+                    starts.append(build.start)
+                    ends.append(build.end)
+                    transcript_ids.append(transcript_id)
+        return starts, ends, transcript_ids
+
+    def _set_contig_interval_index(self, alt_ac, contig_interval_index, build_time):
+        self._contig_interval_indexes[alt_ac] = contig_interval_index
+        self.index_build_times[alt_ac] = build_time
+        _logger.debug("Built region index for %s (%d transcripts) in %.3fs",
+                      alt_ac, len(contig_interval_index), build_time)
+
+    def _get_contig_interval_index(self, alt_ac):
+        if (contig_interval_index := self._contig_interval_indexes.get(alt_ac)) is not None:
+            return contig_interval_index
+
+        _, tx_by_contig = self._tx_by_gene_and_contig
+        if alt_ac not in tx_by_contig:
+            return None
 
-    def get_pro_ac_for_tx_ac(self, tx_ac):
-        if self.cdot_data_version < (0, 2, 8):
-            cdot_version = '.'.join(str(v) for v in self.cdot_data_version)
-            msg = f"ProteinID not in your JSON data version '{cdot_version}'. " \
-                  "Please use data generated from cdot >= 0.2.8"
-            raise NotImplementedError(msg)
-        return super().get_pro_ac_for_tx_ac(tx_ac)
+        with self._contig_index_locks.setdefault(alt_ac, threading.Lock()):
+            if alt_ac not in self._contig_interval_indexes:  # Another thread may have built it while we waited
+                start = time.perf_counter()
+                contig_interval_index = IntervalIndex.from_intervals(*self._get_contig_intervals(alt_ac))
+                self._set_contig_interval_index(alt_ac, contig_interval_index, time.perf_counter() - start)
+        return self._contig_interval_indexes[alt_ac]
 
-    @lazy
-    def _tx_by_gene_and_intervals(self):
-        return self._get_tx_by_gene_and_intervals(self.transcripts.items())
+    def build_contig_indexes(self):
+        """ Build the region indexes for every contig not yet indexed
 
-    def get_gene_info(self, gene):
-        if self.cdot_data_version < (0, 2, 10):
-            cdot_version = '.'.join(str(v) for v in self.cdot_data_version)
-            msg = f"Gene Info not in your JSON data version '{cdot_version}'. " \
-                  "Please use data generated from cdot >= 0.2.10"
-            raise NotImplementedError(msg)
-        return super().get_gene_info(gene)
+            Built in this process: most of the time is walking the transcript records for their coordinates, which
+            would cost as much again to pickle to worker processes """
+        _, tx_by_contig = self._tx_by_gene_and_contig
+        start = time.perf_counter()
+        for contig in tx_by_contig:
+            self._get_contig_interval_index(contig)
+        _logger.info("Built region indexes for %d contigs in %.3fs", len(tx_by_contig), time.perf_counter() - start)
 
 
 class RESTDataProvider(AbstractJSONDataProvider):
+    # Maximum number of transcripts requested in each bulk request
+    bulk_request_size = 1000
 
-    def __init__(self, url=None, secure=True, mode=None, cache=None, seqfetcher=None):
+    def __init__(self, url=None, secure=True, mode=None, cache=None, seqfetcher=None,
+                 transport: Optional[HTTPTransport] = None):
+        """ transport: defaults to the shared get_default_transport() """
         assemblies = ["GRCh37", "GRCh38"]
         super().__init__(assemblies=assemblies, mode=mode, cache=cache, seqfetcher=seqfetcher)
         if url is None:
@@ -429,12 +661,26 @@ class RESTDataProvider(AbstractJSONDataProvider):
             else:
                 url = "http://cdot.cc"
         self.url = url
+        self.transport = transport or get_default_transport()
         self.transcripts = {}
         self.genes = {}
+        # Bulk endpoints that returned 404/405/501, so we use single requests instead
+        self._unsupported_bulk_endpoints = set()
+
+    def _post_bulk(self, endpoint, url, data):
+        """ POSTs data to a bulk endpoint, returns None if the server doesn't support it """
+        if endpoint in self._unsupported_bulk_endpoints:
+            return None
+        response = self.transport.post(url, json=data)
+        if response.status_code in (404, 405, 501):
+            self._unsupported_bulk_endpoints.add(endpoint)
+            return None
+        response.raise_for_status()
+        return response.json()
 
     def _get_from_url(self, url):
         data = None
-        response = requests.get(url)
+        response = self.transport.get(url)
         if response.ok:
             if 'application/json' in response.headers.get('Content-Type'):
                 data = response.json()
@@ -442,15 +688,34 @@ class RESTDataProvider(AbstractJSONDataProvider):
                 raise ValueError("Non-json response received for '%s' - are you behind a firewall?" % url)
         return data
 
+    def data_source(self):
+        return self.url
+
     def _get_transcript(self, tx_ac):
         # We store None for 404 on REST
         if tx_ac in self.transcripts:
             return self.transcripts[tx_ac]
 
-        transcript = self._get_from_url(self.url + "/transcript/" + tx_ac)
+        transcript = None
+        if data := self._get_from_url(self.url + "/transcript/" + tx_ac):
+            transcript = Transcript.from_cdot(data)
         self.transcripts[tx_ac] = transcript
         return transcript
 
+    def _prefetch_transcripts(self, tx_acs):
+        """ Retrieve uncached transcripts via the bulk endpoint (if the server has it) """
+        missing_tx_acs = list(dict.fromkeys(tx_ac for tx_ac in tx_acs if tx_ac not in self.transcripts))
+        url = self.url + "/transcripts/bulk"
+        for i in range(0, len(missing_tx_acs), self.bulk_request_size):
+            chunk = missing_tx_acs[i:i + self.bulk_request_size]
+            data = self._post_bulk("transcripts/bulk", url, {"transcripts": chunk})
+            if data is None:
+                break  # Not supported - transcripts will be retrieved one at a time
+            results = data["results"]
+            for tx_ac in chunk:
+                transcript_data = results.get(tx_ac)
+                self.transcripts[tx_ac] = Transcript.from_cdot(transcript_data) if transcript_data else None
+
     def _get_gene(self, gene_name):
         # We store None for 404 on REST
         if gene_name in self.genes:
@@ -474,3 +739,12 @@ class RESTDataProvider(AbstractJSONDataProvider):
         if data := self._get_from_url(url):
             tx_list = data["results"]
         return tx_list
+
+    def get_tx_for_regions(self, alt_ac, alt_aln_method, starts, ends):
+        self._check_alt_aln_method(alt_aln_method)
+
+        data = {"starts": list(starts), "ends": list(ends)}
+        url = f"{self.url}/transcripts/regions/{alt_ac}/{alt_aln_method}"
+        if results := self._post_bulk("transcripts/regions", url, data):
+            return results["results"]
+        return super().get_tx_for_regions(alt_ac, alt_aln_method, data["starts"], data["ends"])
@@ -0,0 +1,300 @@
+"""Compact, indexed binary version of cdot data, read via mmap
+
+Parsing cdot JSON.gz takes tens of seconds. Convert it once:
+
+    python -m src.hgvs_dataproviders_rest.txdata.cdot_binary --output cdot.grch38.bin cdot-0.2.21.refseq.grch38.json.gz
+
+Then BinaryDataProvider("cdot.grch38.bin") starts almost instantly, only decodes the records that are queried,
+and the (read-only) pages are shared between all worker processes that open the same file.
+
+File layout: MAGIC, header length (uint64), JSON header, then 8-byte aligned sections:
+
+    * transcript/gene tables - sorted keys (binary searched) with offsets into JSON records
+    * exons - int32 array of ExonArray values (alt_start_i, alt_end_i, ord, tx_start_i, tx_end_i) per exon
+    * intervals - per contig int32 arrays of transcript starts (sorted), ends, running max end and transcript row
+      (see IntervalIndex)
+"""
+
+import argparse
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import defaultdict
+
+import numpy as np
+
+from src.hgvs_dataproviders_rest.txdata.cdot import JSONDataProvider, LocalDataProvider
+from src.hgvs_dataproviders_rest.txdata.interval_index import IntervalIndex
+from src.hgvs_dataproviders_rest.txdata.transcript_model import ExonArray, Transcript, TranscriptBuild
+
+MAGIC = b"CDOTBIN2"
+_HEADER_LENGTH = struct.Struct("<Q")
+_ALIGNMENT = 8
+# Gapped exon CIGARs are stored in the transcript record, the rest are (alt_end_i - alt_start_i) "="
+EXON_COLUMNS = ExonArray.COLUMNS
+_TRANSCRIPT_FIELDS = ("gene_name", "cds_start_i", "cds_end_i", "protein")
+
+
+def _aligned(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _json_bytes(data):
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def _key_table_sections(prefix, keys, records):
+    """ keys must be sorted - records are (already encoded) bytes """
+    key_offsets = array("Q", [0])
+    record_offsets = array("Q", [0])
+    encoded_keys = []
+    for key, record in zip(keys, records):
+        encoded_key = key.encode()
+        encoded_keys.append(encoded_key)
+        key_offsets.append(key_offsets[-1] + len(encoded_key))
+        record_offsets.append(record_offsets[-1] + len(record))
+
+    return {
+        f"{prefix}_keys": b"".join(encoded_keys),
+        f"{prefix}_key_offsets": key_offsets.tobytes(),
+        f"{prefix}_records": b"".join(records),
+        f"{prefix}_record_offsets": record_offsets.tobytes(),
+    }
+
+
+def write_cdot_binary(json_data_provider: JSONDataProvider, filename):
+    """ Write data loaded into a JSONDataProvider out as an indexed binary file """
+    transcripts = json_data_provider.transcripts
+    tx_acs = sorted(transcripts)  # Code point order is the same as utf-8 byte order
+
+    exons = array("i")
+    records = []
+    tx_rows_by_gene = defaultdict(list)
+    contig_intervals = defaultdict(list)
+    for row, tx_ac in enumerate(tx_acs):
+        transcript = transcripts[tx_ac]
+        record = {field: getattr(transcript, field) for field in _TRANSCRIPT_FIELDS}
+        genome_builds = {}
+        for genome_build, build in transcript.builds.items():
+            cigars = {}
+            for i, (alt_start_i, alt_end_i, _, _, _, cigar) in enumerate(build.exons):
+                if cigar != f"{alt_end_i - alt_start_i}=":
+                    cigars[i] = cigar
+
+            build_record = {
+                "contig": build.contig,
+                "strand": build.strand,
+                "exon_start": len(exons) // EXON_COLUMNS,
+                "exon_count": len(build.exons),
+            }
+            if cigars:
+                build_record["cigars"] = cigars
+            exons.extend(build.exons.values)
+            genome_builds[genome_build] = build_record
+            contig_intervals[build.contig].append((build.start, build.end, row))
+
+        record["genome_builds"] = genome_builds
+        records.append(_json_bytes(record))
+        if gene_name := transcript.gene_name:
+            tx_rows_by_gene[gene_name].append(row)
+
+    genes = json_data_provider.genes
+    gene_symbols = sorted(set(genes) | set(tx_rows_by_gene))
+    gene_records = [_json_bytes({"gene": genes.get(g), "transcripts": tx_rows_by_gene.get(g, [])})
+                    for g in gene_symbols]
+
+    interval_arrays = {name: [] for name in ("starts", "ends", "max_ends", "transcripts")}
+    contigs = {}
+    offset = 0
+    for contig, intervals in sorted(contig_intervals.items()):
+        contig_index = IntervalIndex.from_intervals(*zip(*intervals))
+        contigs[contig] = [offset, len(contig_index)]
+        offset += len(contig_index)
+        interval_arrays["starts"].append(contig_index.starts)
+        interval_arrays["ends"].append(contig_index.ends)
+        interval_arrays["max_ends"].append(contig_index.max_ends)
+        interval_arrays["transcripts"].append(np.asarray(contig_index.values, dtype=np.int32))
+
+    sections = {"exons": exons.tobytes()}
+    sections.update({f"interval_{name}": np.concatenate(arrays or [np.empty(0, dtype=np.int32)]).tobytes()
+                     for name, arrays in interval_arrays.items()})
+    sections.update(_key_table_sections("transcript", tx_acs, records))
+    sections.update(_key_table_sections("gene", gene_symbols, gene_records))
+
+    section_offsets = {}
+    offset = 0
+    for name, data in sections.items():
+        section_offsets[name] = [offset, len(data)]
+        offset = _aligned(offset + len(data))
+
+    cdot_version = ".".join(str(v) for v in json_data_provider.cdot_data_version)
+    header = _json_bytes({
+        "byteorder": sys.byteorder,
+        "cdot_version": cdot_version,
+        "genome_builds": sorted(json_data_provider.assembly_maps),
+        "contigs": contigs,
+        "sections": section_offsets,
+    })
+    data_start = _aligned(len(MAGIC) + _HEADER_LENGTH.size + len(header))
+
+    with open(filename, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        for name, data in sections.items():
+            f.seek(data_start + section_offsets[name][0])
+            f.write(data)
+
+
+def convert_cdot_json_to_binary(file_or_filename_list, filename):
+    write_cdot_binary(JSONDataProvider(file_or_filename_list), filename)
+
+
+class _KeyTable:
+    """ Sorted keys with JSON records, looked up via binary search over memory-mapped sections """
+
+    def __init__(self, sections, prefix):
+        self._keys = sections[f"{prefix}_keys"]
+        self._key_offsets = sections[f"{prefix}_key_offsets"].cast("Q")
+        self._records = sections[f"{prefix}_records"]
+        self._record_offsets = sections[f"{prefix}_record_offsets"].cast("Q")
+
+    def __len__(self):
+        return len(self._key_offsets) - 1
+
+    def __getitem__(self, row) -> bytes:
+        """ Encoded key - allows bisect to search the table """
+        return bytes(self._keys[self._key_offsets[row]:self._key_offsets[row + 1]])
+
+    def key(self, row) -> str:
+        return self[row].decode()
+
+    def record(self, row):
+        return json.loads(bytes(self._records[self._record_offsets[row]:self._record_offsets[row + 1]]))
+
+    def find(self, key):
+        """ Returns row for key, or None if not present """
+        encoded_key = key.encode()
+        row = bisect.bisect_left(self, encoded_key)
+        if row < len(self) and self[row] == encoded_key:
+            return row
+        return None
+
+
+class _RowKeys:
+    """ Sequence of the transcript accessions for an array of transcript table rows """
+
+    def __init__(self, key_table, rows):
+        self._key_table = key_table
+        self._rows = rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, i):
+        return self._key_table.key(int(self._rows[i]))
+
+
+class BinaryDataProvider(LocalDataProvider):
+    """ Memory-mapped binary file created by convert_cdot_json_to_binary() """
+
+    def __init__(self, filename, mode=None, cache=None, seqfetcher=None):
+        self.filename = filename
+        with open(filename, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"'{filename}' is not a cdot binary file")
+        (header_length,) = _HEADER_LENGTH.unpack_from(self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + _HEADER_LENGTH.size
+        header = json.loads(self._mmap[header_start:header_start + header_length])
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"'{filename}' was written on a {header['byteorder']} endian machine, please re-convert")
+
+        cdot_data_version_str = header["cdot_version"]
+        self._validate_schema_compatability(cdot_data_version_str)
+        self.cdot_data_version = tuple(int(v) for v in cdot_data_version_str.split("."))
+
+        data_start = _aligned(header_start + header_length)
+        buffer = memoryview(self._mmap)
+        sections = {name: buffer[data_start + offset:data_start + offset + length]
+                    for name, (offset, length) in header["sections"].items()}
+        self._transcript_table = _KeyTable(sections, "transcript")
+        self._gene_table = _KeyTable(sections, "gene")
+        self._exons = sections["exons"].cast("i")
+        self._interval_arrays = {name: np.frombuffer(sections[f"interval_{name}"], dtype=np.int32)
+                                 for name in ("starts", "ends", "max_ends", "transcripts")}
+        self._contig_intervals = header["contigs"]
+        self._contig_interval_indexes = {}
+
+        super().__init__(assemblies=header["genome_builds"], mode=mode, cache=cache, seqfetcher=seqfetcher)
+
+    def data_source(self):
+        cdot_version = JSONDataProvider._format_cdot_version(self.cdot_data_version)
+        return f"{os.path.abspath(self.filename)}:{cdot_version}"
+
+    def _get_transcript(self, tx_ac):
+        row = self._transcript_table.find(tx_ac)
+        if row is None:
+            return None
+
+        record = self._transcript_table.record(row)
+        builds = {}
+        for genome_build, build_data in record.pop("genome_builds").items():
+            exon_start = build_data["exon_start"] * EXON_COLUMNS
+            exon_count = build_data["exon_count"]
+            cigars = build_data.get("cigars", {})
+            values = array("i", self._exons[exon_start:exon_start + exon_count * EXON_COLUMNS])
+            exon_cigars = tuple(
+                cigars.get(str(i)) or f"{values[i * EXON_COLUMNS + 1] - values[i * EXON_COLUMNS]}="
+                for i in range(exon_count)
+            )
+            builds[genome_build] = TranscriptBuild(build_data["contig"], build_data["strand"],
+                                                   ExonArray(values, exon_cigars))
+        return Transcript(builds=builds, **record)
+
+    def _get_gene_record(self, gene):
+        row = self._gene_table.find(gene)
+        if row is None:
+            return None
+        return self._gene_table.record(row)
+
+    def _get_gene(self, gene):
+        if gene_record := self._get_gene_record(gene):
+            return gene_record["gene"]
+        return None
+
+    def _get_transcript_ids_for_gene(self, gene):
+        tx_acs = []
+        if gene_record := self._get_gene_record(gene):
+            tx_acs = [self._transcript_table.key(row) for row in gene_record["transcripts"]]
+        return tx_acs
+
+    def _get_contig_interval_index(self, alt_ac):
+        """ Index over views of the mapped arrays, so nothing is copied """
+        if alt_ac not in self._contig_interval_indexes:
+            contig_interval_index = None
+            if alt_ac in self._contig_intervals:
+                offset, count = self._contig_intervals[alt_ac]
+                arrays = {name: a[offset:offset + count] for name, a in self._interval_arrays.items()}
+                tx_acs = _RowKeys(self._transcript_table, arrays["transcripts"])
+                contig_interval_index = IntervalIndex(arrays["starts"], arrays["ends"], tx_acs,
+                                                      max_ends=arrays["max_ends"])
+            self._contig_interval_indexes[alt_ac] = contig_interval_index
+        return self._contig_interval_indexes[alt_ac]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert cdot JSON files into a BinaryDataProvider file")
+    parser.add_argument("--output", required=True, help="binary file to write")
+    parser.add_argument("cdot_json", nargs="+", help="cdot .json or .json.gz files")
+    args = parser.parse_args()
+    convert_cdot_json_to_binary(args.cdot_json, args.output)
+
+
+if __name__ == "__main__":
+    main()
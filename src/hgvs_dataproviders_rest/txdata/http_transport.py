@@ -0,0 +1,170 @@
+"""HTTP transport shared by the REST data providers (cdot REST, Ensembl Tark and UTA REST)
+
+A pooled requests.Session (so connections are kept alive and reused), with timeouts, gzip, and retries with
+jittered exponential backoff on connection errors, 429 and 5xx responses. Per-host request/latency/connection
+metrics are available via metrics().
+
+Providers use get_default_transport() unless passed transport=HTTPTransport(...)
+"""
+
+import random
+import threading
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class _HostMetrics:
+    __slots__ = ("requests", "errors", "retries", "total_time", "max_time", "statuses")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.statuses = Counter()
+
+
+class HTTPTransport:
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10, timeout=(10, 60), max_retries: int = 3,
+                 backoff_factor: float = 0.5, backoff_max: float = 30.0, retry_statuses=RETRY_STATUSES,
+                 headers: Optional[dict] = None):
+        """ pool_connections: number of hosts to keep pools for
+            pool_maxsize: connections kept alive per host (set to the number of threads making requests)
+            timeout: seconds, or (connect, read) tuple - used unless passed in a request
+            max_retries: retries after the first attempt, waiting a random time up to
+                         min(backoff_max, backoff_factor * 2 ** retry) or the server's Retry-After """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        if headers:
+            self.session.headers.update(headers)
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs) -> requests.Response:
+        """ Only used for (idempotent) bulk lookups, so is retried like GET """
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).hostname
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(host, time.perf_counter() - start, None)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                self._record(host, time.perf_counter() - start, response.status_code)
+                if response.status_code not in self.retry_statuses or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                response.close()
+
+            with self._lock:
+                self._metrics[host].retries += 1
+            time.sleep(delay)
+            attempt += 1
+
+    def _backoff(self, attempt) -> float:
+        """ "Full jitter" - random so clients that failed together don't all retry together """
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * 2 ** attempt))
+
+    def _retry_after(self, response) -> Optional[float]:
+        retry_after = response.headers.get("Retry-After")
+        if not retry_after:
+            return None
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(delay, 0.0), self.backoff_max)
+
+    def _record(self, host, elapsed, status_code):
+        with self._lock:
+            host_metrics = self._metrics.get(host)
+            if host_metrics is None:
+                host_metrics = self._metrics[host] = _HostMetrics()
+            host_metrics.requests += 1
+            host_metrics.total_time += elapsed
+            host_metrics.max_time = max(host_metrics.max_time, elapsed)
+            if status_code is None:
+                host_metrics.errors += 1
+            else:
+                host_metrics.statuses[status_code] += 1
+
+    def _connection_counts(self) -> dict:
+        """ host: connections opened, from the urllib3 pools """
+        pools = self.adapter.poolmanager.pools
+        counts = Counter()
+        for key in list(pools.keys()):
+            try:
+                pool = pools[key]
+            except KeyError:  # Evicted since listing keys
+                continue
+            counts[key.key_host] += pool.num_connections
+        return counts
+
+    def metrics(self) -> dict:
+        """ host: dict of requests, errors, retries, statuses, mean/max latency (seconds) and connections opened """
+        connection_counts = self._connection_counts()
+        with self._lock:
+            metrics = {}
+            for host, host_metrics in self._metrics.items():
+                metrics[host] = {
+                    "requests": host_metrics.requests,
+                    "errors": host_metrics.errors,
+                    "retries": host_metrics.retries,
+                    "statuses": dict(host_metrics.statuses),
+                    "mean_latency": host_metrics.total_time / host_metrics.requests,
+                    "max_latency": host_metrics.max_time,
+                    "num_connections": connection_counts.get(host, 0),
+                }
+            return metrics
+
+    def close(self):
+        self.session.close()
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def get_default_transport() -> HTTPTransport:
+    """ Transport shared by all providers not given their own """
+    global _default_transport
+    if _default_transport is None:
+        with _default_transport_lock:
+            if _default_transport is None:
+                _default_transport = HTTPTransport()
+    return _default_transport
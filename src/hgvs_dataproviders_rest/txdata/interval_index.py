@@ -0,0 +1,74 @@
+"""Sorted-array index of intervals on a contig, used for transcript region queries
+
+Intervals are half-open [start, end) and stored as NumPy arrays sorted by start, along with the running
+maximum end. Every interval that can overlap a region lies between two binary searches:
+
+    * starts at/before the region end   (searchsorted on starts)
+    * running max end after region start (searchsorted on max_ends, which is non-decreasing)
+
+Then a vectorized comparison of ends removes the (usually few) candidates that end before the region.
+
+>>> index = IntervalIndex.from_intervals([100, 0, 50], [200, 60, 80], ["c", "a", "b"])
+>>> index.overlapping(55, 100)
+['a', 'b', 'c']
+>>> index.overlapping(60, 99)
+['b']
+>>> index.overlapping(200, 300)
+[]
+>>> index.overlapping_many([55, 200, 60], [100, 300, 99])
+[['a', 'b', 'c'], [], ['b']]
+
+"""
+
+import numpy as np
+
+
+class IntervalIndex:
+    def __init__(self, starts, ends, values, max_ends=None):
+        """ starts must be sorted. Arrays may be views (eg of a memory-mapped file) and are not copied """
+        self.starts = starts
+        self.ends = ends
+        self.values = values
+        if max_ends is None:
+            max_ends = np.maximum.accumulate(ends) if len(ends) else ends
+        self.max_ends = max_ends
+
+    @classmethod
+    def from_intervals(cls, starts, ends, values):
+        """ Build from unsorted sequences of interval starts, ends and values """
+        starts = np.asarray(starts, dtype=np.int32)
+        ends = np.asarray(ends, dtype=np.int32)
+        order = np.argsort(starts, kind="stable")
+        return cls(starts[order], ends[order], [values[i] for i in order])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlapping_indexes(self, start_i, end_i):
+        """ Array indexes of intervals that overlap the closed region [start_i, end_i]
+            This is the same as the IntervalTree query tree[start_i:end_i+1] """
+        hi = int(np.searchsorted(self.starts, end_i, side="right"))
+        lo = int(np.searchsorted(self.max_ends[:hi], start_i, side="right"))
+        return np.flatnonzero(self.ends[lo:hi] > start_i) + lo
+
+    def overlapping(self, start_i, end_i):
+        """ Values of intervals that overlap the closed region [start_i, end_i] """
+        return [self.values[i] for i in self.overlapping_indexes(start_i, end_i)]
+
+    def overlapping_many(self, starts, ends):
+        """ overlapping() for many regions at once, returns a list of values per region
+
+            Regions are processed in sorted order, so the binary searches sweep forward through the arrays """
+        starts = np.asarray(starts)
+        ends = np.asarray(ends)
+        order = np.argsort(starts, kind="stable")
+        his = np.empty(len(order), dtype=np.intp)
+        los = np.empty(len(order), dtype=np.intp)
+        his[order] = np.searchsorted(self.starts, ends[order], side="right")
+        los[order] = np.searchsorted(self.max_ends, starts[order], side="right")
+
+        results = []
+        for start_i, lo, hi in zip(starts.tolist(), los.tolist(), his.tolist()):
+            indexes = np.flatnonzero(self.ends[lo:hi] > start_i) + lo if lo < hi else ()
+            results.append([self.values[i] for i in indexes])
+        return results
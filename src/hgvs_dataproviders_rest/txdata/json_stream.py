@@ -0,0 +1,117 @@
+"""Incremental JSON parsing, so that very large files (eg cdot) can be read one record at a time
+
+Only the current record and a small read buffer are held in memory, rather than the whole document.
+
+>>> import io
+>>> reader = JSONStreamReader(io.StringIO('{"version": "1.0", "records": {"a": [1, 2], "b": null}}'))
+>>> for key in reader.iter_object_keys():
+...     if key == "records":
+...         print(list(reader.iter_object_items()))
+...     else:
+...         print(key, reader.read_value())
+version 1.0
+[('a', [1, 2]), ('b', None)]
+
+"""
+
+import codecs
+import json
+import re
+from json.decoder import WHITESPACE
+
+NUMBER_CHARS = re.compile(r"[0-9.eE+-]*")
+
+
+class JSONStreamReader:
+    """ Reads JSON values from a text or binary (utf-8) file object, a chunk at a time
+
+        Callers walk the document structure with iter_object_keys() / iter_object_items() and read
+        the values they want with read_value(). Every value yielded must be consumed before
+        advancing to the next key.
+    """
+
+    def __init__(self, f, chunk_size: int = 1 << 20):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _read_more(self, size: int) -> bool:
+        """ Append (at least) another chunk to the buffer, discarding what has already been consumed """
+        while not self._eof:
+            chunk = self._f.read(size)
+            if not chunk:
+                self._eof = True
+            if isinstance(chunk, bytes):
+                chunk = self._utf8_decoder.decode(chunk, final=self._eof)
+            if chunk:
+                self._buffer = self._buffer[self._pos:] + chunk
+                self._pos = 0
+                return True
+        return False
+
+    def _skip_whitespace(self):
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or not self._read_more(self._chunk_size):
+                return
+
+    def peek(self) -> str:
+        """ Returns next non-whitespace character, or "" at end of file """
+        self._skip_whitespace()
+        return self._buffer[self._pos:self._pos + 1]
+
+    def _expect(self, char: str):
+        if (found := self.peek()) != char:
+            raise ValueError(f"Invalid JSON: expected '{char}' but found '{found}'")
+        self._pos += 1
+
+    def read_value(self):
+        """ Decode and return the complete JSON value at the current position """
+        self._skip_whitespace()
+        size = self._chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # Value is truncated at the end of the buffer - read more (growing so huge values aren't quadratic)
+                if not self._read_more(size):
+                    raise
+                size *= 2
+                continue
+
+            # A number cut off by the buffer boundary (eg "1." or "2e") decodes as a shorter number, so only
+            # accept it if it's followed by something other than number characters
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                number_end = NUMBER_CHARS.match(self._buffer, end).end()
+                if number_end == len(self._buffer) and self._read_more(size):
+                    continue
+            self._pos = end
+            return value
+
+    def iter_object_keys(self):
+        """ Yields keys of the JSON object at the current position. The caller must consume each
+            value (via read_value() or by iterating it) before requesting the next key """
+        self._expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+
+        while True:
+            key = self.read_value()
+            self._expect(":")
+            yield key
+            separator = self.peek()
+            self._pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"Invalid JSON: expected ',' or '}}' after value for '{key}' but found '{separator}'")
+
+    def iter_object_items(self):
+        """ Yields (key, value) for the JSON object at the current position, decoding one value at a time """
+        for key in self.iter_object_keys():
+            yield key, self.read_value()
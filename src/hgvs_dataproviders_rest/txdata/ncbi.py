@@ -99,6 +99,9 @@ class NCBIBase(TxDataInterface):
     def data_version(self):
         return self.url.schema
 
+    def data_source(self):
+        return f"{self.url.hostname}:{self.url.port}/{self.url.database}/{self.url.schema}"
+
     def schema_version(self):
         return self._fetchone("select * from meta where key = 'schema_version'")["value"]
 
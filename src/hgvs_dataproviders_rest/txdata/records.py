@@ -0,0 +1,96 @@
+"""Immutable result rows
+
+Record is a tuple that can also be accessed by column name (like psycopg2's DictRow), with the column map
+shared by every record of the same columns rather than stored per row.
+
+>>> Row = record_type(["tx_ac", "alt_ac"])
+>>> row = Row(["NM_000001.1", "NC_000001.11"])
+>>> row["tx_ac"], row[1]
+('NM_000001.1', 'NC_000001.11')
+>>> dict(row)
+{'tx_ac': 'NM_000001.1', 'alt_ac': 'NC_000001.11'}
+
+freeze() makes a deep immutable copy of provider results, so callers can't modify cached values:
+
+>>> frozen = freeze([{"tx_ac": "NM_000001.1", "lengths": [100, 200]}])
+>>> frozen[0]["lengths"]
+(100, 200)
+>>> frozen[0]["tx_ac"] = "NM_000002.1"
+Traceback (most recent call last):
+...
+TypeError: 'mappingproxy' object does not support item assignment
+
+"""
+
+from collections.abc import Mapping
+from types import MappingProxyType
+
+_record_types = {}
+
+
+def _make_record(columns, values):
+    return record_type(columns)(values)
+
+
+class Record(tuple):
+    __slots__ = ()
+    _columns = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        i = self._index.get(key)
+        if i is None:
+            return default
+        return tuple.__getitem__(self, i)
+
+    def keys(self):
+        return self._columns
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return zip(self._columns, self)
+
+    def _asdict(self):
+        return dict(zip(self._columns, self))
+
+    def __reduce__(self):
+        return _make_record, (self._columns, tuple(self))
+
+    def __repr__(self):
+        return f"Record({self._asdict()!r})"
+
+
+def record_type(columns):
+    """ Record subclass for these columns (one class, and column map, per distinct set of columns) """
+    columns = tuple(columns)
+    rt = _record_types.get(columns)
+    if rt is None:
+        rt = type("Record", (Record,), {
+            "__slots__": (),
+            "_columns": columns,
+            "_index": {column: i for i, column in enumerate(columns)},
+        })
+        _record_types[columns] = rt
+    return rt
+
+
+def freeze(value):
+    """ Deep immutable copy: dicts -> read-only mappings, lists -> tuples, DictRows -> Records """
+    if isinstance(value, Record):
+        return type(value)(freeze(v) for v in value)
+    if isinstance(value, list) and hasattr(value, "keys"):  # psycopg2 DictRow
+        return record_type(value.keys())(freeze(v) for v in value)
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
@@ -0,0 +1,178 @@
+"""Compact transcript records, converted once from cdot/Tark JSON and shared by every query
+
+Exon coordinates are held in one int32 array per transcript build (rather than a dict or tuple per exon) with
+CIGAR strings converted up front, so get_tx_exons etc just build the result records.
+
+>>> exons = ExonArray.from_cdot([[1000, 1100, 0, 1, 100, None], [2000, 2200, 1, 101, 300, "M50 I1 M149"]])
+>>> list(exons)
+[(1000, 1100, 0, 0, 100, '100='), (2000, 2200, 1, 100, 300, '50=1D149=')]
+>>> exons.start, exons.end, exons.lengths()
+(1000, 2200, [100, 200])
+
+"""
+
+import sys
+from array import array
+from typing import Dict, Optional
+
+
+def convert_gap_to_cigar(gap):
+    """
+            gap = 'M196 I1 M61 I1 M181'
+            CIGAR = '194=1D60=1D184='
+    """
+
+    # This has to/from sequences inverted, so insertion is a deletion
+    OP_CONVERSION = {
+        "M": "=",
+        "I": "D",
+        "D": "I",
+    }
+
+    cigar_ops = []
+    for gap_op in gap.split():
+        gap_code = gap_op[0]
+        length = int(gap_op[1:])
+
+        cigar_ops.append(str(length) + OP_CONVERSION[gap_code])
+
+    return "".join(cigar_ops)
+
+
+class ExonArray:
+    """ Exons in genomic order. values holds COLUMNS int32s per exon, tx coordinates are 0 based (as UTA) """
+    __slots__ = ("values", "cigars")
+
+    COLUMNS = 5  # alt_start_i, alt_end_i, ord, tx_start_i, tx_end_i
+
+    def __init__(self, values: array, cigars: tuple):
+        self.values = values
+        self.cigars = cigars
+
+    @classmethod
+    def from_cdot(cls, exons):
+        """ cdot exons are [alt_start_i, alt_end_i, exon_id, tx_start (1 based), tx_end, gap] """
+        values = array("i")
+        cigars = []
+        for alt_start_i, alt_end_i, exon_id, tx_start, tx_end, gap in exons:
+            values.extend((alt_start_i, alt_end_i, exon_id, tx_start - 1, tx_end))
+            if gap is not None:
+                cigar = convert_gap_to_cigar(gap)
+            else:
+                cigar = str(alt_end_i - alt_start_i) + "="  # Will be same for both transcript/genomic
+            cigars.append(sys.intern(cigar))
+        return cls(values, tuple(cigars))
+
+    def __len__(self):
+        return len(self.cigars)
+
+    def __iter__(self):
+        """ Yields (alt_start_i, alt_end_i, ord, tx_start_i, tx_end_i, cigar) """
+        values = self.values
+        for i, cigar in enumerate(self.cigars):
+            offset = i * self.COLUMNS
+            yield (*values[offset:offset + self.COLUMNS], cigar)
+
+    @property
+    def start(self):
+        return self.values[0]
+
+    @property
+    def end(self):
+        return self.values[(len(self) - 1) * self.COLUMNS + 1]
+
+    def lengths(self):
+        """ Exon lengths on the transcript, in transcript order """
+        values = self.values
+        columns = self.COLUMNS
+        return [values[i + 4] - values[i + 3]
+                for i in sorted(range(0, len(values), columns), key=lambda i: values[i + 2])]
+
+
+class TranscriptBuild:
+    """ Alignment of a transcript to a genome build """
+    __slots__ = ("contig", "strand", "exons")
+
+    def __init__(self, contig: str, strand: int, exons: ExonArray):
+        self.contig = contig
+        self.strand = strand
+        self.exons = exons
+
+    @property
+    def start(self):
+        return self.exons.start
+
+    @property
+    def end(self):
+        return self.exons.end
+
+    def tx_exons(self, tx_ac, alt_ac, alt_aln_method):
+        """ UTA style tx_exons records (genomic order) """
+        alt_strand = self.strand
+        return [
+            {
+                'tx_ac': tx_ac,
+                'alt_ac': alt_ac,
+                'alt_strand': alt_strand,
+                'alt_aln_method': alt_aln_method,
+                'ord': ord_,
+                'tx_start_i': tx_start_i,
+                'tx_end_i': tx_end_i,
+                'alt_start_i': alt_start_i,
+                'alt_end_i': alt_end_i,
+                'cigar': cigar,
+            }
+            for alt_start_i, alt_end_i, ord_, tx_start_i, tx_end_i, cigar in self.exons
+        ]
+
+
+class Transcript:
+    __slots__ = ("gene_name", "cds_start_i", "cds_end_i", "protein", "builds", "sequence")
+
+    def __init__(self, gene_name: Optional[str], cds_start_i: Optional[int], cds_end_i: Optional[int],
+                 protein: Optional[str], builds: Dict[str, TranscriptBuild], sequence: Optional[str] = None):
+        """ builds: genome build name: TranscriptBuild """
+        self.gene_name = gene_name
+        self.cds_start_i = cds_start_i
+        self.cds_end_i = cds_end_i
+        self.protein = protein
+        self.builds = builds
+        self.sequence = sequence
+
+    @classmethod
+    def from_cdot(cls, transcript):
+        """ From cdot transcript JSON (strings shared via sys.intern) """
+        builds = {}
+        for genome_build, build_data in transcript["genome_builds"].items():
+            strand = 1 if build_data["strand"] == "+" else -1
+            builds[sys.intern(genome_build)] = TranscriptBuild(sys.intern(build_data["contig"]), strand,
+                                                               ExonArray.from_cdot(build_data["exons"]))
+        gene_name = transcript.get("gene_name")
+        return cls(sys.intern(gene_name) if gene_name else gene_name, transcript.get("start_codon"),
+                   transcript.get("stop_codon"), transcript.get("protein"), builds)
+
+    def get_build_for_contig(self, alt_ac) -> Optional[TranscriptBuild]:
+        for build in self.builds.values():
+            if build.contig == alt_ac:
+                return build
+        return None
+
+    def any_build(self) -> Optional[TranscriptBuild]:
+        """ For assembly independent data (eg exon lengths) """
+        return next(iter(self.builds.values()), None)
+
+    def tx_info(self, tx_ac, alt_ac, alt_aln_method):
+        return {
+            "hgnc": self.gene_name,
+            "cds_start_i": self.cds_start_i,
+            "cds_end_i": self.cds_end_i,
+            "tx_ac": tx_ac,
+            "alt_ac": alt_ac,
+            "alt_aln_method": alt_aln_method,
+        }
+
+    def tx_identity_info(self, tx_ac):
+        tx_info = self.tx_info(tx_ac, tx_ac, "transcript")  # alt_ac is the transcript again
+        build = self.any_build()
+        tx_info["lengths"] = build.exons.lengths() if build else []
+        return tx_info
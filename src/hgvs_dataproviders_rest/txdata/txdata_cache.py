@@ -1,61 +1,214 @@
-from functools import lru_cache
+from typing import Optional
 
+from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+from src.hgvs_dataproviders_rest.bounded_cache import MISSING, BoundedCache
+from src.hgvs_dataproviders_rest.shared_cache import NotAvailable, SharedCache
+from src.hgvs_dataproviders_rest.txdata.records import freeze
 from src.hgvs_dataproviders_rest.txdata.txdata_interface import TxDataInterface
 
 
 class TxDataCache(TxDataInterface):
-    def __init__(self, object: TxDataInterface):
-        super().__init__()
+    """ Caches the results of another TxDataInterface
+
+        Each method has its own BoundedCache (held by this instance, so the cache goes away with it). Bulk (_many)
+        methods share entries with the single methods, and only fetch misses from the wrapped provider.
+
+        method_options allows overriding maxsize/ttl/policy/negative_ttl per method, eg:
+
+            TxDataCache(hdp, maxsize=1000, method_options={"get_tx_for_region": {"maxsize": 100, "ttl": 3600}})
+
+        shared_cache (eg SQLiteSharedCache) is checked on in-memory misses and filled with fetched results, so
+        other processes using the same shared cache don't have to fetch them again
+    """
+
+    CACHED_METHODS = (
+        "data_version",
+        "schema_version",
+        "get_acs_for_protein_seq",
+        "get_assembly_map",
+        "get_gene_info",
+        "get_pro_ac_for_tx_ac",
+        "get_similar_transcripts",
+        "get_tx_exons",
+        "get_tx_for_gene",
+        "get_tx_for_region",
+        "get_tx_identity_info",
+        "get_tx_info",
+        "get_tx_mapping_options",
+    )
+
+    def __init__(self, object: TxDataInterface, maxsize: Optional[int] = 128, ttl: Optional[float] = None,
+                 policy: str = "lru", negative_ttl: Optional[float] = None, cache_not_available: bool = True,
+                 immutable: bool = True, method_options: Optional[dict] = None,
+                 shared_cache: Optional[SharedCache] = None, shared_cache_namespace: Optional[str] = None):
+        """ negative_ttl: seconds to cache HGVSDataNotAvailableError for (defaults to ttl)
+            cache_not_available: cache HGVSDataNotAvailableError, re-raising it on subsequent calls
+            immutable: return read-only copies (tuples/mappings) so callers can't modify cached results
+            shared_cache_namespace: separates data in the shared cache, defaults to provider class, data version and
+                                    data source. Required if the provider doesn't implement data_source() """
+        # Set before TxDataInterface.__init__, which checks the (wrapped) schema version
         self._object = object
+        self.required_version = object.required_version
+        self.cache_not_available = cache_not_available
+        self.immutable = immutable
+        self.shared_cache = shared_cache
+
+        method_options = method_options or {}
+        unknown_methods = set(method_options) - set(self.CACHED_METHODS)
+        if unknown_methods:
+            raise ValueError(f"method_options for non-cached methods: {', '.join(sorted(unknown_methods))}")
+
+        self._caches = {}
+        self._negative_ttls = {}
+        for method_name in self.CACHED_METHODS:
+            options = {"maxsize": maxsize, "ttl": ttl, "policy": policy, "negative_ttl": negative_ttl}
+            options.update(method_options.get(method_name, {}))
+            method_negative_ttl = options.pop("negative_ttl")
+            if method_negative_ttl is None:
+                method_negative_ttl = options["ttl"]
+            self._caches[method_name] = BoundedCache(**options)
+            self._negative_ttls[method_name] = method_negative_ttl
+        self._shared_cache_namespace = shared_cache_namespace
+        super().__init__()
+        if shared_cache is not None and shared_cache_namespace is None:
+            data_source = object.data_source()
+            if data_source is None:
+                raise ValueError(f"{type(object).__name__} has no data_source(), so shared_cache_namespace "
+                                 "must be provided to keep its data separate in the shared cache")
+            self._shared_cache_namespace = f"{type(object).__name__}:{object.data_version()}:{data_source}"
+
+    def cache_info(self):
+        """ dict of method name: CacheInfo (hits, misses, evictions etc) """
+        return {method_name: cache.cache_info() for method_name, cache in self._caches.items()}
+
+    def cache_clear(self):
+        for cache in self._caches.values():
+            cache.clear()
+
+    @property
+    def _use_shared_cache(self):
+        # No namespace until TxDataInterface.__init__ has checked the schema version
+        return self.shared_cache is not None and self._shared_cache_namespace is not None
+
+    def _shared_key(self, method_name, key):
+        return (self._shared_cache_namespace, method_name, *key)
+
+    def _put(self, method_name, key, result, ttl=None):
+        self._caches[method_name].put(key, result, ttl=ttl)
+        if self._use_shared_cache:
+            self.shared_cache.put(self._shared_key(method_name, key), result, ttl=ttl)
+
+    def _get_shared_many(self, method_name, keys) -> dict:
+        """ Looks up keys in the shared cache, copying those found into the in-memory cache """
+        found = {}
+        if self._use_shared_cache:
+            shared_keys = {self._shared_key(method_name, key): key for key in keys}
+            for shared_key, value in self.shared_cache.get_many(shared_keys, immutable=self.immutable).items():
+                key = shared_keys[shared_key]
+                found[key] = value
+                self._caches[method_name].put(key, value)
+        return found
+
+    def _get_one(self, method_name, *key):
+        entry = self._caches[method_name].get(key)
+        if entry is MISSING:
+            entry = self._get_shared_many(method_name, [key]).get(key, MISSING)
+        if entry is MISSING:
+            try:
+                entry = getattr(self._object, method_name)(*key)
+            except HGVSDataNotAvailableError as e:
+                if self.cache_not_available:
+                    self._put(method_name, key, NotAvailable(e), ttl=self._negative_ttls[method_name])
+                raise
+            if self.immutable:
+                entry = freeze(entry)
+            self._put(method_name, key, entry)
+        if isinstance(entry, NotAvailable):
+            raise entry.exception()
+        return entry
+
+    def _get_many(self, method_name, keys, get_many_func):
+        """ Look up each key individually, fetching only the misses (in one bulk call) and caching them.
+            As with the _many methods, results are None where data isn't available """
+        cache = self._caches[method_name]
+        keys = [tuple(key) for key in keys]
+        results = [cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is MISSING]
+        if missing:
+            shared = self._get_shared_many(method_name, {keys[i] for i in missing})
+            for i in missing:
+                results[i] = shared.get(keys[i], MISSING)
+            missing = [i for i in missing if results[i] is MISSING]
+        if missing:
+            fetched = get_many_func([keys[i] for i in missing])
+            shared_items = []
+            for i, result in zip(missing, fetched):
+                # Not available is returned as None rather than raised, so isn't negatively cached
+                if result is not None:
+                    if self.immutable:
+                        result = freeze(result)
+                    cache.put(keys[i], result)
+                    shared_items.append((self._shared_key(method_name, keys[i]), result))
+                results[i] = result
+            if shared_items and self._use_shared_cache:
+                self.shared_cache.put_many(shared_items)
+        return [None if isinstance(result, NotAvailable) else result for result in results]
 
-    @lru_cache
     def data_version(self):
-        return self._object.data_version()
+        return self._get_one("data_version")
+
+    def data_source(self):
+        return self._object.data_source()
 
-    @lru_cache
     def schema_version(self):
-        return self._object.schema_version()
+        return self._get_one("schema_version")
 
-    @lru_cache
     def get_acs_for_protein_seq(self, seq):
-        return self._object.get_acs_for_protein_seq(seq)
+        return self._get_one("get_acs_for_protein_seq", seq)
 
-    @lru_cache
     def get_assembly_map(self, assembly_name):
-        return self._object.get_assembly_map(assembly_name)
+        return self._get_one("get_assembly_map", assembly_name)
 
-    @lru_cache
     def get_gene_info(self, gene):
-        return self._object.get_gene_info(gene)
+        return self._get_one("get_gene_info", gene)
 
-    @lru_cache
     def get_pro_ac_for_tx_ac(self, tx_ac):
-        return self._object.get_pro_ac_for_tx_ac(tx_ac)
+        return self._get_one("get_pro_ac_for_tx_ac", tx_ac)
 
-    @lru_cache
     def get_similar_transcripts(self, tx_ac):
-        return self._object.get_similar_transcripts(tx_ac)
+        return self._get_one("get_similar_transcripts", tx_ac)
 
-    @lru_cache
     def get_tx_exons(self, tx_ac, alt_ac, alt_aln_method):
-        return self.get_tx_exons(tx_ac, alt_ac, alt_aln_method)
+        return self._get_one("get_tx_exons", tx_ac, alt_ac, alt_aln_method)
+
+    def get_tx_exons_many(self, tx_exons_args):
+        return self._get_many("get_tx_exons", tx_exons_args, self._object.get_tx_exons_many)
 
-    @lru_cache
     def get_tx_for_gene(self, gene):
-        return self._object.get_tx_for_gene(gene)
+        return self._get_one("get_tx_for_gene", gene)
 
-    @lru_cache
     def get_tx_for_region(self, alt_ac, alt_aln_method, start_i, end_i):
-        return self._object.get_tx_for_region(alt_ac, alt_aln_method, start_i, end_i)
+        return self._get_one("get_tx_for_region", alt_ac, alt_aln_method, start_i, end_i)
+
+    def get_tx_for_regions(self, alt_ac, alt_aln_method, starts, ends):
+        def get_many_func(keys):
+            return self._object.get_tx_for_regions(alt_ac, alt_aln_method, [k[2] for k in keys], [k[3] for k in keys])
+
+        keys = [(alt_ac, alt_aln_method, start_i, end_i) for start_i, end_i in zip(starts, ends)]
+        return self._get_many("get_tx_for_region", keys, get_many_func)
 
-    @lru_cache
     def get_tx_identity_info(self, tx_ac):
-        return self._object.get_tx_identity_info(tx_ac)
+        return self._get_one("get_tx_identity_info", tx_ac)
+
+    def get_tx_identity_info_many(self, tx_acs):
+        return self._get_many("get_tx_identity_info", [(tx_ac,) for tx_ac in tx_acs],
+                              lambda keys: self._object.get_tx_identity_info_many([k[0] for k in keys]))
 
-    @lru_cache
     def get_tx_info(self, tx_ac, alt_ac, alt_aln_method):
-        return self._object.get_tx_info(tx_ac, alt_ac, alt_aln_method)
+        return self._get_one("get_tx_info", tx_ac, alt_ac, alt_aln_method)
+
+    def get_tx_info_many(self, tx_info_args):
+        return self._get_many("get_tx_info", tx_info_args, self._object.get_tx_info_many)
 
-    @lru_cache
     def get_tx_mapping_options(self, tx_ac):
-        return self._object.get_tx_mapping_options(tx_ac)
+        return self._get_one("get_tx_mapping_options", tx_ac)
@@ -1,12 +1,19 @@
 import logging
+import math
 import os
 import re
+import sys
+from array import array
 from collections import defaultdict
-
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+from src.hgvs_dataproviders_rest.bounded_cache import MISSING, BoundedCache
 from src.hgvs_dataproviders_rest.txdata.cdot import get_ac_name_map, get_name_ac_map
+from src.hgvs_dataproviders_rest.txdata.http_transport import HTTPTransport, get_default_transport
+from src.hgvs_dataproviders_rest.txdata.transcript_model import ExonArray, Transcript, TranscriptBuild
 from src.hgvs_dataproviders_rest.txdata.txdata_interface import TxDataInterface
 
 
@@ -18,13 +25,22 @@ class EnsemblTarkDataProvider(TxDataInterface):
     NCBI_ALN_METHOD = "splign"
     required_version = "1.1"
 
-    def __init__(self, assemblies: list[str] = None, mode=None, cache=None, seqfetcher=None):
+    def __init__(self, assemblies: list[str] = None, mode=None, cache=None, seqfetcher=None,
+                 transport: HTTPTransport = None, max_page_workers: int = 8,
+                 transcript_cache_max_bytes: int = 256 * 1024 * 1024):
         """ assemblies: defaults to ["GRCh37", "GRCh38"]
             seqfetcher defaults to EnsemblTarkSeqFetcher(), which uses hgvs SeqFetcher for fastas
+            transport: defaults to the shared get_default_transport()
+            max_page_workers: threads used to retrieve the pages of paginated results
+            transcript_cache_max_bytes: approximate memory limit for cached transcripts (least recently used evicted)
         """
         self.base_url = "https://tark.ensembl.org/api"
-        # Local caches
-        self.transcript_results = {}
+        self.transport = transport or get_default_transport()
+        self.max_page_workers = max_page_workers
+        # Local cache of Transcript records (converted from expanded Tark JSON, so including sequences), keyed by:
+        #   tx_ac: Transcript with all builds - from _get_transcript
+        #   (tx_ac, genome_build): Transcript with 1 build - from gene/region searches, which may only cover 1 build
+        self.transcript_cache = BoundedCache(maxsize=None, max_bytes=transcript_cache_max_bytes)
 
         if assemblies is None:
             assemblies = ["GRCh37", "GRCh38"]
@@ -42,7 +58,7 @@ class EnsemblTarkDataProvider(TxDataInterface):
             self.assembly_by_contig.update({contig: assembly_name for contig in contig_map.keys()})
 
     def _get_from_url(self, url):
-        response = requests.get(url)
+        response = self.transport.get(url)
         if response.ok:
             if 'application/json' in response.headers.get('Content-Type'):
                 return response.json()
@@ -50,14 +66,56 @@ class EnsemblTarkDataProvider(TxDataInterface):
                 raise ValueError("Non-json response received for '%s' - are you behind a firewall?" % url)
         response.raise_for_status()
 
+    @staticmethod
+    def _get_page_urls(data):
+        """ URLs of all the pages after the first, worked out from its 'count' and 'next' link
+            Returns None if the next link doesn't use page or offset/limit pagination """
+        next_url = data["next"]
+        page_size = len(data["results"])
+        if not next_url:
+            return []
+        if not page_size:
+            return None
+
+        scheme, netloc, path, query, fragment = urlsplit(next_url)
+        params = dict(parse_qsl(query, keep_blank_values=True))
+        num_pages = math.ceil(data["count"] / page_size)
+        if "page" in params:
+            param = "page"
+            values = range(int(params["page"]), num_pages + 1)
+        elif "offset" in params:
+            param = "offset"
+            limit = int(params.get("limit", page_size))
+            values = range(int(params["offset"]), data["count"], limit)
+        else:
+            return None
+
+        page_urls = []
+        for value in values:
+            params[param] = value
+            page_urls.append(urlunsplit((scheme, netloc, path, urlencode(params), fragment)))
+        return page_urls
+
     def _get_all_paginated_transcript_results(self, url):
-        results = []
-        while url:
+        """ Retrieves the first page, then the rest concurrently (falling back to following 'next' links) """
+        data = self._get_from_url(url)
+        results = list(data["results"])
+        page_urls = self._get_page_urls(data)
+        if page_urls:
             # Next links are http
-            url = re.sub(r'^http://', 'https://', url)
-            data = self._get_from_url(url)
-            results.extend(data["results"])
+            page_urls = [re.sub(r'^http://', 'https://', page_url) for page_url in page_urls]
+            max_workers = max(1, min(self.max_page_workers, len(page_urls)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # map returns pages in order, so results are the same as retrieving them sequentially
+                for page_data in executor.map(self._get_from_url, page_urls):
+                    results.extend(page_data["results"])
+        elif page_urls is None:
             url = data["next"]
+            while url:
+                url = re.sub(r'^http://', 'https://', url)
+                data = self._get_from_url(url)
+                results.extend(data["results"])
+                url = data["next"]
         return self._filter_dupes_take_most_recent(results)
 
     @staticmethod
@@ -93,13 +151,12 @@ class EnsemblTarkDataProvider(TxDataInterface):
             identifier, version = transcript_accession, None
         return identifier, version
 
-    def _get_transcript_results(self, tx_ac):
-        """ This can be a list of (1 per build) """
-
-        # We store None for 404 on REST - so return even if false
-        if tx_ac in self.transcript_results:
-            return self.transcript_results[tx_ac]
+    def _get_transcript(self, tx_ac) -> Transcript:
+        """ Concurrent calls for the same tx_ac make a single request """
+        return self.transcript_cache.get_or_load(
+            tx_ac, lambda: self._get_transcript_model(self._fetch_transcript_results(tx_ac)))
 
+    def _fetch_transcript_results(self, tx_ac):
         url = os.path.join(self.base_url, "transcript/?")
         stable_id, version = self._get_transcript_id_and_version(tx_ac)
         params = {
@@ -110,25 +167,89 @@ class EnsemblTarkDataProvider(TxDataInterface):
         url += "&".join([f"{k}={v}" for k, v in params.items()])
         if results := self._get_all_paginated_transcript_results(url):
             if len(results) >= 1:
-                self.transcript_results[tx_ac] = results
                 return results
         raise HGVSDataNotAvailableError(f"Data for transcript='{tx_ac}' did not contain 'results': {results}")
 
-    def _get_transcript_for_contig(self, transcript_results, alt_ac):
+    def _get_transcript_model(self, transcript_results) -> Transcript:
+        """ transcript_results: expanded (expand_all) Tark JSON for 1 transcript, 1 per build """
+        transcript = transcript_results[0]
+        gene_name = None
+        if genes := transcript.get("genes"):
+            gene_name = sys.intern(genes[0]["name"])
+        cds_start_i, cds_end_i = self._get_cds_start_end(transcript)
+
+        protein = None
+        for t in transcript_results:
+            if translations := t.get("translations"):
+                protein = f"{translations[0]['stable_id']}.{translations[0]['stable_id_version']}"
+                break
+
+        sequence = None
+        if sequence_data := transcript.get("sequence"):
+            sequence = sequence_data["sequence"]
+
+        builds = {self._get_genome_build(t): self._get_transcript_build(t) for t in transcript_results}
+        return Transcript(gene_name, cds_start_i, cds_end_i, protein, builds, sequence=sequence)
+
+    def _get_transcript_build(self, transcript) -> TranscriptBuild:
+        alt_strand = transcript["loc_strand"]
+        exons = []
+        tx_pos = 0
+        for exon in transcript["exons"]:
+            length = exon["loc_end"] - exon["loc_start"] + 1
+            # UTA is 0 based, tark exon_order is 1 based
+            exons.append((exon["loc_start"] - 1, exon["loc_end"], exon["exon_order"] - 1, tx_pos, tx_pos + length))
+            tx_pos += length
+
+        # UTA wants exons in genomic order
+        if alt_strand == -1:
+            exons.reverse()
+
+        values = array("i")
+        for exon in exons:
+            values.extend(exon)
+        # Tark doesn't have alignment gaps
+        cigars = tuple(sys.intern(f"{alt_end_i - alt_start_i}=") for alt_start_i, alt_end_i, *_ in exons)
+        return TranscriptBuild(self._get_transcript_contig(transcript), alt_strand, ExonArray(values, cigars))
+
+    def _store_build_transcripts(self, transcripts):
+        """ transcripts must be expanded (expand_all) and have dupes filtered """
+        for transcript in transcripts:
+            key = (self._get_transcript_accession(transcript), self._get_genome_build(transcript))
+            self.transcript_cache.put(key, self._get_transcript_model([transcript]))
+
+    def _get_assembly_for_contig(self, alt_ac):
         assembly = self.assembly_by_contig.get(alt_ac)
         if assembly is None:
             supported_assemblies = ", ".join(self.assembly_maps.keys())
             raise ValueError(f"Contig '{alt_ac}' not supported. Supported assemblies: {supported_assemblies}")
+        return assembly
+
+    def _get_build_transcript(self, tx_ac, alt_ac) -> Optional[Transcript]:
+        """ Transcript with alt_ac's genome build (or None), only retrieving all the builds if a search didn't
+            return it """
+        assembly = self._get_assembly_for_contig(alt_ac)
+        transcript = self.transcript_cache.get((tx_ac, assembly))
+        if transcript is MISSING:
+            transcript = self._get_transcript(tx_ac)
+        if assembly in transcript.builds:
+            return transcript
+        return None
 
-        for transcript in transcript_results:
-            genome_build = self._get_genome_build(transcript)
-            if genome_build == assembly:
+    def _get_any_build_transcript(self, tx_ac) -> Transcript:
+        """ For assembly independent data (sequence, lengths etc) """
+        for assembly in self.assembly_maps:
+            transcript = self.transcript_cache.get((tx_ac, assembly))
+            if transcript is not MISSING:
                 return transcript
-        return None
+        return self._get_transcript(tx_ac)
 
     def data_version(self):
         return self.required_version
 
+    def data_source(self):
+        return self.base_url
+
     def schema_version(self):
         return self.required_version
 
@@ -142,11 +263,8 @@ class EnsemblTarkDataProvider(TxDataInterface):
         return assembly_map
 
     def get_transcript_sequence(self, ac):
-        seq = None
-        if results := self._get_transcript_results(ac):
-            transcript = results[0]  # any is fine
-            seq = transcript["sequence"]["sequence"]
-        return seq
+        transcript = self._get_any_build_transcript(ac)  # any is fine
+        return transcript.sequence
 
     @staticmethod
     def _get_cds_start_end(transcript):
@@ -191,82 +309,20 @@ class EnsemblTarkDataProvider(TxDataInterface):
 
     def get_tx_exons(self, tx_ac, alt_ac, alt_aln_method):
         self._check_alt_aln_method(alt_aln_method)
-        transcript_results = self._get_transcript_results(tx_ac)
-        if not transcript_results:
-            return None
-
-        transcript = self._get_transcript_for_contig(transcript_results, alt_ac)
-        tx_exons = []  # Genomic order
-        alt_strand = transcript["loc_strand"]
-
-        tx_pos = 0
-        for exon in transcript["exons"]:
-            length = exon["loc_end"] - exon["loc_start"] + 1
-            # UTA tx is 0 based
-            tx_start_i = tx_pos
-            tx_end_i = tx_pos + length
-            tx_pos = tx_end_i
-
-            # UTA is 0 based
-            exon_data = {
-                'tx_ac': tx_ac,
-                'alt_ac': alt_ac,
-                'alt_strand': alt_strand,
-                'alt_aln_method': alt_aln_method,
-                'ord': exon["exon_order"] - 1,  # tark is 1 based, UTA 0 based
-                'tx_start_i': tx_start_i,
-                'tx_end_i': tx_end_i,
-                'alt_start_i': exon["loc_start"] - 1,
-                'alt_end_i': exon["loc_end"],
-                'cigar': str(length) + "=",  # Tark doesn't have alignment gaps
-            }
-            tx_exons.append(exon_data)
-
-        # UTA wants exons in genomic order
-        if alt_strand == -1:
-            tx_exons.reverse()
-
-        return tx_exons
+        if transcript := self._get_build_transcript(tx_ac, alt_ac):
+            build = transcript.builds[self._get_assembly_for_contig(alt_ac)]
+            return build.tx_exons(tx_ac, alt_ac, alt_aln_method)  # Genomic order
+        return None
 
     def get_tx_identity_info(self, tx_ac):
         # Get any transcript as it's assembly independent
-        transcript_results = self._get_transcript_results(tx_ac)
-        if not transcript_results:
-            return None
-
-        transcript = transcript_results[0]  # Any will do
-        tx_info = self._get_transcript_info(transcript)
-
-        # Only using lengths (same in each build) not coordinates so grab anything
-        exons = transcript["exons"]
-        tx_info["lengths"] = [ex["loc_end"] + 1 - ex["loc_start"] for ex in exons]
-        tx_info["tx_ac"] = tx_ac
-        tx_info["alt_ac"] = tx_ac  # Same again
-        tx_info["alt_aln_method"] = "transcript"
-        return tx_info
-
-    @staticmethod
-    def _get_transcript_info(transcript):
-        gene_name = None
-        if gene := transcript.get("genes"):
-            gene_name = gene[0]["name"]
-        cds_start_i, cds_end_i = EnsemblTarkDataProvider._get_cds_start_end(transcript)
-        return {
-            "hgnc": gene_name,
-            "cds_start_i": cds_start_i,
-            "cds_end_i": cds_end_i,
-        }
+        return self._get_any_build_transcript(tx_ac).tx_identity_info(tx_ac)
 
     def get_tx_info(self, tx_ac, alt_ac, alt_aln_method):
         self._check_alt_aln_method(alt_aln_method)
 
-        if transcript_results := self._get_transcript_results(tx_ac):
-            if transcript := self._get_transcript_for_contig(transcript_results, alt_ac):
-                tx_info = self._get_transcript_info(transcript)
-                tx_info["tx_ac"] = tx_ac
-                tx_info["alt_ac"] = alt_ac
-                tx_info["alt_aln_method"] = self.NCBI_ALN_METHOD
-                return tx_info
+        if transcript := self._get_build_transcript(tx_ac, alt_ac):
+            return transcript.tx_info(tx_ac, alt_ac, self.NCBI_ALN_METHOD)
 
         raise HGVSDataNotAvailableError(
             f"No tx_info for (tx_ac={tx_ac},alt_ac={alt_ac},alt_aln_method={alt_aln_method})"
@@ -275,12 +331,11 @@ class EnsemblTarkDataProvider(TxDataInterface):
     def get_tx_mapping_options_without_validation(self, tx_ac):
         # We need to be able to call this from NoValidationExonsFromGenomeFastaSeqFetcher
         mapping_options = []
-        if transcript_results := self._get_transcript_results(tx_ac):
-            for transcript in transcript_results:
-                alt_ac = self._get_transcript_contig(transcript)
+        if transcript := self._get_transcript(tx_ac):
+            for build in transcript.builds.values():
                 mo = {
                     "tx_ac": tx_ac,
-                    "alt_ac": alt_ac,
+                    "alt_ac": build.contig,
                     "alt_aln_method": self.NCBI_ALN_METHOD,
                 }
                 mapping_options.append(mo)
@@ -317,15 +372,8 @@ class EnsemblTarkDataProvider(TxDataInterface):
         raise NotImplementedError()
 
     def get_pro_ac_for_tx_ac(self, tx_ac):
-        pro_ac = None
-        if transcript_results := self._get_transcript_results(tx_ac):
-            for transcript in transcript_results:
-                if translations := transcript.get("translations"):
-                    t = translations[0]
-                    protein_id = t["stable_id"]
-                    version = t["stable_id_version"]
-                    pro_ac = f"{protein_id}.{version}"
-                    return pro_ac
+        if transcript := self._get_transcript(tx_ac):
+            return transcript.protein
         return None
 
     def get_similar_transcripts(self, tx_ac):
@@ -357,13 +405,13 @@ class EnsemblTarkDataProvider(TxDataInterface):
         url = os.path.join(self.base_url, "transcript/search/?")
         params = {
             "identifier_field": gene,
-            "expand": "exons,genes,sequence",
+            "expand_all": "true",  # So transcripts can be cached for subsequent get_tx_exons etc
         }
         url += "&".join([f"{k}={v}" for k, v in params.items()])
 
-        # TODO: We could cache the transcripts from these...
         tx_list = []
         if results := self._get_from_url(url):
+            self._store_build_transcripts(self._filter_dupes_take_most_recent(results))
             for transcript in results:
                 cds_start_i, cds_end_i = self._get_cds_start_end(transcript)
                 alt_ac = self._get_transcript_contig(transcript)
@@ -388,8 +436,8 @@ class EnsemblTarkDataProvider(TxDataInterface):
         loc_region = self._get_chrom_from_contig(alt_ac)
         params = {
             "assembly_name": assembly,  # Restrict to genome build
-            # TODO: Expand all then store transcripts?
-            "expand": "transcript_release_set",  # We need this to filter dupes
+            # Need transcript_release_set to filter dupes, and the rest is cached for subsequent get_tx_exons etc
+            "expand_all": "true",
             "loc_end": end_i,
             "loc_region": loc_region,
             "loc_start": start_i + 1,  # UTA is 0 based, Tark is 1-based
@@ -397,6 +445,7 @@ class EnsemblTarkDataProvider(TxDataInterface):
         url += "&".join([f"{k}={v}" for k, v in params.items()])
         tx_list = []
         if results := self._get_all_paginated_transcript_results(url):
+            self._store_build_transcripts(results)
             for transcript in results:
                 contig = self._get_transcript_contig(transcript)
                 tx_start = transcript["loc_start"] - 1
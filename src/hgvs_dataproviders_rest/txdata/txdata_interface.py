@@ -1,5 +1,7 @@
 import abc
 
+from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+
 
 class TxDataInterface(abc.ABC):
     """Variant mapping and validation requires access to external data,
@@ -65,6 +67,11 @@ class TxDataInterface(abc.ABC):
     def schema_version(self):
         pass
 
+    def data_source(self):
+        """ Identifies the dataset (eg database and schema, files or URL) - data_version alone may not be unique.
+            Used to separate data in shared caches, None if unknown """
+        return None
+
     @abc.abstractmethod
     def get_acs_for_protein_seq(self, seq):
         pass
@@ -97,6 +104,13 @@ class TxDataInterface(abc.ABC):
     def get_tx_for_region(self, alt_ac, alt_aln_method, start_i, end_i):
         pass
 
+    def get_tx_for_regions(self, alt_ac, alt_aln_method, starts, ends):
+        """ return a list of transcripts overlapping each region (ie get_tx_for_region for each start_i/end_i)
+
+            Providers that can query many regions at once (eg in a single SQL statement) override this
+        """
+        return [self.get_tx_for_region(alt_ac, alt_aln_method, start_i, end_i) for start_i, end_i in zip(starts, ends)]
+
     @abc.abstractmethod
     def get_tx_identity_info(self, tx_ac):
         pass
@@ -105,6 +119,28 @@ class TxDataInterface(abc.ABC):
     def get_tx_info(self, tx_ac, alt_ac, alt_aln_method):
         pass
 
+    # Bulk versions of the above - each returns a list of results in the same order as the arguments, with None
+    # for transcripts that are not available (rather than raising HGVSDataNotAvailableError)
+    # Providers that can fetch many transcripts at once (eg in one query/request) override these
+
+    @staticmethod
+    def _none_if_not_available(func, *args):
+        try:
+            return func(*args)
+        except HGVSDataNotAvailableError:
+            return None
+
+    def get_tx_exons_many(self, tx_exons_args):
+        """ tx_exons_args: iterable of (tx_ac, alt_ac, alt_aln_method) """
+        return [self._none_if_not_available(self.get_tx_exons, *args) for args in tx_exons_args]
+
+    def get_tx_identity_info_many(self, tx_acs):
+        return [self._none_if_not_available(self.get_tx_identity_info, tx_ac) for tx_ac in tx_acs]
+
+    def get_tx_info_many(self, tx_info_args):
+        """ tx_info_args: iterable of (tx_ac, alt_ac, alt_aln_method) """
+        return [self._none_if_not_available(self.get_tx_info, *args) for args in tx_info_args]
+
     @abc.abstractmethod
     def get_tx_mapping_options(self, tx_ac):
         pass
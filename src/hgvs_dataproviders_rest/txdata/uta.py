@@ -6,11 +6,15 @@
 
 import contextlib
 import inspect
+import itertools
 import logging
 import os
+import re
 import weakref
 
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 import psycopg2.extras
 import psycopg2.pool
 from bioutils.assemblies import make_ac_name_map
@@ -19,13 +23,60 @@ from urllib import parse as urlparse
 
 from src import hgvs_dataproviders_rest
 from src.hgvs_dataproviders_rest import HGVSError, HGVSDataNotAvailableError
+from src.hgvs_dataproviders_rest.txdata.records import record_type
 from src.hgvs_dataproviders_rest.txdata.txdata_interface import TxDataInterface
 
 _logger = logging.getLogger(__name__)
 
 
+class RecordCursorMixin:
+    """ Returns rows as records.Record - tuples accessed by index or column name, like DictRow, but sharing one
+        column map between all rows of a query rather than allocating a list (and index reference) per row """
+
+    def _record_type(self):
+        return record_type(column.name for column in self.description)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is None:
+            return None
+        return self._record_type()(row)
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if not rows:
+            return rows
+        rt = self._record_type()
+        return [rt(row) for row in rows]
+
+    def fetchall(self):
+        rows = super().fetchall()
+        if not rows:
+            return rows
+        rt = self._record_type()
+        return [rt(row) for row in rows]
+
+    def __iter__(self):
+        # psycopg2 cursor.__iter__ returns the cursor itself (so would call this again) - read rows directly
+        rt = None
+        while (row := super().fetchone()) is not None:
+            if rt is None:
+                rt = self._record_type()
+            yield rt(row)
+
+
+class RecordCursor(RecordCursorMixin, psycopg2.extensions.cursor):
+    pass
+
+
 class UTABase(TxDataInterface):
     required_version = "1.1"
+    # Maximum number of transcripts sent in each bulk (_many) query
+    bulk_query_size = 1000
+    # Optional materialized view of transcript spans (see UTA_postgresql.create_tx_span_view), used by the
+    # region (_span) queries when present rather than aggregating every exon on the contig
+    tx_span_view = "tx_span_mv"
+    use_tx_span_view = False
 
     _queries = {
         "acs_for_protein_md5": """
@@ -47,6 +98,14 @@ class UTABase(TxDataInterface):
             where tx_ac=? and alt_ac=? and alt_aln_method=?
             order by alt_start_i
             """,
+        # Joined to the requested (tx_ac, alt_ac, alt_aln_method) tuples, not every combination of them
+        "tx_exons_many": """
+            select V.*
+            from tx_exon_aln_v V
+            join unnest(?::text[], ?::text[], ?::text[]) as K(tx_ac, alt_ac, alt_aln_method)
+            on V.tx_ac=K.tx_ac and V.alt_ac=K.alt_ac and V.alt_aln_method=K.alt_aln_method
+            order by V.tx_ac, V.alt_ac, V.alt_aln_method, V.alt_start_i
+            """,
         "tx_for_gene": """
             select hgnc, cds_start_i, cds_end_i, tx_ac, alt_ac, alt_aln_method
             from transcript T
@@ -60,17 +119,62 @@ class UTABase(TxDataInterface):
             group by tx_ac,alt_ac,alt_strand,alt_aln_method
             having min(start_i) < ? and ? <= max(end_i)
             """,
+        "alignments_for_regions": """
+            select R.region_i, A.*
+            from (
+                select tx_ac,alt_ac,alt_strand,alt_aln_method,min(start_i) as start_i,max(end_i) as end_i
+                from exon_set ES
+                join exon E on ES.exon_set_id=E.exon_set_id
+                where alt_ac=?
+                group by tx_ac,alt_ac,alt_strand,alt_aln_method
+            ) A
+            join unnest(?::integer[], ?::integer[]) with ordinality as R(start_i, end_i, region_i)
+            on A.start_i < R.start_i and R.end_i <= A.end_i
+            order by R.region_i
+            """,
+        # As above, using tx_span_view ({tx_span_view} is formatted with its name). The && overlap is implied by
+        # the exact (start_i < region start and region end <= end_i) test, and uses the view's GiST range index
+        "alignments_for_region_span": """
+            select S.tx_ac,S.alt_ac,S.alt_strand,S.alt_aln_method,S.start_i,S.end_i
+            from (select ?::text as alt_ac, ?::integer as start_i, ?::integer as end_i) R
+            join {tx_span_view} S on S.alt_ac=R.alt_ac
+            and int8range(S.start_i, S.end_i, '(]')
+                && int8range(least(R.start_i, R.end_i), greatest(R.start_i, R.end_i), '[]')
+            and S.start_i < R.start_i and R.end_i <= S.end_i
+            """,
+        "alignments_for_regions_span": """
+            select R.region_i,S.tx_ac,S.alt_ac,S.alt_strand,S.alt_aln_method,S.start_i,S.end_i
+            from (select ?::text as alt_ac) C
+            cross join unnest(?::integer[], ?::integer[]) with ordinality as R(start_i, end_i, region_i)
+            join {tx_span_view} S on S.alt_ac=C.alt_ac
+            and int8range(S.start_i, S.end_i, '(]')
+                && int8range(least(R.start_i, R.end_i), greatest(R.start_i, R.end_i), '[]')
+            and S.start_i < R.start_i and R.end_i <= S.end_i
+            order by R.region_i
+            """,
         "tx_identity_info": """
             select distinct(tx_ac), alt_ac, alt_aln_method, cds_start_i, cds_end_i, lengths, hgnc
             from tx_def_summary_v
             where tx_ac=?
             """,
+        "tx_identity_info_many": """
+            select distinct(tx_ac), alt_ac, alt_aln_method, cds_start_i, cds_end_i, lengths, hgnc
+            from tx_def_summary_v
+            where tx_ac = any(?)
+            """,
         "tx_info": """
             select hgnc, cds_start_i, cds_end_i, tx_ac, alt_ac, alt_aln_method
             from transcript T
             join exon_set ES on T.ac=ES.tx_ac
             where tx_ac=? and alt_ac=? and alt_aln_method=?
             """,
+        "tx_info_many": """
+            select hgnc, cds_start_i, cds_end_i, ES.tx_ac, ES.alt_ac, ES.alt_aln_method
+            from transcript T
+            join exon_set ES on T.ac=ES.tx_ac
+            join unnest(?::text[], ?::text[], ?::text[]) as K(tx_ac, alt_ac, alt_aln_method)
+            on ES.tx_ac=K.tx_ac and ES.alt_ac=K.alt_ac and ES.alt_aln_method=K.alt_aln_method
+            """,
         "tx_mapping_options": """
             select distinct tx_ac,alt_ac,alt_aln_method
             from tx_exon_aln_v where tx_ac=? and exon_aln_id is not NULL
@@ -120,12 +224,34 @@ class UTABase(TxDataInterface):
             cur.execute(sql, *args)
             return cur.fetchall()
 
+    @staticmethod
+    def _format_queries(queries, tx_span_view):
+        """ Fill in the (overridable) tx_span_view name used by the _span queries """
+        return {k: v.format(tx_span_view=tx_span_view) for k, v in queries.items()}
+
+    def _execute_query(self, cur, query_name, args):
+        """ Execute one of _queries - subclasses may override (eg to use prepared statements) """
+        cur.execute(self._queries[query_name], args)
+
+    def _fetchone_query(self, query_name, args):
+        with self._get_cursor() as cur:
+            self._execute_query(cur, query_name, args)
+            return cur.fetchone()
+
+    def _fetchall_query(self, query_name, args):
+        with self._get_cursor() as cur:
+            self._execute_query(cur, query_name, args)
+            return cur.fetchall()
+
     ############################################################################
     # Queries
 
     def data_version(self):
         return self.url.schema
 
+    def data_source(self):
+        return f"{self.url.hostname}:{self.url.port}/{self.url.database}/{self.url.schema}"
+
     def schema_version(self):
         return self._fetchone("select * from meta where key = 'schema_version'")["value"]
 
@@ -148,7 +274,7 @@ class UTABase(TxDataInterface):
         list.
         """
         md5 = seq_md5(seq)
-        return [r["ac"] for r in self._fetchall(self._queries["acs_for_protein_md5"], [md5])] + [
+        return [r["ac"] for r in self._fetchall_query("acs_for_protein_md5", [md5])] + [
             "MD5_" + md5
         ]
 
@@ -168,7 +294,7 @@ class UTABase(TxDataInterface):
         added   | 2014-02-04 21:39:32.57125
 
         """
-        return self._fetchone(self._queries["gene_info"], [gene])
+        return self._fetchone_query("gene_info", [gene])
 
     def get_tx_exons(self, tx_ac, alt_ac, alt_aln_method):
         """
@@ -212,7 +338,12 @@ class UTABase(TxDataInterface):
         'NM_199425.2'
 
         """
-        rows = self._fetchall(self._queries["tx_exons"], [tx_ac, alt_ac, alt_aln_method])
+        rows = self._fetchall_query("tx_exons", [tx_ac, alt_ac, alt_aln_method])
+        self._check_tx_exons(rows, tx_ac, alt_ac, alt_aln_method)
+        return rows
+
+    @staticmethod
+    def _check_tx_exons(rows, tx_ac, alt_ac, alt_aln_method):
         if len(rows) == 0:
             raise HGVSDataNotAvailableError(
                 "No tx_exons for (tx_ac={tx_ac},alt_ac={alt_ac},alt_aln_method={alt_aln_method})".format(
@@ -229,7 +360,35 @@ class UTABase(TxDataInterface):
                     tx_ac=tx_ac, alt_ac=alt_ac, alt_aln_method=alt_aln_method
                 )
             )
-        return rows
+
+    def _fetch_many(self, query_name, keys):
+        """ Run a bulk query (with an array parameter per key column) over chunks of unique keys,
+            yielding rows. keys are tuples of (tx_ac, ...) """
+        unique_keys = list(dict.fromkeys(keys))
+        for i in range(0, len(unique_keys), self.bulk_query_size):
+            chunk = unique_keys[i:i + self.bulk_query_size]
+            yield from self._fetchall_query(query_name, [list(column) for column in zip(*chunk)])
+
+    def get_tx_exons_many(self, tx_exons_args):
+        """
+        get_tx_exons for many (tx_ac, alt_ac, alt_aln_method), using a query per bulk_query_size transcripts
+
+        returns a list of tx_exons in the same order as tx_exons_args, None for those not available
+        """
+        tx_exons_args = [tuple(args) for args in tx_exons_args]
+        rows_by_key = {}
+        for row in self._fetch_many("tx_exons_many", tx_exons_args):
+            rows_by_key.setdefault((row["tx_ac"], row["alt_ac"], row["alt_aln_method"]), []).append(row)
+
+        results = []
+        for key in tx_exons_args:
+            rows = rows_by_key.get(key, [])
+            try:
+                self._check_tx_exons(rows, *key)
+            except HGVSDataNotAvailableError:
+                rows = None
+            results.append(rows)
+        return results
 
     def get_tx_for_gene(self, gene):
         """
@@ -238,7 +397,7 @@ class UTABase(TxDataInterface):
         :param gene: HGNC gene name
         :type gene: str
         """
-        return self._fetchall(self._queries["tx_for_gene"], [gene])
+        return self._fetchall_query("tx_for_gene", [gene])
 
     def get_tx_for_region(self, alt_ac, alt_aln_method, start_i, end_i):
         """
@@ -264,13 +423,47 @@ class UTABase(TxDataInterface):
         :param str alt_aln_method: OPTIONAL alignment method (e.g., splign)
         """
 
-        alignments = self._fetchall(
-            self._queries["alignments_for_region"], [alt_ac, start_i, end_i]
-        )
+        query_name = self._region_query_name("alignments_for_region")
+        alignments = self._fetchall_query(query_name, [alt_ac, start_i, end_i])
         if alt_aln_method is not None:
             alignments = [a for a in alignments if a["alt_aln_method"] == alt_aln_method]
         return alignments
 
+    def get_tx_for_regions(self, alt_ac, alt_aln_method, starts, ends):
+        """
+        return transcripts that overlap each region, using a single query for all regions
+
+        :param str alt_ac: reference sequence (e.g., NC_000007.13)
+        :param str alt_aln_method: alignment method (e.g., splign)
+        :param list starts: 5' bound of each region
+        :param list ends: 3' bound of each region
+
+        Rows are records.Record with the same columns as get_tx_for_region
+        """
+
+        starts = list(starts)
+        ends = list(ends)
+        rows = self._fetchall_query(self._region_query_name("alignments_for_regions"), [alt_ac, starts, ends])
+        return self._group_region_rows(rows, alt_aln_method, len(starts))
+
+    @staticmethod
+    def _group_region_rows(rows, alt_aln_method, num_regions):
+        """ Query rows are (region_i, *alignment columns) - group alignments by region, dropping region_i """
+        tx_lists = [[] for _ in range(num_regions)]
+        rt = None
+        for row in rows:
+            if alt_aln_method is None or row["alt_aln_method"] == alt_aln_method:
+                values = tuple(row)
+                if rt is None:
+                    rt = record_type(list(row.keys())[1:])
+                tx_lists[values[0] - 1].append(rt(values[1:]))
+        return tx_lists
+
+    def _region_query_name(self, query_name):
+        if self.use_tx_span_view:
+            return query_name + "_span"
+        return query_name
+
     def get_tx_identity_info(self, tx_ac):
         """returns features associated with a single transcript.
 
@@ -288,13 +481,24 @@ class UTABase(TxDataInterface):
         hgnc           | VSX1
 
         """
-        rows = self._fetchall(self._queries["tx_identity_info"], [tx_ac])
+        rows = self._fetchall_query("tx_identity_info", [tx_ac])
         if len(rows) == 0:
             raise HGVSDataNotAvailableError(
                 "No transcript definition for (tx_ac={tx_ac})".format(tx_ac=tx_ac)
             )
         return rows[0]
 
+    def get_tx_identity_info_many(self, tx_acs):
+        """get_tx_identity_info for many transcripts, using a query per bulk_query_size transcripts
+
+        returns a list in the same order as tx_acs, None for those not available
+        """
+        tx_acs = list(tx_acs)
+        rows_by_tx_ac = {}
+        for row in self._fetch_many("tx_identity_info_many", [(tx_ac,) for tx_ac in tx_acs]):
+            rows_by_tx_ac.setdefault(row["tx_ac"], row)
+        return [rows_by_tx_ac.get(tx_ac) for tx_ac in tx_acs]
+
     def get_tx_info(self, tx_ac, alt_ac, alt_aln_method):
         """return a single transcript info for supplied accession (tx_ac, alt_ac, alt_aln_method), or None if not found
 
@@ -317,16 +521,19 @@ class UTABase(TxDataInterface):
         alt_aln_method | splign
 
         """
-        rows = self._fetchall(self._queries["tx_info"], [tx_ac, alt_ac, alt_aln_method])
+        rows = self._fetchall_query("tx_info", [tx_ac, alt_ac, alt_aln_method])
+        self._check_tx_info(rows, tx_ac, alt_ac, alt_aln_method)
+        return rows[0]
+
+    @staticmethod
+    def _check_tx_info(rows, tx_ac, alt_ac, alt_aln_method):
         if len(rows) == 0:
             raise HGVSDataNotAvailableError(
                 "No tx_info for (tx_ac={tx_ac},alt_ac={alt_ac},alt_aln_method={alt_aln_method})".format(
                     tx_ac=tx_ac, alt_ac=alt_ac, alt_aln_method=alt_aln_method
                 )
             )
-        elif len(rows) == 1:
-            return rows[0]
-        else:
+        if len(rows) > 1:
             raise HGVSError(
                 "Multiple ({n}) replies for tx_info(tx_ac="
                 "{tx_ac},alt_ac={alt_ac},alt_aln_method={alt_aln_method})".format(
@@ -334,6 +541,26 @@ class UTABase(TxDataInterface):
                 )
             )
 
+    def get_tx_info_many(self, tx_info_args):
+        """get_tx_info for many (tx_ac, alt_ac, alt_aln_method), using a query per bulk_query_size transcripts
+
+        returns a list in the same order as tx_info_args, None for those not available
+        """
+        tx_info_args = [tuple(args) for args in tx_info_args]
+        rows_by_key = {}
+        for row in self._fetch_many("tx_info_many", tx_info_args):
+            rows_by_key.setdefault((row["tx_ac"], row["alt_ac"], row["alt_aln_method"]), []).append(row)
+
+        results = []
+        for key in tx_info_args:
+            rows = rows_by_key.get(key, [])
+            try:
+                self._check_tx_info(rows, *key)
+            except HGVSDataNotAvailableError:
+                rows = [None]
+            results.append(rows[0])
+        return results
+
     def get_tx_mapping_options(self, tx_ac):
         """Return all transcript alignment sets for a given transcript
         accession (tx_ac); returns empty list if transcript does not
@@ -360,7 +587,7 @@ class UTABase(TxDataInterface):
         alt_aln_method | blat
 
         """
-        rows = self._fetchall(self._queries["tx_mapping_options"], [tx_ac])
+        rows = self._fetchall_query("tx_mapping_options", [tx_ac])
         return rows
 
     def get_similar_transcripts(self, tx_ac):
@@ -392,14 +619,14 @@ class UTABase(TxDataInterface):
 
         """
 
-        rows = self._fetchall(self._queries["tx_similar"], [tx_ac])
+        rows = self._fetchall_query("tx_similar", [tx_ac])
         return rows
 
     def get_pro_ac_for_tx_ac(self, tx_ac):
         """Return the (single) associated protein accession for a given transcript
         accession, or None if not found."""
 
-        rows = self._fetchall(self._queries["tx_to_pro"], [tx_ac])
+        rows = self._fetchall_query("tx_to_pro", [tx_ac])
         try:
             return rows[0]["pro_ac"]
         except IndexError:
@@ -410,6 +637,16 @@ class UTABase(TxDataInterface):
         return make_ac_name_map(assembly_name)
 
 
+def _to_positional_params(sql):
+    """ Replace ? placeholders with the $1, $2... used by PREPARE
+
+    >>> _to_positional_params("select * from exon where tx_ac=? and alt_ac = any(?::text[])")
+    'select * from exon where tx_ac=$1 and alt_ac = any($2::text[])'
+    """
+    params = itertools.count(1)
+    return re.sub(r"\?", lambda _: f"${next(params)}", sql)
+
+
 class UTA_postgresql(UTABase):
     def __init__(
         self,
@@ -420,13 +657,23 @@ class UTA_postgresql(UTABase):
         application_name=None,
         mode=None,
         cache=None,
+        prepare_statements: bool = False,
+        cursor_factory=psycopg2.extras.DictCursor,
     ):
+        """ prepare_statements: run queries as server-side prepared statements (parsed and planned once per
+                                connection). Only enable when connecting directly to PostgreSQL - with a
+                                transaction pooler such as pgbouncer, statements don't persist between
+                                server connections (if that is detected, queries fall back to unprepared)
+            cursor_factory: RecordCursor returns compact (immutable) rows, which use much less memory than
+                            the default DictRows """
         if url.schema is None:
             raise Exception("No schema name provided in {url}".format(url=url))
         self.application_name = application_name
         self.pooling = pooling
         self.pool_min = pool_min
         self.pool_max = pool_max
+        self.prepare_statements = prepare_statements
+        self.cursor_factory = cursor_factory
         self._conn = None
         self._pool = None
         # If we're using connection pooling, track the set of DB
@@ -434,6 +681,8 @@ class UTA_postgresql(UTABase):
         # search path. Use weak references to avoid keeping connection
         # objects alive unnecessarily.
         self._conns_seen = weakref.WeakSet()
+        # Likewise the names of the queries prepared on each connection
+        self._prepared_statements = weakref.WeakKeyDictionary()
         super(UTA_postgresql, self).__init__(url, mode, cache)
 
     def __del__(self):
@@ -472,7 +721,43 @@ class UTA_postgresql(UTABase):
         self._ensure_schema_exists()
 
         # remap sqlite's ? placeholders to psycopg2's %s
-        self._queries = {k: v.replace("?", "%s") for k, v in self._queries.items()}
+        queries = self._format_queries(type(self)._queries, self.tx_span_view)
+        self._queries = {k: v.replace("?", "%s") for k, v in queries.items()}
+        self.use_tx_span_view = self._tx_span_view_exists()
+        if self.use_tx_span_view:
+            _logger.info("Using %s for region queries", self.tx_span_view)
+
+    def _tx_span_view_exists(self):
+        r = self._fetchone("select to_regclass(%s) is not null", [self.url.schema + "." + self.tx_span_view])
+        return r[0]
+
+    def create_tx_span_view(self):
+        """ Create (if needed) the materialized view of transcript spans used for region queries
+            Requires write access to the schema (and to create the btree_gist extension if it isn't installed).
+            Newly connected providers use it automatically """
+        with self._get_cursor() as cur:
+            cur.execute("""
+                create materialized view if not exists {view} as
+                select tx_ac,alt_ac,alt_strand,alt_aln_method,min(start_i) as start_i,max(end_i) as end_i
+                from exon_set ES
+                join exon E on ES.exon_set_id=E.exon_set_id
+                group by tx_ac,alt_ac,alt_strand,alt_aln_method
+                """.format(view=self.tx_span_view))
+            # Unique key (also allows refresh concurrently)
+            cur.execute("create unique index if not exists {view}_key on {view} "
+                        "(alt_ac, alt_aln_method, tx_ac, alt_strand)".format(view=self.tx_span_view))
+            # Range lookups by contig. A btree on (alt_ac, start_i, end_i) would scan every span on the contig
+            # starting before the position - GiST (btree_gist for alt_ac) finds overlapping ranges directly.
+            # The expression must match the _span queries
+            cur.execute("create extension if not exists btree_gist")
+            cur.execute("create index if not exists {view}_range on {view} using gist "
+                        "(alt_ac, int8range(start_i, end_i, '(]'))".format(view=self.tx_span_view))
+        self.use_tx_span_view = True
+
+    def refresh_tx_span_view(self):
+        """ Only needed if the schema's exons are modified """
+        with self._get_cursor() as cur:
+            cur.execute("refresh materialized view concurrently {view}".format(view=self.tx_span_view))
 
     def _ensure_schema_exists(self):
         # N.B. On AWS RDS, information_schema.schemata always returns zero rows
@@ -512,7 +797,7 @@ class UTA_postgresql(UTABase):
                 # autocommit=True obviates closing explicitly
                 conn.autocommit = True
 
-                cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+                cur = conn.cursor(cursor_factory=self.cursor_factory)
                 if self.pooling:
                     # this might be a new connection, in which case we
                     # need to set the search path
@@ -553,6 +838,33 @@ class UTA_postgresql(UTABase):
     def _set_search_path(self, cur):
         cur.execute("set search_path = {self.url.schema},public;".format(self=self))
 
+    def _execute_query(self, cur, query_name, args):
+        """ Prepares the query on first use on each connection, then executes it by name """
+        if not self.prepare_statements:
+            return super()._execute_query(cur, query_name, args)
+
+        conn = cur.connection
+        prepared = self._prepared_statements.get(conn)
+        if prepared is None:
+            prepared = self._prepared_statements[conn] = set()
+        statement = "hgvs_" + query_name
+        try:
+            if query_name not in prepared:
+                # Class queries still have ? placeholders (the instance's are remapped to %s on connect)
+                sql = type(self)._queries[query_name].format(tx_span_view=self.tx_span_view)
+                cur.execute("prepare {} as {}".format(statement, _to_positional_params(sql)))
+                prepared.add(query_name)
+            if args:
+                cur.execute("execute {} ({})".format(statement, ", ".join(["%s"] * len(args))), args)
+            else:
+                cur.execute("execute " + statement)
+        except (psycopg2.errors.InvalidSqlStatementName, psycopg2.errors.DuplicatePreparedStatement) as e:
+            # Prepared statements aren't tied to our connection (eg pgbouncer transaction pooling)
+            _logger.warning("Prepared statements not usable on %s (%s) - running queries unprepared",
+                            self.url, str(e).strip())
+            self.prepare_statements = False
+            super()._execute_query(cur, query_name, args)
+
 
 class ParseResult(urlparse.ParseResult):
     """Subclass of url.ParseResult that adds database and schema methods,
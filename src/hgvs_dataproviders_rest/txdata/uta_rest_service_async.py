@@ -0,0 +1,195 @@
+"""asyncio client for the hgvs dataprovider REST api
+
+Same methods as UTARESTService, as coroutines, so many lookups can be in flight at once:
+
+    async with AsyncUTARESTService(url) as hdp:
+        tx_exons = await asyncio.gather(*[hdp.get_tx_exons(tx_ac, alt_ac, "splign") for tx_ac in tx_acs])
+
+Requests go through one pooled httpx.AsyncClient (keep-alive, and HTTP/2 if the h2 package is installed), with the
+number of concurrent requests capped by max_concurrency.
+"""
+
+import asyncio
+import os
+from typing import List, Optional, Union
+
+from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+from src.hgvs_dataproviders_rest.txdata.uta_rest_service_client import UTARESTEndpoints
+
+
+def connect():
+    url = os.environ.get("UTAREST_URL", "https://api.biocommons.org/utarest/0")
+    return AsyncUTARESTService(url)
+
+
+class AsyncUTARESTService(UTARESTEndpoints):
+    def __init__(self, server_url, timeout=30, max_concurrency=100, http2=True, client=None):
+        """ max_concurrency: maximum requests in flight (and pooled connections)
+            client: httpx.AsyncClient to use instead of creating one """
+        self.server = server_url
+        self.application_name = "UTA REST"
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._unsupported_bulk_endpoints = set()
+        self._semaphore = None
+        self.pingresponse = None
+
+        if client is None:
+            try:
+                import httpx
+            except ImportError as e:
+                raise ImportError("AsyncUTARESTService requires httpx, install with: pip install 'httpx[http2]'") from e
+
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    http2 = False
+            limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+            client = httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout)
+        self._client = client
+
+    async def __aenter__(self):
+        await self.ping()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def ping(self) -> dict:
+        """ Retrieves (and checks) server versions. Called by "async with" and the version methods - other
+            queries don't check versions, so call this first if not using "async with" """
+        if self.pingresponse is None:
+            pingresponse = await self._get_json(self._url("ping"))
+            required_major, required_minor = map(int, self.required_version.split("."))
+            available = list(map(int, pingresponse["schema_version"].split("."))) + [0]
+            if not (available[0] == required_major and available[1] >= required_minor):
+                raise RuntimeError(f"Incompatible versions: {type(self).__name__} requires schema version "
+                                   f"{self.required_version}, but {self.server} provides version "
+                                   f"{pingresponse['schema_version']}")
+            self.pingresponse = pingresponse
+        return self.pingresponse
+
+    def _get_semaphore(self):
+        # Created on first use, so it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _get_json(self, url: str):
+        async with self._get_semaphore():
+            response = await self._client.get(url)
+        return response.json()
+
+    async def _post_bulk(self, endpoint: str, url: str, data) -> Optional[List]:
+        """ POSTs data to a bulk endpoint, returns None if the server doesn't support it """
+        if endpoint in self._unsupported_bulk_endpoints:
+            return None
+        async with self._get_semaphore():
+            response = await self._client.post(url, json=data)
+        if response.status_code in (404, 405, 501):
+            self._unsupported_bulk_endpoints.add(endpoint)
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    async def _none_if_not_available(coroutine):
+        try:
+            return await coroutine
+        except HGVSDataNotAvailableError:
+            return None
+
+    async def _get_many_bulk(self, endpoint: str, args_list: List, get_func) -> List:
+        """ POSTs chunks of args to a bulk endpoint concurrently. If the server doesn't support it, gathers
+            get_func(*args) for each, with None where data isn't available """
+        multiple_args = self.bulk_arg_names[endpoint] is not None
+
+        async def get_chunk(chunk, data):
+            chunk_results = await self._post_bulk(endpoint, self._url(endpoint), data)
+            if chunk_results is None:
+                chunk_results = await asyncio.gather(*[
+                    self._none_if_not_available(get_func(*args) if multiple_args else get_func(args))
+                    for args in chunk
+                ])
+            return chunk_results
+
+        chunk_results = await asyncio.gather(*[get_chunk(chunk, data)
+                                               for chunk, data in self._bulk_chunks(endpoint, list(args_list))])
+        return [result for results in chunk_results for result in results]
+
+    ############################################################################
+    # Queries
+
+    async def data_version(self) -> str:
+        return (await self.ping())["data_version"]
+
+    async def schema_version(self) -> str:
+        return (await self.ping())["schema_version"]
+
+    async def sequence_source(self) -> str:
+        return (await self.ping())["sequence_source"]
+
+    async def get_acs_for_protein_seq(self, seq: str) -> List:
+        return await self._get_json(self._url("acs_for_protein_seq", seq))
+
+    async def get_gene_info(self, gene: str) -> Union[dict, None]:
+        return await self._get_json(self._url("gene_info", gene))
+
+    async def get_tx_exons(self, tx_ac: str, alt_ac: str, alt_aln_method: str) -> List[dict]:
+        return await self._get_json(self._url("tx_exons", tx_ac, alt_ac, alt_aln_method=alt_aln_method))
+
+    async def get_tx_exons_many(self, tx_exons_args: List) -> List[Optional[List[dict]]]:
+        """ returns a list in the same order as tx_exons_args, None for those not available """
+        return await self._get_many_bulk("tx_exons_many", tx_exons_args, self.get_tx_exons)
+
+    async def get_tx_for_gene(self, gene: str) -> Union[List[dict], None]:
+        return await self._get_json(self._url("tx_for_gene", gene))
+
+    async def get_tx_for_region(self, alt_ac: str, alt_aln_method: str, start_i: int, end_i: int) -> List[dict]:
+        url = self._url("tx_for_region", alt_ac, alt_aln_method=alt_aln_method, start_i=start_i, end_i=end_i)
+        return await self._get_json(url)
+
+    async def get_tx_for_regions(self, alt_ac: str, alt_aln_method: str, starts: List[int],
+                                 ends: List[int]) -> List[List[dict]]:
+        data = {"starts": list(starts), "ends": list(ends)}
+        url = self._url("tx_for_regions", alt_ac, alt_aln_method=alt_aln_method)
+        tx_lists = await self._post_bulk("tx_for_regions", url, data)
+        if tx_lists is None:
+            tx_lists = await asyncio.gather(*[self.get_tx_for_region(alt_ac, alt_aln_method, start_i, end_i)
+                                              for start_i, end_i in zip(data["starts"], data["ends"])])
+        return tx_lists
+
+    async def get_alignments_for_region(self, alt_ac: str, start_i: int, end_i: int,
+                                        alt_aln_method: Optional[str] = None) -> List:
+        url = self._url("alignments_for_region", alt_ac, start_i=start_i, end_i=end_i, alt_aln_method=alt_aln_method)
+        return await self._get_json(url)
+
+    async def get_tx_identity_info(self, tx_ac: str) -> dict:
+        return await self._get_json(self._url("tx_identity_info", tx_ac))
+
+    async def get_tx_identity_info_many(self, tx_acs: List[str]) -> List[Optional[dict]]:
+        """ returns a list in the same order as tx_acs, None for those not available """
+        return await self._get_many_bulk("tx_identity_info_many", tx_acs, self.get_tx_identity_info)
+
+    async def get_tx_info(self, tx_ac: str, alt_ac: str, alt_aln_method: str) -> dict:
+        return await self._get_json(self._url("tx_info", tx_ac, alt_ac, alt_aln_method=alt_aln_method))
+
+    async def get_tx_info_many(self, tx_info_args: List) -> List[Optional[dict]]:
+        """ returns a list in the same order as tx_info_args, None for those not available """
+        return await self._get_many_bulk("tx_info_many", tx_info_args, self.get_tx_info)
+
+    async def get_tx_mapping_options(self, tx_ac: str) -> Union[List[dict], None]:
+        return await self._get_json(self._url("tx_mapping_options", tx_ac))
+
+    async def get_similar_transcripts(self, tx_ac: str) -> Union[List[dict], None]:
+        return await self._get_json(self._url("similar_transcripts", tx_ac))
+
+    async def get_pro_ac_for_tx_ac(self, tx_ac: str) -> Union[str, None]:
+        return await self._get_json(self._url("pro_ac_for_tx_ac", tx_ac))
+
+    async def get_assembly_map(self, assembly_name: str) -> dict:
+        return await self._get_json(self._url("assembly_map", assembly_name))
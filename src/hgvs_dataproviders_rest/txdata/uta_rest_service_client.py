@@ -7,9 +7,9 @@
 
 import os
 from typing import List, Optional, Union
+from urllib.parse import urlencode
 
-import requests
-
+from src.hgvs_dataproviders_rest.txdata.http_transport import HTTPTransport, get_default_transport
 from src.hgvs_dataproviders_rest.txdata.txdata_interface import TxDataInterface
 
 
@@ -19,14 +19,46 @@ def connect():
     return UTARESTService(url)
 
 
-class UTARESTService(TxDataInterface):
+class UTARESTEndpoints:
+    """ Builds UTA REST urls/requests - shared by the UTARESTService and AsyncUTARESTService clients """
     required_version = "1.0"
-
-    def __init__(self, server_url, mode=None, cache=None, timeout=30):
+    # Maximum number of transcripts sent in each bulk request
+    bulk_request_size = 1000
+    # Bulk endpoints and names of their argument fields (None to send plain values)
+    bulk_arg_names = {
+        "tx_exons_many": ("tx_ac", "alt_ac", "alt_aln_method"),
+        "tx_identity_info_many": None,
+        "tx_info_many": ("tx_ac", "alt_ac", "alt_aln_method"),
+    }
+
+    def _url(self, endpoint: str, *path, **params) -> str:
+        """ eg _url("tx_exons", tx_ac, alt_ac, alt_aln_method="splign") - params with value None are left out """
+        url = "/".join([self.server, endpoint, *path])
+        params = {name: value for name, value in params.items() if value is not None}
+        if params:
+            url += "?" + urlencode(params)
+        return url
+
+    def _bulk_chunks(self, endpoint: str, args_list: List):
+        """ Yields (args chunk, POST data) bulk_request_size at a time """
+        arg_names = self.bulk_arg_names[endpoint]
+        for i in range(0, len(args_list), self.bulk_request_size):
+            chunk = args_list[i:i + self.bulk_request_size]
+            data = [dict(zip(arg_names, args)) for args in chunk] if arg_names else chunk
+            yield chunk, data
+
+
+class UTARESTService(UTARESTEndpoints, TxDataInterface):
+
+    def __init__(self, server_url, mode=None, cache=None, timeout=30, transport: Optional[HTTPTransport] = None):
+        """ transport: defaults to the shared get_default_transport() """
         self.server = server_url
         self.application_name = "UTA REST"
         self.timeout = timeout
-        self.pingresponse = requests.get(server_url + "/ping", timeout=self.timeout).json()
+        self.transport = transport or get_default_transport()
+        # Bulk endpoints that returned 404/405/501, so we use single requests instead
+        self._unsupported_bulk_endpoints = set()
+        self.pingresponse = self._get_json(self._url("ping"))
         super().__init__()
 
     def __str__(self):
@@ -46,6 +78,9 @@ class UTARESTService(TxDataInterface):
     def data_version(self) -> str:
         return self.pingresponse["data_version"]
 
+    def data_source(self) -> str:
+        return self.server
+
     def schema_version(self) -> str:
         return self.pingresponse["schema_version"]
 
@@ -72,6 +107,30 @@ class UTARESTService(TxDataInterface):
                 params_added = True
         return retval
 
+    def _get_json(self, url: str):
+        return self.transport.get(url, timeout=self.timeout).json()
+
+    def _post_bulk(self, endpoint: str, url: str, data) -> Optional[List]:
+        """ POSTs data to a bulk endpoint, returns None if the server doesn't support it """
+        if endpoint in self._unsupported_bulk_endpoints:
+            return None
+        response = self.transport.post(url, json=data, timeout=self.timeout)
+        if response.status_code in (404, 405, 501):
+            self._unsupported_bulk_endpoints.add(endpoint)
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def _get_many_bulk(self, endpoint: str, args_list: List, get_many_func) -> List:
+        """ POSTs args to a bulk endpoint in chunks, falling back to get_many_func if the server doesn't support it """
+        results = []
+        for chunk, data in self._bulk_chunks(endpoint, args_list):
+            chunk_results = self._post_bulk(endpoint, self._url(endpoint), data)
+            if chunk_results is None:
+                chunk_results = get_many_func(chunk)
+            results.extend(chunk_results)
+        return results
+
     def get_acs_for_protein_seq(self, seq: str) -> List:
         """
         returns a list of protein accessions for a given sequence.  The
@@ -79,8 +138,8 @@ class UTARESTService(TxDataInterface):
         MD5-based accession (MD5_01234abc...def56789) at the end of the
         list.
         """
-        url = f"{self.server}/acs_for_protein_seq/{seq}"
-        return requests.get(url, timeout=self.timeout).json()
+        url = self._url("acs_for_protein_seq", seq)
+        return self._get_json(url)
 
     def get_gene_info(self, gene: str) -> Union[dict, None]:
         """
@@ -100,8 +159,8 @@ class UTARESTService(TxDataInterface):
         }
 
         """
-        url = f"{self.server}/gene_info/{self.gene}"
-        return requests.get(url, timeout=self.timeout).json()
+        url = self._url("gene_info", gene)
+        return self._get_json(url)
 
     def get_tx_exons(self, tx_ac: str, alt_ac: str, alt_aln_method: str) -> List[dict]:
         """
@@ -149,8 +208,16 @@ class UTARESTService(TxDataInterface):
         'NM_199425.2'
 
         """
-        url = f"{self.server}/tx_exons/{tx_ac}/{alt_ac}?alt_aln_method={alt_aln_method}"
-        return requests.get(url, timeout=self.timeout).json()
+        url = self._url("tx_exons", tx_ac, alt_ac, alt_aln_method=alt_aln_method)
+        return self._get_json(url)
+
+    def get_tx_exons_many(self, tx_exons_args: List) -> List[Optional[List[dict]]]:
+        """
+        get_tx_exons for many (tx_ac, alt_ac, alt_aln_method), POSTed bulk_request_size at a time
+
+        returns a list in the same order as tx_exons_args, None for those not available
+        """
+        return self._get_many_bulk("tx_exons_many", list(tx_exons_args), super().get_tx_exons_many)
 
     def get_tx_for_gene(self, gene: str) -> Union[List[dict], None]:
         """
@@ -159,8 +226,8 @@ class UTARESTService(TxDataInterface):
         :param gene: HGNC gene name
         :type gene: str
         """
-        url = f"{self.server}/tx_for_gene/{gene}"
-        return requests.get(url, timeout=self.timeout).json()
+        url = self._url("tx_for_gene", gene)
+        return self._get_json(url)
 
     def get_tx_for_region(self, alt_ac: str, alt_aln_method: str, start_i: int, end_i: int) -> Union[List[dict], None]:
         """
@@ -171,8 +238,26 @@ class UTARESTService(TxDataInterface):
         :param int start_i: 5' bound of region
         :param int end_i: 3' bound of region
         """
-        url = f"{self.server}/tx_for_region/{alt_ac}?alt_aln_method={alt_aln_method}&start_i={start_i}&end_i={end_i}"
-        return requests.get(url, timeout=self.timeout).json()
+        url = self._url("tx_for_region", alt_ac, alt_aln_method=alt_aln_method, start_i=start_i, end_i=end_i)
+        return self._get_json(url)
+
+    def get_tx_for_regions(self, alt_ac: str, alt_aln_method: str, starts: List[int],
+                           ends: List[int]) -> List[List[dict]]:
+        """
+        return transcripts that overlap each region, in one request to the bulk endpoint
+        (falls back to a request per region if the server doesn't provide it)
+
+        :param str alt_ac: reference sequence (e.g., NC_000007.13)
+        :param str alt_aln_method: alignment method (e.g., splign)
+        :param list starts: 5' bound of each region
+        :param list ends: 3' bound of each region
+        """
+        data = {"starts": list(starts), "ends": list(ends)}
+        url = self._url("tx_for_regions", alt_ac, alt_aln_method=alt_aln_method)
+        tx_lists = self._post_bulk("tx_for_regions", url, data)
+        if tx_lists is None:
+            tx_lists = super().get_tx_for_regions(alt_ac, alt_aln_method, data["starts"], data["ends"])
+        return tx_lists
 
     def get_alignments_for_region(
         self, alt_ac: str, start_i: int, end_i: int, alt_aln_method: Optional[str] = None
@@ -185,9 +270,8 @@ class UTARESTService(TxDataInterface):
         :param int end_i: 3' bound of region
         :param str alt_aln_method: OPTIONAL alignment method (e.g., splign)
         """
-        url = f"{self.server}/alignments_for_region/{alt_ac}?start_i={start_i}&end_i={end_i}"
-        self.optional_parameters(["alt_aln_method"], [alt_aln_method])
-        return requests.get(url, timeout=self.timeout).json()
+        url = self._url("alignments_for_region", alt_ac, start_i=start_i, end_i=end_i, alt_aln_method=alt_aln_method)
+        return self._get_json(url)
 
     def get_tx_identity_info(self, tx_ac: str) -> dict:
         """returns features associated with a single transcript.
@@ -207,8 +291,16 @@ class UTARESTService(TxDataInterface):
         }
 
         """
-        url = f"{self.server}/tx_identity_info/{tx_ac}"
-        return requests.get(url, timeout=self.timeout).json()
+        url = self._url("tx_identity_info", tx_ac)
+        return self._get_json(url)
+
+    def get_tx_identity_info_many(self, tx_acs: List[str]) -> List[Optional[dict]]:
+        """
+        get_tx_identity_info for many transcripts, POSTed bulk_request_size at a time
+
+        returns a list in the same order as tx_acs, None for those not available
+        """
+        return self._get_many_bulk("tx_identity_info_many", list(tx_acs), super().get_tx_identity_info_many)
 
     def get_tx_info(self, tx_ac: str, alt_ac: str, alt_aln_method: str) -> dict:
         """return a single transcript info for supplied accession (tx_ac, alt_ac, alt_aln_method), or None if not found
@@ -233,8 +325,16 @@ class UTARESTService(TxDataInterface):
         }
 
         """
-        url = f"{self.server}/tx_info/{tx_ac}/{alt_ac}?alt_aln_method={alt_aln_method}"
-        return requests.get(url, timeout=self.timeout).json()
+        url = self._url("tx_info", tx_ac, alt_ac, alt_aln_method=alt_aln_method)
+        return self._get_json(url)
+
+    def get_tx_info_many(self, tx_info_args: List) -> List[Optional[dict]]:
+        """
+        get_tx_info for many (tx_ac, alt_ac, alt_aln_method), POSTed bulk_request_size at a time
+
+        returns a list in the same order as tx_info_args, None for those not available
+        """
+        return self._get_many_bulk("tx_info_many", list(tx_info_args), super().get_tx_info_many)
 
     def get_tx_mapping_options(self, tx_ac: str) -> Union[List[dict], None]:
         """Return all transcript alignment sets for a given transcript
@@ -253,8 +353,8 @@ class UTARESTService(TxDataInterface):
         }
 
         """
-        url = f"{self.server}/tx_mapping_options/{tx_ac}"
-        return requests.get(url, timeout=self.timeout).json()
+        url = self._url("tx_mapping_options", tx_ac)
+        return self._get_json(url)
 
     def get_similar_transcripts(self, tx_ac: str) -> Union[List[dict], None]:
         """Return a list of transcripts that are similar to the given
@@ -296,16 +396,16 @@ class UTARESTService(TxDataInterface):
         sequence.
 
         """
-        url = f"{self.server}/similar_transcripts/{tx_ac}"
-        return requests.get(url, timeout=self.timeout).json()
+        url = self._url("similar_transcripts", tx_ac)
+        return self._get_json(url)
 
     def get_pro_ac_for_tx_ac(self, tx_ac: str) -> Union[str, None]:
         """Return the (single) associated protein accession for a given transcript
         accession, or None if not found."""
-        url = f"{self.server}/pro_ac_for_tx_ac/{tx_ac}"
-        return requests.get(url, timeout=self.timeout).json()
+        url = self._url("pro_ac_for_tx_ac", tx_ac)
+        return self._get_json(url)
 
     def get_assembly_map(self, assembly_name: str) -> dict:
         """Return a list of accessions for the specified assembly name (e.g., GRCh38.p5)."""
-        url = f"{self.server}/assembly_map/{assembly_name}"
-        return requests.get(url, timeout=self.timeout).json()
+        url = self._url("assembly_map", assembly_name)
+        return self._get_json(url)
@@ -0,0 +1,316 @@
+import gzip
+import io
+import json
+import random
+import threading
+
+import pytest
+
+from src.hgvs_dataproviders_rest.txdata.cdot import JSONDataProvider
+from src.hgvs_dataproviders_rest.txdata.cdot_binary import BinaryDataProvider, write_cdot_binary
+from src.hgvs_dataproviders_rest.txdata.interval_index import IntervalIndex
+from src.hgvs_dataproviders_rest.txdata.json_stream import JSONStreamReader
+
+CDOT_DATA = {
+    "cdot_version": "0.2.21",
+    "genome_builds": ["GRCh38"],
+    "transcripts": {
+        "NM_000001.1": {
+            "gene_name": "GENEA",
+            "gene_version": "1001",
+            "protein": "NP_000001.1",
+            "start_codon": 10,
+            "stop_codon": 250,
+            "genome_builds": {
+                "GRCh38": {
+                    "contig": "NC_000001.11",
+                    "strand": "+",
+                    "exons": [[1000, 1100, 0, 1, 100, None], [2000, 2200, 1, 101, 300, "M50 I1 M149"]],
+                },
+            },
+        },
+        "NM_000002.1": {
+            "gene_name": "GENEA",
+            "gene_version": "1001",
+            "protein": "NP_000002.1",
+            "start_codon": 5,
+            "stop_codon": 50,
+            "genome_builds": {
+                "GRCh38": {
+                    "contig": "NC_000001.11",
+                    "strand": "+",
+                    "exons": [[1050, 1150, 0, 1, 100, None]],
+                },
+            },
+        },
+        "NM_000003.1": {
+            "gene_name": "GENEB",
+            "gene_version": "1002",
+            "protein": "NP_000003.1",
+            "start_codon": 20,
+            "stop_codon": 80,
+            "genome_builds": {
+                "GRCh38": {
+                    "contig": "NC_000001.11",
+                    "strand": "-",
+                    "exons": [[5000, 5060, 1, 41, 100, None], [5500, 5540, 0, 1, 40, None]],
+                },
+            },
+        },
+    },
+    "genes": {
+        "1001": {
+            "gene_symbol": "GENEA",
+            "aliases": "GA, GENE-A",
+            "map_location": "1p36",
+            "description": "gene A",
+            "summary": "A gene",
+        },
+    },
+}
+
+
+@pytest.fixture
+def cdot_filename(tmp_path):
+    filename = str(tmp_path / "cdot.grch38.json.gz")
+    with gzip.open(filename, "wt") as f:
+        json.dump(CDOT_DATA, f)
+    return filename
+
+
+@pytest.fixture
+def json_data_provider(cdot_filename):
+    return JSONDataProvider([cdot_filename])
+
+
+def test_json_stream_reader_small_chunks(cdot_filename):
+    """Reading in tiny chunks (splitting every token) gives the same records as json.load."""
+    with gzip.open(cdot_filename) as f:
+        reader = JSONStreamReader(f, chunk_size=3)
+        data = {}
+        for key in reader.iter_object_keys():
+            if key == "transcripts":
+                data[key] = dict(reader.iter_object_items())
+            else:
+                data[key] = reader.read_value()
+    assert data == CDOT_DATA
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 6, 8, 9, 18])
+def test_json_stream_reader_numbers_split_across_chunks(chunk_size):
+    document = '{"a": 1.5, "b": 2e10, "c": [1.25], "d": -3E-2, "e": 42}'
+    reader = JSONStreamReader(io.StringIO(document), chunk_size=chunk_size)
+    assert dict(reader.iter_object_items()) == json.loads(document)
+
+
+def test_json_data_provider_load(cdot_filename):
+    hdp = JSONDataProvider([cdot_filename])
+    assert sorted(hdp.transcripts) == sorted(CDOT_DATA["transcripts"])
+    assert hdp.cdot_data_version == (0, 2, 21)
+    assert hdp.get_pro_ac_for_tx_ac("NM_000003.1") == "NP_000003.1"
+    assert hdp.get_gene_info("GENEA")["aliases"] == "{GA,GENE-A}"
+
+
+def write_cdot_file(filename, cdot_data):
+    with gzip.open(filename, "wt") as f:
+        json.dump(cdot_data, f)
+    return str(filename)
+
+
+@pytest.fixture
+def grch37_cdot_filename(tmp_path):
+    transcript = json.loads(json.dumps(CDOT_DATA["transcripts"]["NM_000001.1"]))
+    transcript["start_codon"] = 11
+    transcript["genome_builds"] = {
+        "GRCh37": {"contig": "NC_000001.10", "strand": "+", "exons": [[500, 800, 0, 1, 300, None]]},
+    }
+    cdot_data = {"cdot_version": "0.2.22", "genome_builds": ["GRCh37"], "transcripts": {"NM_000001.1": transcript},
+                 "genes": {}}
+    return write_cdot_file(tmp_path / "cdot.grch37.json.gz", cdot_data)
+
+
+@pytest.mark.parametrize("precedence,cds_start_i", [("last", 11), ("first", 10), ("newest", 11)])
+def test_multiple_files_merge_genome_builds(cdot_filename, grch37_cdot_filename, precedence, cds_start_i):
+    hdp = JSONDataProvider([cdot_filename, grch37_cdot_filename], precedence=precedence)
+    assert set(hdp.transcripts["NM_000001.1"].builds) == {"GRCh37", "GRCh38"}
+    assert hdp.get_tx_info("NM_000001.1", "NC_000001.10", "splign")["cds_start_i"] == cds_start_i
+    assert hdp.get_tx_exons("NM_000001.1", "NC_000001.11", "splign")[0]["alt_start_i"] == 1000
+    assert hdp.get_tx_for_region("NC_000001.10", "splign", 600, 700)[0]["tx_ac"] == "NM_000001.1"
+    assert hdp.cdot_data_version == (0, 2, 21)
+
+    sources = hdp.get_transcript_sources("NM_000001.1")
+    assert sources["genome_builds"] == {"GRCh38": cdot_filename, "GRCh37": grch37_cdot_filename}
+    assert sources["transcript"] == (cdot_filename if precedence == "first" else grch37_cdot_filename)
+
+
+@pytest.mark.parametrize("newest_first", [True, False])
+def test_newest_precedence_version_after_transcripts(tmp_path, cdot_filename, newest_first):
+    transcript = json.loads(json.dumps(CDOT_DATA["transcripts"]["NM_000001.1"]))
+    transcript["start_codon"] = 11
+    # Key order reversed, so transcripts are read before cdot_version
+    cdot_data = {"transcripts": {"NM_000001.1": transcript}, "genes": CDOT_DATA["genes"],
+                 "genome_builds": ["GRCh38"], "cdot_version": "0.2.22"}
+    newest_filename = write_cdot_file(tmp_path / "cdot.newest.json.gz", cdot_data)
+    filenames = [newest_filename, cdot_filename] if newest_first else [cdot_filename, newest_filename]
+    hdp = JSONDataProvider(filenames, precedence="newest")
+    assert hdp.get_transcript_sources("NM_000001.1")["transcript"] == newest_filename
+    assert hdp.get_tx_info("NM_000001.1", "NC_000001.11", "splign")["cds_start_i"] == 11
+    assert hdp._gene_sources["GENEA"] == filenames.index(newest_filename)
+
+
+def test_data_source_differs_per_file(cdot_filename, grch37_cdot_filename):
+    # Same data_version for all cdot files, so data_source is needed to keep them apart in shared caches
+    json_data_provider = JSONDataProvider([cdot_filename])
+    grch37_data_provider = JSONDataProvider([grch37_cdot_filename])
+    assert json_data_provider.data_version() == grch37_data_provider.data_version()
+    assert json_data_provider.data_source() != grch37_data_provider.data_source()
+    assert "0.2.22" in grch37_data_provider.data_source()
+
+
+def test_multiple_files_without_merge(cdot_filename, grch37_cdot_filename):
+    hdp = JSONDataProvider([cdot_filename, grch37_cdot_filename], merge_genome_builds=False)
+    assert set(hdp.transcripts["NM_000001.1"].builds) == {"GRCh37"}
+    assert set(hdp.transcripts["NM_000002.1"].builds) == {"GRCh38"}
+
+
+def test_get_tx_exons(json_data_provider):
+    exons = json_data_provider.get_tx_exons("NM_000001.1", "NC_000001.11", "splign")
+    assert [(e["alt_start_i"], e["alt_end_i"], e["tx_start_i"], e["tx_end_i"]) for e in exons] == [
+        (1000, 1100, 0, 100),
+        (2000, 2200, 100, 300),
+    ]
+    assert exons[1]["cigar"] == "50=1D149="
+
+
+def test_get_tx_for_region(json_data_provider):
+    tx_list = json_data_provider.get_tx_for_region("NC_000001.11", "splign", 1120, 1130)
+    assert sorted(tx["tx_ac"] for tx in tx_list) == ["NM_000001.1", "NM_000002.1"]
+
+    tx_list = json_data_provider.get_tx_for_region("NC_000001.11", "splign", 2200, 2300)
+    assert tx_list == []
+
+
+def test_contig_indexes_built_on_demand(json_data_provider):
+    assert json_data_provider.index_build_times == {}
+    json_data_provider.get_tx_for_region("NC_000001.11", "splign", 1120, 1130)
+    assert list(json_data_provider.index_build_times) == ["NC_000001.11"]
+    assert json_data_provider.get_tx_for_region("NC_000002.12", "splign", 0, 10000) == []
+
+
+def test_contig_index_build_only_blocks_same_contig(json_data_provider):
+    # As if another thread were building NC_000002.12's index
+    with json_data_provider._contig_index_locks.setdefault("NC_000002.12", threading.Lock()):
+        assert json_data_provider.get_tx_for_region("NC_000001.11", "splign", 1120, 1130)
+
+
+def test_prebuilt_contig_indexes_match_on_demand(cdot_filename, json_data_provider):
+    hdp = JSONDataProvider([cdot_filename], prebuild_indexes=True)
+    assert list(hdp.index_build_times) == ["NC_000001.11"]
+    for start_i, end_i in [(0, 999), (1120, 1130), (5059, 5500)]:
+        assert hdp.get_tx_for_region("NC_000001.11", "splign", start_i, end_i) == \
+            json_data_provider.get_tx_for_region("NC_000001.11", "splign", start_i, end_i)
+
+
+def test_deprecated_contig_interval_tree(cdot_filename, json_data_provider):
+    intervaltree = pytest.importorskip("intervaltree")
+
+    with pytest.warns(DeprecationWarning, match="_get_contig_interval_tree"):
+        class IntervalTreeDataProvider(JSONDataProvider):
+            """ Written for the previous API """
+            def _get_contig_interval_tree(self, alt_ac):
+                tree = intervaltree.IntervalTree()
+                for tx_ac, transcript in self.transcripts.items():
+                    for build in transcript.builds.values():
+                        if build.contig == alt_ac:
+                            tree[build.start:build.end] = tx_ac
+                return tree
+
+    hdp = IntervalTreeDataProvider([cdot_filename])
+    for start_i, end_i in [(0, 999), (1120, 1130), (5059, 5500)]:
+        assert sorted(hdp.get_tx_for_region("NC_000001.11", "splign", start_i, end_i), key=str) == \
+            sorted(json_data_provider.get_tx_for_region("NC_000001.11", "splign", start_i, end_i), key=str)
+    assert hdp.get_tx_for_region("NC_000002.12", "splign", 0, 10000) == []
+    assert hdp.index_build_times == {}  # Didn't use the JSONDataProvider index
+
+
+def test_get_tx_for_gene(json_data_provider):
+    tx_list = json_data_provider.get_tx_for_gene("GENEA")
+    assert [tx["tx_ac"] for tx in tx_list] == ["NM_000001.1", "NM_000002.1"]  # decreasing length
+    assert json_data_provider.get_tx_for_gene("GENEA")[0] is tx_list[0]  # Built once
+    with pytest.raises(TypeError):
+        tx_list[0]["tx_ac"] = "NM_000002.1"
+    tx_list.pop()  # Callers get their own list
+    assert len(json_data_provider.get_tx_for_gene("GENEA")) == 2
+    assert json_data_provider.get_tx_for_gene("NOTAGENE") == []
+
+
+def test_transcript_records(json_data_provider):
+    transcript = json_data_provider._get_transcript("NM_000003.1")
+    assert not hasattr(transcript, "__dict__")
+    assert transcript.builds["GRCh38"].strand == -1
+    assert (transcript.builds["GRCh38"].start, transcript.builds["GRCh38"].end) == (5000, 5540)
+    assert json_data_provider.get_tx_identity_info("NM_000003.1")["lengths"] == [40, 60]  # transcript order
+
+
+def test_binary_data_provider_matches_json(tmp_path, json_data_provider):
+    binary_filename = str(tmp_path / "cdot.grch38.bin")
+    write_cdot_binary(json_data_provider, binary_filename)
+    hdp = BinaryDataProvider(binary_filename)
+
+    for tx_ac in CDOT_DATA["transcripts"]:
+        assert hdp.get_tx_exons(tx_ac, "NC_000001.11", "splign") == \
+            json_data_provider.get_tx_exons(tx_ac, "NC_000001.11", "splign")
+        assert hdp.get_tx_identity_info(tx_ac) == json_data_provider.get_tx_identity_info(tx_ac)
+    assert hdp.get_tx_exons("NM_999999.1", "NC_000001.11", "splign") is None
+
+    for start_i, end_i in [(0, 999), (999, 1000), (1120, 1130), (1150, 2000), (5059, 5500), (6000, 7000)]:
+        region_tx_acs = sorted(tx["tx_ac"] for tx in hdp.get_tx_for_region("NC_000001.11", "splign", start_i, end_i))
+        expected_tx_acs = sorted(tx["tx_ac"] for tx in
+                                 json_data_provider.get_tx_for_region("NC_000001.11", "splign", start_i, end_i))
+        assert region_tx_acs == expected_tx_acs
+    assert hdp.get_tx_for_region("NC_000002.12", "splign", 0, 10000) == []
+    assert hdp.get_tx_for_regions("NC_000001.11", "splign", [1120, 5059], [1130, 5500]) == \
+        json_data_provider.get_tx_for_regions("NC_000001.11", "splign", [1120, 5059], [1130, 5500])
+
+    assert hdp.get_tx_for_gene("GENEA") == json_data_provider.get_tx_for_gene("GENEA")
+    assert hdp.get_gene_info("GENEA") == json_data_provider.get_gene_info("GENEA")
+    assert hdp.get_gene_info("GENEB") is None
+
+
+def test_interval_index_matches_brute_force():
+    """Same results as an IntervalTree query tree[start_i:end_i+1] over half-open intervals."""
+    rng = random.Random(42)
+    intervals = []
+    for i in range(200):
+        start = rng.randint(0, 10000)
+        intervals.append((start, start + rng.randint(1, 2000), f"tx{i}"))
+    index = IntervalIndex.from_intervals(*zip(*intervals))
+
+    for _ in range(500):
+        start_i = rng.randint(0, 13000)
+        end_i = start_i + rng.randint(0, 500)
+        expected = sorted(tx for start, end, tx in intervals if start < end_i + 1 and end > start_i)
+        assert sorted(index.overlapping(start_i, end_i)) == expected
+
+
+def test_get_tx_for_regions(json_data_provider):
+    starts = [5059, 1120, 2200, 0, 1120]
+    ends = [5500, 1130, 2300, 999, 1130]
+    tx_lists = json_data_provider.get_tx_for_regions("NC_000001.11", "splign", starts, ends)
+    expected = [json_data_provider.get_tx_for_region("NC_000001.11", "splign", start_i, end_i)
+                for start_i, end_i in zip(starts, ends)]
+    assert tx_lists == expected
+    assert json_data_provider.get_tx_for_regions("NC_000002.12", "splign", [0], [10]) == [[]]
+
+
+def test_many_methods(json_data_provider):
+    tx_exons_args = [("NM_000001.1", "NC_000001.11", "splign"), ("NM_999999.1", "NC_000001.11", "splign")]
+    assert json_data_provider.get_tx_exons_many(tx_exons_args) == [
+        json_data_provider.get_tx_exons(*tx_exons_args[0]), None
+    ]
+    assert json_data_provider.get_tx_info_many(tx_exons_args) == [
+        json_data_provider.get_tx_info(*tx_exons_args[0]), None
+    ]
+    assert json_data_provider.get_tx_identity_info_many(["NM_000003.1"]) == [
+        json_data_provider.get_tx_identity_info("NM_000003.1")
+    ]
@@ -0,0 +1,175 @@
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import pytest
+
+from src.hgvs_dataproviders_rest.txdata.txdata_ensembl_tark import EnsemblTarkDataProvider
+
+
+class FakeResponse:
+    ok = True
+    headers = {"Content-Type": "application/json"}
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class PaginatedTark:
+    """Serves results DRF style, a page at a time, with http:// next links like the real server."""
+
+    def __init__(self, results, page_size=2, pagination="page"):
+        self.results = results
+        self.page_size = page_size
+        self.pagination = pagination
+        self.urls = []
+        self.lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self.lock:
+            self.urls.append(url)
+        split = urlsplit(url)
+        params = dict(parse_qsl(split.query))
+        if self.pagination == "page":
+            offset = (int(params.get("page", 1)) - 1) * self.page_size
+        elif self.pagination == "offset":
+            offset = int(params.get("offset", 0))
+        else:
+            offset = int(params.get("cursor", "c0")[1:])
+        end = offset + self.page_size
+        next_url = None
+        if end < len(self.results):
+            if self.pagination == "page":
+                params["page"] = offset // self.page_size + 2
+            elif self.pagination == "offset":
+                params.update({"offset": end, "limit": self.page_size})
+            else:
+                params["cursor"] = f"c{end}"
+            next_url = f"http://{split.netloc}{split.path}?{urlencode(params)}"
+        return FakeResponse({"count": len(self.results), "next": next_url,
+                             "results": self.results[offset:end]})
+
+
+def tark_transcript(tx_ac, release_date="2020-01-01", assembly="GRCh38"):
+    stable_id, version = tx_ac.split(".")
+    return {
+        "stable_id": stable_id,
+        "stable_id_version": int(version),
+        "assembly": assembly,
+        "transcript_release_set": [{"release_date": release_date}],
+    }
+
+
+@pytest.mark.parametrize("pagination", ["page", "offset"])
+def test_paginated_results_fetched_concurrently(pagination):
+    results = [tark_transcript(f"NM_{i:06d}.1") for i in range(9)]
+    results.append(tark_transcript("NM_000003.1", release_date="2019-01-01"))  # Dupe - older release
+    server = PaginatedTark(results, pagination=pagination)
+    tark = EnsemblTarkDataProvider(transport=server, max_page_workers=3)
+
+    tx_results = tark._get_all_paginated_transcript_results("https://tark.ensembl.org/api/transcript/?loc_region=1")
+    assert tx_results == EnsemblTarkDataProvider._filter_dupes_take_most_recent(results)
+    assert len(tx_results) == 9
+    assert len(server.urls) == 5
+    assert all(url.startswith("https://") for url in server.urls)
+
+
+def test_paginated_results_unknown_pagination_follows_next():
+    results = [tark_transcript(f"NM_{i:06d}.1") for i in range(5)]
+    server = PaginatedTark(results, pagination="cursor")
+    tark = EnsemblTarkDataProvider(transport=server)
+    tx_results = tark._get_all_paginated_transcript_results("https://tark.ensembl.org/api/transcript/?loc_region=1")
+    assert [t["stable_id"] for t in tx_results] == [t["stable_id"] for t in results]
+
+
+def expanded_tark_transcript(tx_ac, assembly, loc_start, strand=1):
+    transcript = tark_transcript(tx_ac, assembly=assembly)
+    transcript.update({
+        "loc_region": "1",
+        "loc_start": loc_start,
+        "loc_end": loc_start + 299,
+        "loc_strand": strand,
+        "exons": [
+            {"exon_order": 1, "loc_start": loc_start, "loc_end": loc_start + 99},
+            {"exon_order": 2, "loc_start": loc_start + 200, "loc_end": loc_start + 299},
+        ],
+        "genes": [{"name": "GENEA"}],
+        "five_prime_utr_seq": "A" * 10,
+        "three_prime_utr_seq": "A" * 20,
+        "sequence": {"sequence": "A" * 200},
+    })
+    return transcript
+
+
+class RecordingTark:
+    def __init__(self, responses):
+        self.responses = responses
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        for match, data in self.responses.items():
+            if match in url:
+                return FakeResponse(data)
+        raise AssertionError(f"Unexpected request: {url}")
+
+
+def test_region_search_populates_transcript_cache():
+    grch38 = expanded_tark_transcript("NM_000001.1", "GRCh38", 1000)
+    grch37 = expanded_tark_transcript("NM_000001.1", "GRCh37", 5000)
+    server = RecordingTark({
+        "loc_region=1": {"count": 1, "next": None, "results": [grch38]},
+        "stable_id=NM_000001": {"count": 2, "next": None, "results": [grch38, grch37]},
+    })
+    tark = EnsemblTarkDataProvider(transport=server)
+
+    tx_list = tark.get_tx_for_region("NC_000001.11", "splign", 1000, 1100)
+    assert [tx["tx_ac"] for tx in tx_list] == ["NM_000001.1"]
+    assert "expand_all=true" in server.urls[0]
+
+    tx_exons = tark.get_tx_exons("NM_000001.1", "NC_000001.11", "splign")
+    assert [(e["alt_start_i"], e["alt_end_i"]) for e in tx_exons] == [(999, 1099), (1199, 1299)]
+    assert tark.get_tx_info("NM_000001.1", "NC_000001.11", "splign")["cds_start_i"] == 10
+    assert tark.get_tx_identity_info("NM_000001.1")["lengths"] == [100, 100]
+    assert len(server.urls) == 1
+
+    # The region search only returned GRCh38, so the other build requires retrieving the transcript
+    tx_exons = tark.get_tx_exons("NM_000001.1", "NC_000001.10", "splign")
+    assert tx_exons[0]["alt_start_i"] == 4999
+    assert len(server.urls) == 2
+
+
+def test_concurrent_transcript_requests_deduplicated():
+    grch38 = expanded_tark_transcript("NM_000001.1", "GRCh38", 1000)
+    server = RecordingTark({"stable_id=NM_000001": {"count": 1, "next": None, "results": [grch38]}})
+    release = threading.Event()
+    get = server.get
+
+    def slow_get(url, **kwargs):
+        release.wait(5)
+        return get(url, **kwargs)
+
+    server.get = slow_get
+    tark = EnsemblTarkDataProvider(transport=server)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(tark.get_tx_identity_info("NM_000001.1")))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 8
+    assert len(server.urls) == 1
+
+
+def test_transcript_cache_is_bounded():
+    transcripts = [expanded_tark_transcript(f"NM_{i:06d}.1", "GRCh38", 1000 * i) for i in range(1, 11)]
+    server = RecordingTark({"loc_region=1": {"count": 10, "next": None, "results": transcripts}})
+    tark = EnsemblTarkDataProvider(transport=server, transcript_cache_max_bytes=5000)
+    tark.get_tx_for_region("NC_000001.11", "splign", 0, 20000)
+    info = tark.transcript_cache.cache_info()
+    assert 0 < info.currbytes <= 5000
+    assert info.evictions > 0
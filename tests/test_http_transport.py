@@ -0,0 +1,64 @@
+import requests
+from requests.adapters import BaseAdapter
+
+from src.hgvs_dataproviders_rest.txdata.http_transport import HTTPTransport
+
+
+class ScriptedAdapter(BaseAdapter):
+    """Returns the given status codes (or raises for None) in turn."""
+
+    def __init__(self, statuses, headers=None):
+        super().__init__()
+        self.statuses = list(statuses)
+        self.headers = headers or {}
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(request)
+        status = self.statuses.pop(0)
+        if status is None:
+            raise requests.ConnectionError("connection reset")
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(self.headers)
+        response.url = request.url
+        response._content = b"{}"
+        return response
+
+    def close(self):
+        pass
+
+
+def make_transport(monkeypatch, statuses, headers=None, **kwargs):
+    sleeps = []
+    monkeypatch.setattr("src.hgvs_dataproviders_rest.txdata.http_transport.time.sleep", sleeps.append)
+    transport = HTTPTransport(**kwargs)
+    adapter = ScriptedAdapter(statuses, headers=headers)
+    transport.session.mount("https://", adapter)
+    return transport, adapter, sleeps
+
+
+def test_retry_then_success(monkeypatch):
+    transport, adapter, sleeps = make_transport(monkeypatch, [503, None, 200], backoff_factor=1.0)
+    response = transport.get("https://example.org/transcript/NM_000001.1")
+    assert response.status_code == 200
+    assert len(adapter.sent) == 3
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 1.0 and 0 <= sleeps[1] <= 2.0
+
+    metrics = transport.metrics()["example.org"]
+    assert (metrics["requests"], metrics["errors"], metrics["retries"]) == (3, 1, 2)
+    assert metrics["statuses"] == {503: 1, 200: 1}
+
+
+def test_retries_exhausted_returns_last_response(monkeypatch):
+    transport, adapter, sleeps = make_transport(monkeypatch, [429, 429, 429], headers={"Retry-After": "2"},
+                                                max_retries=2)
+    assert transport.post("https://example.org/transcripts/bulk", json={}).status_code == 429
+    assert sleeps == [2.0, 2.0]
+
+
+def test_no_retry_on_client_error(monkeypatch):
+    transport, adapter, sleeps = make_transport(monkeypatch, [404])
+    assert transport.get("https://example.org/transcript/missing").status_code == 404
+    assert sleeps == []
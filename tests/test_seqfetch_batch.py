@@ -0,0 +1,77 @@
+import threading
+
+from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+from src.hgvs_dataproviders_rest.dataprovider.dataprovider_delegator import DataProviderDelegator
+from src.hgvs_dataproviders_rest.seqfetcher.seqfetcher import SeqFetcher
+from src.hgvs_dataproviders_rest.seqfetcher.seqfetcher_utils import ChainedSeqFetcher, PrefixSeqFetcher
+
+SEQUENCES = {
+    "NM_000001.1": "ACGT" * 25,
+    "NC_000001.11": "TTGCA" * 200,
+}
+
+
+class RecordingSeqFetcher:
+    def __init__(self, sequences):
+        self.sequences = sequences
+        self.source = "Recording"
+        self.calls = []
+
+    def fetch_seq(self, ac, start_i=None, end_i=None):
+        self.calls.append((ac, start_i, end_i))
+        try:
+            return self.sequences[ac][start_i:end_i]
+        except KeyError:
+            raise HGVSDataNotAvailableError(f"No sequence for {ac}")
+
+
+def expected(requests):
+    return [SEQUENCES[ac][start_i:end_i] if ac in SEQUENCES else None for ac, start_i, end_i in requests]
+
+
+def test_overlapping_ranges_fetched_once():
+    requests = [("NC_000001.11", 100, 200), ("NM_000001.1", None, None), ("NC_000001.11", 150, 300),
+                ("NC_000001.11", 500, 510), ("NM_999999.1", 0, 10), ("NM_000001.1", 5, 10)]
+    recording = RecordingSeqFetcher(SEQUENCES)
+    dp = DataProviderDelegator.__new__(DataProviderDelegator)  # Without tx_data (or its version check)
+    dp._seqfetcher = recording
+    assert dp.fetch_seqs(requests) == expected(requests)
+    assert sorted(recording.calls) == [("NC_000001.11", 100, 300), ("NC_000001.11", 500, 510),
+                                       ("NM_000001.1", 0, None), ("NM_999999.1", 0, 10)]
+
+
+def test_seqfetcher_remote_concurrent(monkeypatch):
+    monkeypatch.delenv("HGVS_SEQREPO_DIR", raising=False)
+    monkeypatch.delenv("HGVS_SEQREPO_URL", raising=False)
+    seqfetcher = SeqFetcher()
+    recording = RecordingSeqFetcher(SEQUENCES)
+    thread_ids = set()
+
+    def fetcher(ac, start_i, end_i):
+        thread_ids.add(threading.get_ident())
+        return recording.fetch_seq(ac, start_i, end_i)
+
+    seqfetcher.fetcher = fetcher
+    requests = [("NC_000001.11", i * 100, i * 100 + 10) for i in range(8)] + [("NM_999999.1", 0, 10)]
+    assert seqfetcher.fetch_seqs(requests) == expected(requests)
+    assert threading.get_ident() not in thread_ids
+
+    seqfetcher.local = True  # Eg SeqRepo dir - uses the one handle in this thread
+    thread_ids.clear()
+    assert seqfetcher.fetch_seqs(requests) == expected(requests)
+    assert thread_ids == {threading.get_ident()}
+
+
+def test_prefix_and_chained_fan_out():
+    genome = RecordingSeqFetcher({"NC_000001.11": SEQUENCES["NC_000001.11"]})
+    transcripts = RecordingSeqFetcher({})
+    fallback = RecordingSeqFetcher({"NM_000001.1": SEQUENCES["NM_000001.1"]})
+    seqfetcher = PrefixSeqFetcher()
+    seqfetcher.add_seqfetcher("NC_", genome)
+    seqfetcher.add_seqfetcher("NM_", ChainedSeqFetcher(transcripts, fallback))
+
+    requests = [("NM_000001.1", 0, 10), ("NC_000001.11", 0, 10), ("NM_000001.1", 5, 20), ("NR_000001.1", 0, 10)]
+    assert seqfetcher.fetch_seqs(requests) == expected(requests)
+    assert genome.calls == [("NC_000001.11", 0, 10)]
+    assert transcripts.calls == [("NM_000001.1", 0, 20)]
+    assert fallback.calls == [("NM_000001.1", 0, 20)]
@@ -0,0 +1,67 @@
+import pytest
+
+from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+from src.hgvs_dataproviders_rest.seqfetcher.seqfetcher_utils import CachingSeqFetcher
+
+SEQUENCES = {
+    "NM_000001.1": "ACGT" * 25,
+    "NC_000001.11": "".join("ACGT"[i % 7 % 4] for i in range(1000)),
+}
+
+
+class RecordingSeqFetcher:
+    source = "Recording"
+
+    def __init__(self):
+        self.calls = []
+
+    def fetch_seq(self, ac, start_i=None, end_i=None):
+        self.calls.append((ac, start_i, end_i))
+        try:
+            return SEQUENCES[ac][start_i:end_i]
+        except KeyError:
+            raise HGVSDataNotAvailableError(f"No sequence for {ac}")
+
+
+def test_transcript_fetched_once():
+    recording = RecordingSeqFetcher()
+    seqfetcher = CachingSeqFetcher(recording)
+    seq = SEQUENCES["NM_000001.1"]
+    assert seqfetcher.fetch_seq("NM_000001.1", 10, 20) == seq[10:20]
+    assert seqfetcher.fetch_seq("NM_000001.1", 50) == seq[50:]
+    assert seqfetcher.fetch_seq("NM_000001.1") == seq
+    assert recording.calls == [("NM_000001.1", None, None)]
+    assert seqfetcher.cache_info().hits == 2
+    assert seqfetcher.source == "Recording"
+
+    with pytest.raises(HGVSDataNotAvailableError):
+        seqfetcher.fetch_seq("NM_999999.1")
+    with pytest.raises(HGVSDataNotAvailableError):  # Failures aren't cached
+        seqfetcher.fetch_seq("NM_999999.1")
+    assert len(recording.calls) == 3
+
+
+@pytest.mark.parametrize("start_i,end_i", [(0, 10), (95, 105), (150, 420), (990, 1000), (995, 1200), (300, 300)])
+def test_contig_chunks(start_i, end_i):
+    recording = RecordingSeqFetcher()
+    seqfetcher = CachingSeqFetcher(recording, chunk_size=100)
+    expected = SEQUENCES["NC_000001.11"][start_i:end_i]
+    assert seqfetcher.fetch_seq("NC_000001.11", start_i, end_i) == expected
+    num_calls = len(recording.calls)
+    assert all((end - start) == 100 for _, start, end in recording.calls)
+    assert seqfetcher.fetch_seq("NC_000001.11", start_i, end_i) == expected
+    assert len(recording.calls) == num_calls
+
+
+def test_contig_cache_evicts():
+    recording = RecordingSeqFetcher()
+    seqfetcher = CachingSeqFetcher(recording, chunk_size=100, max_bytes=500)
+    for start_i in range(0, 1000, 100):
+        seqfetcher.fetch_seq("NC_000001.11", start_i, start_i + 10)
+    cache_info = seqfetcher.cache_info()
+    assert cache_info.currbytes <= 500
+    assert cache_info.evictions > 0
+
+    # Whole contig isn't cached
+    assert seqfetcher.fetch_seq("NC_000001.11") == SEQUENCES["NC_000001.11"]
+    assert recording.calls[-1] == ("NC_000001.11", None, None)
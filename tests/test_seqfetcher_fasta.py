@@ -0,0 +1,107 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pysam
+import pytest
+
+from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+from src.hgvs_dataproviders_rest.seqfetcher.seqfetcher_fasta import (ExonsFromGenomeFastaSeqFetcher,
+                                                                     GenomeFastaSeqFetcher)
+
+CONTIGS = {
+    "NC_000001.11": "acgtn" * 2000,
+    "NC_000002.12": "TTGCA" * 3000,
+}
+
+
+@pytest.fixture
+def fasta_filename(tmp_path):
+    fasta_filename = str(tmp_path / "genome.fa")
+    with open(fasta_filename, "w") as f:
+        for contig, seq in CONTIGS.items():
+            f.write(f">{contig}\n")
+            for i in range(0, len(seq), 60):
+                f.write(seq[i:i + 60] + "\n")
+    pysam.faidx(fasta_filename)
+    return fasta_filename
+
+
+def test_concurrent_fetches_use_thread_handles(fasta_filename):
+    seqfetcher = GenomeFastaSeqFetcher(fasta_filename)
+    requests = [(contig, start_i, start_i + 137) for contig in CONTIGS for start_i in range(0, 9000, 73)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        seqs = list(executor.map(lambda request: seqfetcher.fetch_seq(*request), requests))
+    assert seqs == [CONTIGS[ac][start_i:end_i].upper() for ac, start_i, end_i in requests]
+
+    # Each thread opens (then re-uses) its own handle
+    barrier = threading.Barrier(2)
+
+    def get_handles():
+        barrier.wait()  # Both threads alive at once
+        contig_fastas = seqfetcher.contig_fastas
+        return contig_fastas.get_fasta_file(fasta_filename), contig_fastas.get_fasta_file(fasta_filename)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        (a1, a2), (b1, b2) = [future.result() for future in [executor.submit(get_handles) for _ in range(2)]]
+    assert a1 is a2 and b1 is b2
+    assert a1 is not b1
+
+
+class ExonsDataProvider:
+    """ NM_PLUS: 3 exons with a deletion and insertion, NM_MINUS: reverse strand 2 exons """
+    TX_EXONS = {
+        "NM_PLUS.1": [
+            # ord, alt_start_i, alt_end_i, tx_start_i, tx_end_i, cigar
+            (0, 100, 120, 2, 22, "20="),
+            (1, 200, 230, 22, 54, "10=2D20="),
+            (2, 300, 325, 54, 76, "5=3I17="),
+        ],
+        "NM_MINUS.1": [
+            (1, 1000, 1010, 30, 40, "10="),
+            (0, 2000, 2030, 0, 30, "30="),
+        ],
+    }
+
+    def __init__(self):
+        self.tx_exons_many_calls = 0
+
+    def get_tx_mapping_options(self, tx_ac):
+        if tx_ac not in self.TX_EXONS:
+            return []
+        return [{"tx_ac": tx_ac, "alt_ac": "NC_000001.11", "alt_aln_method": "splign"}]
+
+    def get_tx_exons(self, tx_ac, alt_ac, alt_aln_method):
+        alt_strand = -1 if tx_ac == "NM_MINUS.1" else 1
+        return [{"tx_ac": tx_ac, "alt_ac": alt_ac, "alt_strand": alt_strand, "alt_aln_method": alt_aln_method,
+                 "ord": ord_, "alt_start_i": alt_start_i, "alt_end_i": alt_end_i, "tx_start_i": tx_start_i,
+                 "tx_end_i": tx_end_i, "cigar": cigar}
+                for ord_, alt_start_i, alt_end_i, tx_start_i, tx_end_i, cigar in self.TX_EXONS[tx_ac]]
+
+    def get_tx_exons_many(self, tx_exons_args):
+        self.tx_exons_many_calls += 1
+        return [self.get_tx_exons(*args) for args in tx_exons_args]
+
+
+def test_exons_from_genome_fasta(fasta_filename):
+    genome = CONTIGS["NC_000001.11"].upper()
+    complement = {"A": "T", "C": "G", "G": "C", "T": "A", "N": "N"}
+    expected = {
+        "NM_PLUS.1": "NN" + genome[100:120] + genome[200:210] + "NN" + genome[210:230] + genome[300:305] +
+                     genome[308:325],
+        "NM_MINUS.1": "".join(complement[b] for b in reversed(genome[1000:1010] + genome[2000:2030])),
+    }
+    hdp = ExonsDataProvider()
+    seqfetcher = ExonsFromGenomeFastaSeqFetcher(fasta_filename)
+    with pytest.raises(HGVSDataNotAvailableError):
+        seqfetcher.fetch_seqs([("NM_PLUS.1", 0, 10)])
+    seqfetcher.hdp = hdp
+    for ac, seq in expected.items():
+        assert seqfetcher._get_transcript_seq(ac) == seq
+
+    seqfetcher.transcript_cache.clear()
+    requests = [("NM_PLUS.1", 0, 10), ("NM_MINUS.1", None, None), ("NM_UNKNOWN.1", 0, 10), ("NM_PLUS.1", 50, None)]
+    assert seqfetcher.fetch_seqs(requests) == [expected["NM_PLUS.1"][:10], expected["NM_MINUS.1"], None,
+                                               expected["NM_PLUS.1"][50:]]
+    assert hdp.tx_exons_many_calls == 1
+    assert seqfetcher.get_transcript_seqs(["NM_MINUS.1"]) == [expected["NM_MINUS.1"]]
+    assert hdp.tx_exons_many_calls == 1  # Cached
@@ -0,0 +1,92 @@
+import random
+import struct
+
+import pysam
+import pytest
+
+from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+from src.hgvs_dataproviders_rest.seqfetcher.seqfetcher_mmap import MmapFastaFile, MmapGenomeSeqFetcher
+
+_random = random.Random(42)
+CONTIGS = {
+    "NC_000001.11": "".join(_random.choice("ACGTacgt") for _ in range(1003)) + "N" * 50 + "ACGT" * 30,
+    "NC_000002.12": "GATTACA" * 150,
+    "NC_000003.12": "acg",
+}
+
+
+def write_fasta(filename, line_length=60, newline="\n"):
+    with open(filename, "w", newline="") as f:
+        for contig, seq in CONTIGS.items():
+            f.write(f">{contig} description{newline}")
+            for i in range(0, len(seq), line_length):
+                f.write(seq[i:i + line_length] + newline)
+
+
+def write_2bit(filename, byte_order="<"):
+    """ Sequence (soft masking not recorded) with N blocks """
+    header = struct.pack(byte_order + "4I", 0x1A412743, 0, len(CONTIGS), 0)
+    index_length = sum(1 + len(contig) + 4 for contig in CONTIGS)
+    index = b""
+    records = b""
+    for contig, seq in CONTIGS.items():
+        offset = struct.pack(byte_order + "I", len(header) + index_length + len(records))
+        index += bytes([len(contig)]) + contig.encode() + offset
+        seq = seq.upper()
+        n_blocks = [(i, 1) for i, base in enumerate(seq) if base == "N"]
+        record = struct.pack(byte_order + "2I", len(seq), len(n_blocks))
+        record += b"".join(struct.pack(byte_order + "I", start) for start, _ in n_blocks)
+        record += b"".join(struct.pack(byte_order + "I", size) for _, size in n_blocks)
+        record += struct.pack(byte_order + "2I", 0, 0)  # mask blocks, reserved
+        packed = bytearray()
+        padded = seq.replace("N", "T") + "T" * (-len(seq) % 4)
+        for i in range(0, len(padded), 4):
+            byte = 0
+            for base in padded[i:i + 4]:
+                byte = byte << 2 | "TCAG".index(base)
+            packed.append(byte)
+        records += record + bytes(packed)
+    with open(filename, "wb") as f:
+        f.write(header + index + records)
+
+
+def random_windows():
+    windows = [(contig, None, None) for contig in CONTIGS]
+    for contig, seq in CONTIGS.items():
+        for _ in range(200):
+            start_i = _random.randint(0, len(seq))
+            windows.append((contig, start_i, start_i + _random.randint(0, 130)))
+    return windows
+
+
+@pytest.mark.parametrize("line_length,newline,fai", [(60, "\n", True), (60, "\n", False), (17, "\r\n", False)])
+def test_mmap_fasta(tmp_path, line_length, newline, fai):
+    filename = str(tmp_path / "genome.fa")
+    write_fasta(filename, line_length=line_length, newline=newline)
+    if fai:
+        pysam.faidx(filename)
+        pysam_fasta = pysam.FastaFile(filename)
+    fasta = MmapFastaFile(filename)
+    assert fasta.lengths == {contig: len(seq) for contig, seq in CONTIGS.items()}
+    for contig, start_i, end_i in random_windows():
+        expected = CONTIGS[contig][start_i:end_i].upper()
+        assert fasta.fetch(contig, start_i, end_i) == expected
+        if fai:
+            assert pysam_fasta.fetch(contig, start_i, end_i).upper() == expected
+
+
+@pytest.mark.parametrize("byte_order", ["<", ">"])
+def test_mmap_genome_seqfetcher_2bit(tmp_path, byte_order):
+    fasta_filename = str(tmp_path / "genome.fa")
+    twobit_filename = str(tmp_path / "genome.2bit")
+    write_fasta(fasta_filename)
+    write_2bit(twobit_filename, byte_order)
+    fasta_seqfetcher = MmapGenomeSeqFetcher(fasta_filename)
+    twobit_seqfetcher = MmapGenomeSeqFetcher(twobit_filename)
+    for contig, start_i, end_i in random_windows():
+        expected = CONTIGS[contig][start_i:end_i].upper()
+        assert twobit_seqfetcher.fetch_seq(contig, start_i, end_i) == expected
+        assert fasta_seqfetcher.fetch_seq(contig, start_i, end_i) == expected
+
+    with pytest.raises(HGVSDataNotAvailableError):
+        twobit_seqfetcher.fetch_seq("NC_000004.12", 0, 10)
@@ -0,0 +1,224 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+from src.hgvs_dataproviders_rest.bounded_cache import MISSING, BoundedCache
+from src.hgvs_dataproviders_rest.shared_cache import SQLiteSharedCache, decode_value, encode_value
+from src.hgvs_dataproviders_rest.txdata.records import freeze
+from src.hgvs_dataproviders_rest.txdata.txdata_cache import TxDataCache
+from src.hgvs_dataproviders_rest.txdata.txdata_interface import TxDataInterface
+
+
+class CountingTxData(TxDataInterface):
+    """Minimal provider that records the calls made to it."""
+
+    required_version = "1.1"
+
+    def __init__(self):
+        self.calls = []
+        super().__init__()
+
+    def data_version(self):
+        return "test"
+
+    def data_source(self):
+        return "counting"
+
+    def schema_version(self):
+        return self.required_version
+
+    def get_acs_for_protein_seq(self, seq):
+        return []
+
+    def get_assembly_map(self, assembly_name):
+        return {}
+
+    def get_gene_info(self, gene):
+        return None
+
+    def get_pro_ac_for_tx_ac(self, tx_ac):
+        return None
+
+    def get_similar_transcripts(self, tx_ac):
+        return []
+
+    def get_tx_exons(self, tx_ac, alt_ac, alt_aln_method):
+        self.calls.append(("get_tx_exons", tx_ac))
+        if tx_ac.startswith("missing"):
+            raise HGVSDataNotAvailableError(tx_ac)
+        return [{"tx_ac": tx_ac, "alt_ac": alt_ac, "ord": 0}]
+
+    def get_tx_exons_many(self, tx_exons_args):
+        tx_exons_args = list(tx_exons_args)
+        self.calls.append(("get_tx_exons_many", [args[0] for args in tx_exons_args]))
+        return [[{"tx_ac": tx_ac, "alt_ac": alt_ac, "ord": 0}] if not tx_ac.startswith("missing") else None
+                for tx_ac, alt_ac, _ in tx_exons_args]
+
+    def get_tx_for_gene(self, gene):
+        return []
+
+    def get_tx_for_region(self, alt_ac, alt_aln_method, start_i, end_i):
+        return []
+
+    def get_tx_identity_info(self, tx_ac):
+        return {"tx_ac": tx_ac}
+
+    def get_tx_info(self, tx_ac, alt_ac, alt_aln_method):
+        return {"tx_ac": tx_ac}
+
+    def get_tx_mapping_options(self, tx_ac):
+        return []
+
+
+def test_get_tx_exons_many_shares_cache_with_single():
+    tx_data = CountingTxData()
+    cache = TxDataCache(tx_data)
+    assert cache.get_tx_exons("NM_1.1", "NC_1.1", "splign")[0]["tx_ac"] == "NM_1.1"
+
+    results = cache.get_tx_exons_many([("NM_1.1", "NC_1.1", "splign"), ("NM_2.1", "NC_1.1", "splign"),
+                                       ("missing.1", "NC_1.1", "splign")])
+    assert [r[0]["tx_ac"] if r else None for r in results] == ["NM_1.1", "NM_2.1", None]
+    # Only the uncached transcripts were fetched, in one bulk call
+    assert tx_data.calls == [("get_tx_exons", "NM_1.1"), ("get_tx_exons_many", ["NM_2.1", "missing.1"])]
+
+    cache.get_tx_exons("NM_2.1", "NC_1.1", "splign")
+    assert len(tx_data.calls) == 2
+
+
+def test_default_many_methods_return_none_when_not_available():
+    tx_data = CountingTxData()
+    results = TxDataInterface.get_tx_exons_many(tx_data, [("NM_1.1", "NC_1.1", "splign"),
+                                                          ("missing.1", "NC_1.1", "splign")])
+    assert results[0][0]["tx_ac"] == "NM_1.1"
+    assert results[1] is None
+
+
+def test_not_available_is_cached():
+    tx_data = CountingTxData()
+    cache = TxDataCache(tx_data)
+    for _ in range(2):
+        with pytest.raises(HGVSDataNotAvailableError):
+            cache.get_tx_exons("missing.1", "NC_1.1", "splign")
+    assert tx_data.calls == [("get_tx_exons", "missing.1")]
+    assert cache.cache_info()["get_tx_exons"].hits == 1
+
+    no_negative_cache = TxDataCache(tx_data, cache_not_available=False)
+    for _ in range(2):
+        with pytest.raises(HGVSDataNotAvailableError):
+            no_negative_cache.get_tx_exons("missing.1", "NC_1.1", "splign")
+    assert len(tx_data.calls) == 3
+
+
+def test_results_are_immutable():
+    cache = TxDataCache(CountingTxData())
+    tx_exons = cache.get_tx_exons("NM_1.1", "NC_1.1", "splign")
+    with pytest.raises(TypeError):
+        tx_exons[0]["tx_ac"] = "NM_2.1"
+    with pytest.raises(AttributeError):
+        tx_exons.append({})
+    assert cache.get_tx_exons("NM_1.1", "NC_1.1", "splign")[0]["tx_ac"] == "NM_1.1"
+
+
+def test_per_method_options(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("src.hgvs_dataproviders_rest.bounded_cache.time.monotonic", lambda: now[0])
+    tx_data = CountingTxData()
+    cache = TxDataCache(tx_data, maxsize=10, method_options={"get_tx_exons": {"maxsize": 1, "ttl": 60}})
+    assert cache._caches["get_tx_info"].maxsize == 10
+
+    cache.get_tx_exons("NM_1.1", "NC_1.1", "splign")
+    cache.get_tx_exons("NM_1.1", "NC_1.1", "splign")
+    now[0] = 61
+    cache.get_tx_exons("NM_1.1", "NC_1.1", "splign")  # expired
+    cache.get_tx_exons("NM_2.1", "NC_1.1", "splign")  # evicts NM_1.1
+    info = cache.cache_info()["get_tx_exons"]
+    assert (info.hits, info.misses, info.expirations, info.evictions, info.currsize) == (1, 3, 1, 1, 1)
+    assert len(tx_data.calls) == 3
+
+    with pytest.raises(ValueError):
+        TxDataCache(tx_data, method_options={"get_tx_for_regions": {"maxsize": 1}})
+
+
+def test_bounded_cache_lfu():
+    cache = BoundedCache(maxsize=2, policy="lfu")
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)  # "b" is least frequently used
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_shared_cache(tmp_path):
+    filename = str(tmp_path / "txdata.sqlite")
+    tx_data = CountingTxData()
+    cache = TxDataCache(tx_data, shared_cache=SQLiteSharedCache(filename))
+    tx_exons = cache.get_tx_exons("NM_1.1", "NC_1.1", "splign")
+    cache.get_tx_exons_many([("NM_2.1", "NC_1.1", "splign")])
+    with pytest.raises(HGVSDataNotAvailableError):
+        cache.get_tx_exons("missing.1", "NC_1.1", "splign")
+    assert len(tx_data.calls) == 3
+
+    # Another process starting up with an empty in-memory cache
+    other_tx_data = CountingTxData()
+    other_cache = TxDataCache(other_tx_data, shared_cache=SQLiteSharedCache(filename))
+    assert other_cache.get_tx_exons("NM_1.1", "NC_1.1", "splign") == tx_exons
+    assert other_cache.get_tx_exons_many([("NM_2.1", "NC_1.1", "splign"), ("NM_3.1", "NC_1.1", "splign")])[0] == \
+        cache.get_tx_exons("NM_2.1", "NC_1.1", "splign")
+    with pytest.raises(HGVSDataNotAvailableError):
+        other_cache.get_tx_exons("missing.1", "NC_1.1", "splign")
+    assert other_tx_data.calls == [("get_tx_exons_many", ["NM_3.1"])]
+
+    # Different data versions don't share
+    namespaced_cache = TxDataCache(other_tx_data, shared_cache=SQLiteSharedCache(filename),
+                                   shared_cache_namespace="other")
+    namespaced_cache.get_tx_exons("NM_1.1", "NC_1.1", "splign")
+    assert len(other_tx_data.calls) == 2
+
+
+class UnknownSourceTxData(CountingTxData):
+    def data_source(self):
+        return None
+
+
+def test_shared_cache_namespace_required(tmp_path):
+    shared_cache = SQLiteSharedCache(str(tmp_path / "txdata.sqlite"))
+    with pytest.raises(ValueError):
+        TxDataCache(UnknownSourceTxData(), shared_cache=shared_cache)
+    cache = TxDataCache(UnknownSourceTxData(), shared_cache=shared_cache, shared_cache_namespace="counting")
+    assert cache.get_tx_exons("NM_1.1", "NC_1.1", "splign")
+
+
+def test_shared_cache_encoding():
+    now = datetime.datetime(2024, 1, 2, 3, 4, 5)
+    value = freeze({"added": now, "rows": [{"a": 1}] * 200, "missing": None})
+    encoded = encode_value(value)
+    assert encoded.startswith(b"z")  # compressed
+    assert decode_value(encoded) == value
+    assert decode_value(encoded, immutable=False)["rows"][0] == {"a": 1}
+
+
+def test_shared_cache_numpy_keys(tmp_path):
+    shared_cache = SQLiteSharedCache(str(tmp_path / "txdata.sqlite"))
+    starts = np.array([100, 200], dtype=np.int64)
+    shared_cache.put(("ns", "get_tx_for_region", "NC_1.1", "splign", starts[0], np.int32(150)), [{"a": np.int64(1)}])
+    assert shared_cache.get(("ns", "get_tx_for_region", "NC_1.1", "splign", 100, 150)) == ({"a": 1},)
+    key = ("ns", "get_tx_for_region", "NC_1.1", "splign", starts[1], starts[1])
+    assert shared_cache.get_many([key]) == {}
+
+
+def test_bounded_cache_max_bytes():
+    cache = BoundedCache(maxsize=None, max_bytes=100, sizeof=len)
+    cache.put("a", "x" * 40)
+    cache.put("b", "x" * 40)
+    cache.get("a")
+    cache.put("c", "x" * 40)  # Over 100 bytes - evicts "b", the least recently used
+    assert cache.get("b") is MISSING
+    info = cache.cache_info()
+    assert (info.currsize, info.currbytes, info.evictions) == (2, 80, 1)
+
+    cache.put("d", "x" * 200)  # Too big to keep at all
+    assert cache.cache_info().currbytes == 0
@@ -0,0 +1,267 @@
+import inspect
+import weakref
+
+import psycopg2.errors
+import psycopg2.extras
+import pytest
+
+from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError, HGVSError
+from src.hgvs_dataproviders_rest.txdata.records import record_type
+from src.hgvs_dataproviders_rest.txdata.uta import RecordCursor, RecordCursorMixin, UTA_postgresql, _parse_url
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, args=None):
+        self.connection.executed.append((sql, args))
+        self.rows = self.connection.get_rows(sql, args)
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+        self.cursor_factories = []
+
+    def cursor(self, cursor_factory=None):
+        self.cursor_factories.append(cursor_factory)
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+    def get_rows(self, sql, args):
+        return []
+
+
+class FakeDBCursor:
+    """ Behaves like psycopg2.extensions.cursor - including __iter__ returning the cursor itself """
+    class Column:
+        def __init__(self, name):
+            self.name = name
+
+    def __init__(self, columns, rows):
+        self.description = [self.Column(name) for name in columns]
+        self.arraysize = 1
+        self._rows = list(rows)
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if (row := self.fetchone()) is None:
+            raise StopIteration
+        return row
+
+
+class FakeRecordCursor(RecordCursorMixin, FakeDBCursor):
+    pass
+
+
+def make_uta(conn, prepare_statements=True, cursor_factory=psycopg2.extras.DictCursor):
+    """ Without connecting (or running the version check) """
+    uta = UTA_postgresql.__new__(UTA_postgresql)
+    uta.cursor_factory = cursor_factory
+    uta.url = _parse_url("postgresql://anonymous@localhost/uta/uta_20210129b")
+    uta.pooling = False
+    uta.prepare_statements = prepare_statements
+    uta._conn = conn
+    uta._conns_seen = weakref.WeakSet()
+    uta._prepared_statements = weakref.WeakKeyDictionary()
+    queries = UTA_postgresql._format_queries(UTA_postgresql._queries, uta.tx_span_view)
+    uta._queries = {k: v.replace("?", "%s") for k, v in queries.items()}
+    return uta
+
+
+def test_queries_prepared_once_per_connection():
+    conn = FakeConnection()
+    uta = make_uta(conn)
+    uta.get_tx_mapping_options("NM_000001.1")
+    uta.get_tx_mapping_options("NM_000002.1")
+    statements = [sql.split()[0] for sql, _ in conn.executed]
+    assert statements == ["prepare", "execute", "execute"]
+    assert "tx_ac=$1" in conn.executed[0][0]
+    assert conn.executed[2] == ("execute hgvs_tx_mapping_options (%s)", ["NM_000002.1"])
+
+    # A new (eg reconnected) connection prepares again
+    uta._conn = FakeConnection()
+    uta.get_tx_mapping_options("NM_000001.1")
+    assert [sql.split()[0] for sql, _ in uta._conn.executed] == ["prepare", "execute"]
+
+
+def test_bulk_queries_use_prepared_array_statements():
+    conn = FakeConnection()
+    uta = make_uta(conn)
+    assert uta.get_tx_info_many([("NM_000001.1", "NC_000001.11", "splign")]) == [None]
+    sql, args = conn.executed[-1]
+    assert sql == "execute hgvs_tx_info_many (%s, %s, %s)"
+    assert args == [["NM_000001.1"], ["NC_000001.11"], ["splign"]]
+    prepared = [sql for sql, _ in conn.executed if sql.startswith("prepare hgvs_tx_info_many")][0]
+    assert "unnest($1::text[], $2::text[], $3::text[]) as K(tx_ac, alt_ac, alt_aln_method)" in prepared
+    assert "any(" not in prepared
+
+
+def test_prepare_statements_disabled():
+    conn = FakeConnection()
+    uta = make_uta(conn, prepare_statements=False)
+    uta.get_tx_mapping_options("NM_000001.1")
+    assert conn.executed == [(uta._queries["tx_mapping_options"], ["NM_000001.1"])]
+
+
+class PoolerConnection(FakeConnection):
+    """ Like pgbouncer transaction pooling - prepared statements are gone by the time they're executed """
+    def get_rows(self, sql, args):
+        if sql.startswith("execute hgvs_"):
+            raise psycopg2.errors.InvalidSqlStatementName("prepared statement does not exist")
+        return []
+
+
+def test_prepared_statements_fall_back_to_unprepared():
+    assert inspect.signature(UTA_postgresql).parameters["prepare_statements"].default is False
+    conn = PoolerConnection()
+    uta = make_uta(conn)
+    uta.get_tx_mapping_options("NM_000001.1")
+    uta.get_tx_mapping_options("NM_000002.1")
+    assert uta.prepare_statements is False
+    assert conn.executed[-2:] == [(uta._queries["tx_mapping_options"], ["NM_000001.1"]),
+                                  (uta._queries["tx_mapping_options"], ["NM_000002.1"])]
+
+
+def test_region_queries_use_tx_span_view_when_present():
+    conn = FakeConnection()
+    uta = make_uta(conn)
+    uta.get_tx_for_region("NC_000001.11", "splign", 1000, 2000)
+    assert "tx_span_mv" not in conn.executed[0][0]
+
+    uta.use_tx_span_view = True
+    uta.get_tx_for_region("NC_000001.11", "splign", 1000, 2000)
+    uta.get_tx_for_regions("NC_000001.11", "splign", [1000], [2000])
+    prepares = [sql for sql, _ in conn.executed if sql.startswith("prepare")]
+    assert [p.split()[1] for p in prepares] == ["hgvs_alignments_for_region", "hgvs_alignments_for_region_span",
+                                                "hgvs_alignments_for_regions_span"]
+    assert all("join tx_span_mv S" in p and "&& int8range(" in p for p in prepares[1:])
+
+    # Queries use the (overridden) view name
+    conn = FakeConnection()
+    uta = make_uta(conn)
+    uta.tx_span_view = "my_spans"
+    uta.use_tx_span_view = True
+    uta.get_tx_for_regions("NC_000001.11", "splign", [1000], [2000])
+    assert "join my_spans S" in conn.executed[0][0]
+
+
+def test_create_tx_span_view_range_index():
+    conn = FakeConnection()
+    uta = make_uta(conn)
+    uta.tx_span_view = "my_spans"
+    uta.create_tx_span_view()
+    statements = [sql for sql, _ in conn.executed]
+    assert "create materialized view if not exists my_spans" in statements[0]
+    index = [sql for sql in statements if "using gist" in sql][0]
+    # Same range expression as the queries
+    assert "(alt_ac, int8range(start_i, end_i, '(]'))" in index
+    assert "int8range(S.start_i, S.end_i, '(]')" in UTA_postgresql._queries["alignments_for_region_span"]
+
+
+def test_cursor_factory():
+    conn = FakeConnection()
+    make_uta(conn).get_tx_mapping_options("NM_000001.1")
+    make_uta(conn, cursor_factory=RecordCursor).get_tx_mapping_options("NM_000001.1")
+    assert conn.cursor_factories == [psycopg2.extras.DictCursor, RecordCursor]
+
+
+def test_record_cursor_rows():
+    columns = ["tx_ac", "alt_ac"]
+    rows = [(f"NM_00000{i}.1", "NC_000001.11") for i in range(5)]
+
+    def check(records, expected_rows):
+        assert [tuple(record) for record in records] == expected_rows
+        for record, row in zip(records, expected_rows):
+            assert record["tx_ac"] == record[0] == row[0]
+            assert dict(record) == dict(zip(columns, row))
+
+    cursor = FakeRecordCursor(columns, rows)
+    check([cursor.fetchone()], rows[:1])
+    check(cursor.fetchmany(2), rows[1:3])
+    check(cursor.fetchall(), rows[3:])
+    assert cursor.fetchone() is None
+    assert cursor.fetchall() == []
+    check(list(FakeRecordCursor(columns, rows)), rows)
+    assert issubclass(RecordCursor, RecordCursorMixin)
+
+
+class AlignmentsConnection(FakeConnection):
+    """ Alignments (tx_ac, alt_aln_method, start_i, end_i) returned by the region queries """
+    COLUMNS = ["tx_ac", "alt_ac", "alt_strand", "alt_aln_method", "start_i", "end_i"]
+    ALIGNMENTS = [("NM_000001.1", "splign", 100, 1000), ("NM_000002.1", "splign", 500, 2000),
+                  ("NM_000002.1", "blat", 500, 2000)]
+
+    def get_rows(self, sql, args):
+        def overlapping(start_i, end_i):
+            return [(tx_ac, args[0], 1, alt_aln_method, a_start_i, a_end_i)
+                    for tx_ac, alt_aln_method, a_start_i, a_end_i in self.ALIGNMENTS
+                    if a_start_i < start_i and end_i <= a_end_i]
+
+        if "unnest" in sql:
+            rt = record_type(["region_i"] + self.COLUMNS)
+            return [rt((region_i, *row)) for region_i, (start_i, end_i) in enumerate(zip(args[1], args[2]), 1)
+                    for row in overlapping(start_i, end_i)]
+        rt = record_type(self.COLUMNS)
+        return [rt(row) for row in overlapping(args[1], args[2])]
+
+
+def test_tx_for_regions_rows_same_as_tx_for_region():
+    uta = make_uta(AlignmentsConnection(), prepare_statements=False)
+    regions = [(200, 300), (600, 700), (1500, 1600), (5000, 5001)]
+    starts, ends = zip(*regions)
+    for alt_aln_method in ["splign", None]:
+        tx_lists = uta.get_tx_for_regions("NC_000001.11", alt_aln_method, starts, ends)
+        expected = [uta.get_tx_for_region("NC_000001.11", alt_aln_method, start_i, end_i) for start_i, end_i in regions]
+        assert [[dict(row) for row in rows] for rows in tx_lists] == [[dict(row) for row in rows] for rows in expected]
+        assert all(list(row.keys()) == AlignmentsConnection.COLUMNS for rows in tx_lists for row in rows)
+    assert [len(rows) for rows in tx_lists] == [1, 3, 2, 0]
+
+
+class TxInfoConnection(FakeConnection):
+    """ NM_000001.1 has 1 row, NM_000002.1 has 2 rows """
+    ROWS = [
+        {"tx_ac": "NM_000001.1", "alt_ac": "NC_000001.11", "alt_aln_method": "splign"},
+        {"tx_ac": "NM_000002.1", "alt_ac": "NC_000001.11", "alt_aln_method": "splign"},
+        {"tx_ac": "NM_000002.1", "alt_ac": "NC_000001.11", "alt_aln_method": "splign"},
+    ]
+
+    def get_rows(self, sql, args):
+        tx_acs = args[0] if isinstance(args[0], list) else [args[0]]
+        return [row for row in self.ROWS if row["tx_ac"] in tx_acs]
+
+
+def test_tx_info_row_counts():
+    uta = make_uta(TxInfoConnection(), prepare_statements=False)
+    assert uta.get_tx_info("NM_000001.1", "NC_000001.11", "splign")["tx_ac"] == "NM_000001.1"
+    with pytest.raises(HGVSDataNotAvailableError):
+        uta.get_tx_info("NM_000003.1", "NC_000001.11", "splign")
+    with pytest.raises(HGVSError):
+        uta.get_tx_info("NM_000002.1", "NC_000001.11", "splign")
+
+    tx_info_args = [("NM_000001.1", "NC_000001.11", "splign"), ("NM_000003.1", "NC_000001.11", "splign")]
+    assert [r and r["tx_ac"] for r in uta.get_tx_info_many(tx_info_args)] == ["NM_000001.1", None]
+    with pytest.raises(HGVSError):
+        uta.get_tx_info_many(tx_info_args + [("NM_000002.1", "NC_000001.11", "splign")])
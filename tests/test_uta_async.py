@@ -0,0 +1,111 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from src.hgvs_dataproviders_rest import HGVSDataNotAvailableError
+from src.hgvs_dataproviders_rest.txdata.records import record_type
+from src.hgvs_dataproviders_rest.txdata.uta_async import AsyncUTA
+
+URL = "postgresql://anonymous@localhost/uta/uta_20210129b"
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def fetchval(self, sql, *args):
+        if "to_regclass" in sql:
+            return self.pool.has_tx_span_view
+        return True if "pg_namespace" in sql else "1.1"
+
+    async def fetch(self, sql, *args):
+        self.pool.fetches.append((sql, args))
+        self.pool.in_flight += 1
+        self.pool.max_in_flight = max(self.pool.max_in_flight, self.pool.in_flight)
+        await asyncio.sleep(0)
+        self.pool.in_flight -= 1
+        if "::integer[]" in sql:  # regions - like asyncpg Records, iterate values
+            rt = record_type(["region_i", "tx_ac", "alt_ac", "alt_aln_method", "start_i", "end_i"])
+            return [rt((region_i, "NM_000001.1", args[0], "splign", 0, 10000))
+                    for region_i in range(1, len(args[1]) + 1)]
+        if "any($1)" in sql or "unnest($1" in sql:  # bulk - rows for the requested tx_acs
+            return [{"tx_ac": tx_ac, "alt_ac": alt_ac, "alt_aln_method": alt_aln_method, "hgnc": "GENEA"}
+                    for tx_ac, alt_ac, alt_aln_method in zip(*args) if tx_ac != "NM_999999.1"]
+        if args and args[0] == "NM_999999.1":
+            return []
+        return [{"tx_ac": args[0], "alt_aln_method": "splign", "hgnc": "GENEA", "lengths": [100, 200]}] if args else []
+
+
+class FakePool:
+    def __init__(self, has_tx_span_view=False):
+        self.has_tx_span_view = has_tx_span_view
+        self.fetches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        yield FakeConnection(self)
+
+    async def close(self):
+        pass
+
+
+def test_queries_use_positional_params():
+    pool = FakePool()
+
+    async def run():
+        async with AsyncUTA(URL, pool=pool) as hdp:
+            return await hdp.get_tx_identity_info("NM_000001.1")
+
+    assert asyncio.run(run())["lengths"] == [100, 200]
+    sql, args = pool.fetches[0]
+    assert "where tx_ac=$1" in sql
+    assert args == ("NM_000001.1",)
+
+
+def test_concurrent_lookups_and_many():
+    pool = FakePool()
+
+    async def run():
+        hdp = AsyncUTA(URL, pool=pool)
+        hdp.bulk_query_size = 2
+        infos = await asyncio.gather(*[hdp.get_tx_identity_info(f"NM_00000{i}.1") for i in range(5)])
+        many = await hdp.get_tx_info_many([(f"NM_00000{i}.1", "NC_000001.11", "splign") for i in range(5)] +
+                                          [("NM_999999.1", "NC_000001.11", "splign")])
+        with pytest.raises(HGVSDataNotAvailableError):
+            await hdp.get_tx_identity_info("NM_999999.1")
+        return infos, many
+
+    infos, many = asyncio.run(run())
+    assert [info["tx_ac"] for info in infos] == [f"NM_00000{i}.1" for i in range(5)]
+    assert pool.max_in_flight > 1
+    assert [m["tx_ac"] for m in many[:5]] == [f"NM_00000{i}.1" for i in range(5)]
+    assert many[5] is None
+    assert len(pool.fetches) == 5 + 3 + 1  # 6 unique keys in chunks of 2
+
+
+@pytest.mark.parametrize("has_tx_span_view", [False, True])
+def test_region_query_uses_tx_span_view_when_present(has_tx_span_view):
+    pool = FakePool(has_tx_span_view=has_tx_span_view)
+
+    async def run():
+        async with AsyncUTA(URL, pool=pool) as hdp:
+            await hdp.get_tx_for_region("NC_000001.11", "splign", 1000, 2000)
+
+    asyncio.run(run())
+    sql, args = pool.fetches[0]
+    assert ("join tx_span_mv S" in sql) == has_tx_span_view
+    assert args == ("NC_000001.11", 1000, 2000)
+
+
+def test_tx_for_regions_drops_region_i():
+    async def run():
+        async with AsyncUTA(URL, pool=FakePool()) as hdp:
+            return await hdp.get_tx_for_regions("NC_000001.11", "splign", [100, 200], [150, 250])
+
+    tx_lists = asyncio.run(run())
+    assert [len(rows) for rows in tx_lists] == [1, 1]
+    assert dict(tx_lists[1][0]) == {"tx_ac": "NM_000001.1", "alt_ac": "NC_000001.11", "alt_aln_method": "splign",
+                                    "start_i": 0, "end_i": 10000}
@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+import pytest
+
+from src.hgvs_dataproviders_rest.txdata.uta_rest_service_async import AsyncUTARESTService
+
+httpx = pytest.importorskip("httpx")
+
+SERVER = "http://utarest.test/0"
+
+
+def make_hdp(requests_seen, bulk_supported=True, max_concurrency=100):
+    active = {"now": 0, "max": 0}
+
+    async def handler(request):
+        requests_seen.append((request.method, str(request.url)))
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.001)
+        active["now"] -= 1
+        path = request.url.path
+        if path.endswith("/ping"):
+            return httpx.Response(200, json={"data_version": "uta_20210129b", "schema_version": "1.1",
+                                             "sequence_source": "seqrepo"})
+        if path.endswith("/tx_identity_info_many"):
+            if not bulk_supported:
+                return httpx.Response(404)
+            return httpx.Response(200, json=[{"tx_ac": tx_ac} for tx_ac in json.loads(request.content)])
+        if "/tx_identity_info/" in path:
+            return httpx.Response(200, json={"tx_ac": path.rsplit("/", 1)[1]})
+        if "/tx_exons/" in path:
+            return httpx.Response(200, json=[{"tx_ac": path.split("/")[-2],
+                                              "alt_aln_method": request.url.params["alt_aln_method"]}])
+        return httpx.Response(404)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AsyncUTARESTService(SERVER, client=client, max_concurrency=max_concurrency), active
+
+
+def test_async_gather():
+    async def run():
+        requests_seen = []
+        hdp, active = make_hdp(requests_seen, max_concurrency=5)
+        async with hdp:
+            assert await hdp.data_version() == "uta_20210129b"
+            tx_acs = [f"NM_{i:06d}.1" for i in range(50)]
+            results = await asyncio.gather(*[hdp.get_tx_exons(tx_ac, "NC_000001.11", "splign") for tx_ac in tx_acs])
+        assert [r[0]["tx_ac"] for r in results] == tx_acs
+        assert results[0][0]["alt_aln_method"] == "splign"
+        assert active["max"] <= 5
+        assert requests_seen[1] == ("GET", f"{SERVER}/tx_exons/NM_000000.1/NC_000001.11?alt_aln_method=splign")
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("bulk_supported", [True, False])
+def test_async_many(bulk_supported):
+    async def run():
+        requests_seen = []
+        hdp, _ = make_hdp(requests_seen, bulk_supported=bulk_supported)
+        hdp.bulk_request_size = 2
+        async with hdp:
+            results = await hdp.get_tx_identity_info_many(["NM_1.1", "NM_2.1", "NM_3.1"])
+        assert [r["tx_ac"] for r in results] == ["NM_1.1", "NM_2.1", "NM_3.1"]
+        return requests_seen
+
+    requests_seen = asyncio.run(run())
+    posts = [r for r in requests_seen if r[0] == "POST"]
+    if bulk_supported:
+        assert len(posts) == 2
+    else:
+        # Chunks are posted concurrently, then each transcript is requested individually
+        assert len(requests_seen) == 1 + len(posts) + 3